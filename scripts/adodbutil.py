@@ -6,6 +6,17 @@ ADOdb release management scripts utilities and helper classes.
   available in the 'env' global variable..
 - Gitter class
   Use Gitter REST API to post announcements
+- Matrix class
+  Post announcements to one or more Matrix rooms, with cached discovery
+- SourceForge class
+  Client for the SourceForge Release API (download defaults of the
+  release files), with connection pooling, concurrent requests and
+  retries
+- GitHub class
+  GitHub API client for the release announcements, looking up a release,
+  its tag and milestone with a single GraphQL query
+- GitHubReleaseAssets class
+  Concurrent, streaming upload of a GitHub release's assets
 
 This file is part of ADOdb, a Database Abstraction Layer library for PHP.
 
@@ -23,17 +34,31 @@ See the LICENSE.md file distributed with this source code for details.
 @copyright 2022 Damien Regad, Mark Newnham and the ADOdb community
 @author Damien Regad
 """
+import concurrent.futures
+import hashlib
+import json
+import os
+import random
 import re
+import tempfile
+import time
 import urllib.parse
+import uuid
+import xml.etree.ElementTree as ElementTree
 from os import path
 
 import requests
+import requests.adapters
 import yaml
 from markdown_it import MarkdownIt
 
+import releasecache
+
+
 class Environment:
     # See env.yml.sample for details about these config variables
     sf_api_key = None
+    upload_targets = None
 
     github_token = None
     github_repo = 'ADOdb/ADOdb'
@@ -44,6 +69,7 @@ class Environment:
     matrix_token = None
     matrix_domain = 'gitter.im'
     matrix_room = '#ADOdb_ADOdb:' + matrix_domain
+    matrix_internal_rooms = None
 
     twitter_account = 'ADOdb_announce'
     twitter_api_key = None
@@ -74,34 +100,86 @@ class Environment:
 
 class Matrix:
     """
-    Posting messages to a Matrix room via REST API
+    Posting messages to Matrix rooms via REST API
+
+    All requests share a pooled HTTP session. The homeserver's base URL
+    and the rooms' IDs are cached on disk (see cache_ttl), so creating a
+    client usually does not require any request.
+    Each message is sent with its own transaction ID, reused when the
+    request is retried, so a retry never duplicates it.
     """
     api_root = '_matrix/client/v3/'
     domain = ''
     base_url = ''
     room_alias = ''
     room_id = ''
+    rooms = None
+    errors = None
+    jobs = 4
+    retries = 3
+    backoff = 1.0
+    timeout = 30
+
+    # Lifetime of the discovery cache entries, in seconds
+    cache_ttl = 7 * 24 * 3600
+
+    # HTTP statuses worth retrying
+    retry_statuses = (429, 500, 502, 503, 504)
 
-    _headers = ''
+    # Markdown renderer, shared by all clients
+    _renderer = MarkdownIt()
 
-    def __init__(self, domain, token, room_alias):
+    def __init__(self, domain, token, room_alias, cache_file=None,
+                 timeout=30):
         """
         Class Constructor.
 
         :param domain: Matrix Server's domain name
         :param token: Matrix REST API token
-        :param room_alias: Matrix Room alias, e.g. `#room:server.id`
+        :param room_alias: Matrix Room alias, e.g. `#room:server.id`, or
+                           list of aliases to post to several rooms (the
+                           first one is the primary room, setting the
+                           room_alias and room_id properties; the other
+                           ones are skipped if they can't be resolved,
+                           see errors)
+        :param cache_file: Discovery cache file, defaults to matrix.json
+                           in the release scripts' cache directory; False
+                           to disable caching
+        :param timeout: HTTP requests timeout, in seconds
         """
-        self._headers = {
+        self.timeout = timeout
+        if cache_file is None:
+            cache_file = path.join(releasecache.cache_dir(), 'matrix.json')
+        self._cache_file = cache_file
+        self._cache = self._load_cache()
+        self._cache_modified = False
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                pool_maxsize=self.jobs)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
             'Content-Type': 'application/json',
             'Accept': 'application/json',
             'Authorization': 'Bearer ' + token.strip()
-        }
+        })
 
         self.domain = domain
         self._set_base_url()
-        self._set_room(room_alias)
+        if isinstance(room_alias, str) or not room_alias:
+            room_alias = [room_alias]
+        self._set_rooms(room_alias)
+        self._save_cache()
+
+    def __enter__(self):
+        return self
 
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.session.close()
 
     def url(self, endpoint):
         """
@@ -112,26 +190,94 @@ class Matrix:
         """
         return self.base_url + endpoint
 
+    def _load_cache(self):
+        if not self._cache_file:
+            return {}
+        try:
+            with open(self._cache_file) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # Drop expired entries
+        now = time.time()
+        return {key: entry for key, entry in cache.items()
+                if now - entry[0] < self.cache_ttl}
+
+    def _save_cache(self):
+        if not self._cache_file or not self._cache_modified:
+            return
+        directory = path.dirname(self._cache_file)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._cache, f)
+            os.replace(tmp, self._cache_file)
+        except OSError as e:
+            print(f"WARNING: unable to save Matrix cache - {e}")
+        self._cache_modified = False
+
+    def _cached(self, key, lookup):
+        """
+        Get a value from the discovery cache, looking it up if needed.
+
+        :param key: Cache key
+        :param lookup: Function returning the value
+        """
+        if key in self._cache:
+            return self._cache[key][1]
+        value = lookup()
+        self._cache[key] = [time.time(), value]
+        self._cache_modified = True
+        return value
+
+    def _request(self, method, url, **kwargs):
+        """
+        Send an HTTP request, retrying transient errors.
+
+        :return: requests.Response (the last one, if all attempts failed)
+        :raise requests.RequestException: if the last attempt failed with
+               a connection error
+        """
+        for attempt in range(self.retries + 1):
+            retry_after = 0
+            try:
+                r = self.session.request(method, url, timeout=self.timeout,
+                                         **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+            else:
+                if r.status_code not in self.retry_statuses \
+                        or attempt == self.retries:
+                    return r
+                # Rate-limited responses tell how long to wait
+                try:
+                    retry_after = r.json().get('retry_after_ms', 0) / 1000
+                except (ValueError, AttributeError, TypeError):
+                    pass
+
+            time.sleep(max(retry_after,
+                           random.uniform(0, self.backoff * 2 ** attempt)))
+
     def _set_base_url(self):
         """
         Retrieve the Matrix API base URL for the given Domain and initialize
         the self.base_url property.
         """
-        r = requests.get(f'https://{self.domain}/.well-known/matrix/client')
-
-        if r.status_code != requests.codes.ok:
-            raise Exception(r.text)
+        def lookup():
+            r = self._request(
+                'GET', f'https://{self.domain}/.well-known/matrix/client')
+            if r.status_code != requests.codes.ok:
+                raise Exception(r.text)
+            return r.json()['m.homeserver']['base_url']
 
-        self.base_url = r.json()['m.homeserver']['base_url'] + \
-                        '/' + self.api_root
+        self.base_url = self._cached('base_url ' + self.domain, lookup) \
+            .rstrip('/') + '/' + self.api_root
 
-    def _set_room(self, alias):
+    def _room_alias(self, alias):
         """
-        Retrieve the Matrix Room ID from the given alias (after adding the
-        leading '#' and the Server name if not provided) and initialize the
-        room_alias and room_id properties.
-
-        :param alias:
+        Add the leading '#' and the Server name to the alias if needed.
         """
         if not alias:
             raise Exception("Matrix Room Alias not defined")
@@ -142,41 +288,666 @@ class Matrix:
         # If the alias does not include the Server, add the domain
         if ':' not in alias:
             alias += ':' + self.domain
-        self.room_alias = alias
+        return alias
 
-        # Retrieve Room ID
+    def _resolve_room(self, alias):
+        """
+        Retrieve the Matrix Room ID for the given alias.
+        """
         url = self.url('directory/room/') + urllib.parse.quote(alias)
-        r = requests.get(url, headers=self._headers)
+        r = self._request('GET', url)
         if r.status_code != requests.codes.ok:
-            raise Exception(r.json()['error'])
+            raise Exception(f"{alias}: {r.json()['error']}")
+        return r.json()['room_id']
 
-        self.room_id = r.json()['room_id']
+    def _set_rooms(self, aliases):
+        """
+        Retrieve the Matrix Room IDs from the given aliases (after adding
+        the leading '#' and the Server name if not provided) and initialize
+        the rooms, errors, room_alias and room_id properties.
+
+        Aliases missing from the cache are resolved concurrently. Rooms
+        that can't be resolved are left out of the rooms property, and
+        their error is stored in the errors property, unless it is the
+        primary room.
 
-    def post(self, message):
+        :param aliases: List of room aliases, the first one being the
+                        primary room
         """
-        Post a message to a Matrix room.
+        aliases = [self._room_alias(alias) for alias in aliases]
+        missing = [alias for alias in aliases
+                   if 'room ' + alias not in self._cache]
+        self.errors = {}
+        if missing:
+            with concurrent.futures.ThreadPoolExecutor(self.jobs) as executor:
+                futures = {executor.submit(self._resolve_room, alias): alias
+                           for alias in missing}
+                for future in concurrent.futures.as_completed(futures):
+                    alias = futures[future]
+                    try:
+                        room_id = future.result()
+                    except Exception as e:
+                        self.errors[alias] = e
+                        continue
+                    self._cache['room ' + alias] = [time.time(), room_id]
+                    self._cache_modified = True
+
+        self.room_alias = aliases[0]
+        if self.room_alias in self.errors:
+            raise self.errors[self.room_alias]
+        self.rooms = {alias: self._cache['room ' + alias][1]
+                      for alias in aliases if alias not in self.errors}
+        self.room_id = self.rooms[self.room_alias]
+
+    def render(self, message):
+        """
+        Build the message event's content.
 
         :param message: Message text in Markdown format
-
-        :return: Posted message's ID
+        :return: Dict
         """
-        md = MarkdownIt()
-        html = md.render(message)
+        html = self._renderer.render(message)
         plain_text = re.sub(r'(<!--.*?-->|<[^>]*>)', '', html)
-        payload = {
+        return {
             'msgtype': 'm.text',
             'body': plain_text,
             'format': 'org.matrix.custom.html',
             'formatted_body': html,
         }
 
-        url = self.url(f'rooms/{self.room_id}/send/m.room.message')
-        r = requests.post(url, headers=self._headers, json=payload)
+    def post(self, message, room_id=None, txn_id=None):
+        """
+        Post a message to a Matrix room.
+
+        :param message: Message text in Markdown format, or event content
+                        as returned by render()
+        :param room_id: Room ID, defaults to the primary room's
+        :param txn_id: Transaction ID; the server ignores a message sent
+                       again with the same one. Defaults to a new unique
+                       ID, used for all the attempts.
+
+        :return: Posted message's ID
+        """
+        payload = self.render(message) if isinstance(message, str) \
+            else message
+        room_id = room_id or self.room_id
+        if txn_id is None:
+            txn_id = f"adodb-{int(time.time() * 1000)}-{uuid.uuid4().hex}"
+
+        url = self.url(f'rooms/{urllib.parse.quote(room_id)}'
+                       f'/send/m.room.message/{txn_id}')
+        r = self._request('PUT', url, json=payload)
         if r.status_code != requests.codes.ok:
             raise Exception(r.text)
 
         return r.json()['event_id']
 
+    def post_all(self, message):
+        """
+        Post a message to all the rooms, concurrently.
+
+        :param message: Message text in Markdown format
+
+        :return: Dict of room alias => posted message's ID, or the
+                 exception that caused the post (or the room's
+                 resolution) to fail
+        """
+        payload = self.render(message)
+        results = {}
+        with concurrent.futures.ThreadPoolExecutor(self.jobs) as executor:
+            futures = {executor.submit(self.post, payload, room_id): alias
+                       for alias, room_id in self.rooms.items()}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    results[futures[future]] = e
+        results = {alias: results[alias] for alias in self.rooms}
+        results.update(self.errors)
+        return results
+
+
+class SourceForgeResult:
+    """
+    Result of a SourceForge Release API call for one file.
+    """
+    filename = ''
+    ok = False
+    status = 0
+    defaults = ''
+    error = ''
+
+    def __init__(self, filename, ok, status=0, defaults='', error=''):
+        self.filename = filename
+        self.ok = ok
+        self.status = status
+        self.defaults = defaults
+        self.error = error
+
+    def __repr__(self):
+        return f"<SourceForgeResult {self.filename} " \
+               f"{'OK' if self.ok else self.error}>"
+
+
+class SourceForge:
+    """
+    SourceForge Release API client.
+
+    All requests share a pooled HTTP session. Transient errors (429 and
+    5xx responses, connection errors) are retried with exponential
+    backoff and random jitter.
+
+    API documentation:
+    https://sourceforge.net/p/forge/documentation/Using%20the%20Release%20API/
+    """
+    base_url = 'https://sourceforge.net/projects/'
+    project = ''
+    jobs = 8
+    retries = 5
+    backoff = 1.0
+
+    # HTTP statuses worth retrying
+    retry_statuses = (429, 500, 502, 503, 504)
+
+    def __init__(self, project, api_key, jobs=8, retries=5, backoff=1.0,
+                 base_url=None):
+        """
+        Class Constructor.
+
+        :param project: SourceForge project name
+        :param api_key: Release API key
+        :param jobs: Maximum number of concurrent requests
+        :param retries: Number of retries for transient errors
+        :param backoff: Base delay between retries, in seconds
+        :param base_url: Projects base URL (e.g. a local stub for testing)
+        """
+        self.project = project
+        self._api_key = api_key
+        self.jobs = max(1, jobs)
+        self.retries = retries
+        self.backoff = backoff
+        if base_url is not None:
+            self.base_url = base_url.rstrip('/') + '/'
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                pool_maxsize=self.jobs)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['Accept'] = 'application/json'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def files_url(self, filename):
+        """
+        Get the Release API URL for the given file.
+
+        :param filename: File path, relative to the project's files root
+        """
+        return f"{self.base_url}{self.project}/files/" \
+               + urllib.parse.quote(filename.lstrip('/'))
+
+    def _request(self, method, url, **kwargs):
+        """
+        Send an HTTP request, retrying transient errors.
+
+        :return: requests.Response (the last one, if all attempts failed)
+        :raise requests.RequestException: if the last attempt failed with
+               a connection error
+        """
+        for attempt in range(self.retries + 1):
+            retry_after = 0
+            try:
+                r = self.session.request(method, url, timeout=60, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+            else:
+                if r.status_code not in self.retry_statuses \
+                        or attempt == self.retries:
+                    return r
+                try:
+                    retry_after = float(r.headers.get('Retry-After', 0))
+                except ValueError:
+                    pass
+
+            # Full jitter, but honor the server's Retry-After if any
+            time.sleep(max(retry_after,
+                           random.uniform(0, self.backoff * 2 ** attempt)))
+
+    def set_defaults(self, filename, defaults):
+        """
+        Set the platforms a file is the default download for.
+
+        :param filename: File path, relative to the project's files root
+        :param defaults: List of platforms (windows, mac, linux, bsd,
+                         solaris, others)
+
+        :return: SourceForgeResult object
+        """
+        payload = {'default': defaults, 'api_key': self._api_key}
+        try:
+            r = self._request('PUT', self.files_url(filename), params=payload)
+        except requests.RequestException as e:
+            return SourceForgeResult(filename, False, error=str(e))
+
+        if r.status_code == requests.codes.ok:
+            try:
+                result = r.json()['result']['x_sf']['default']
+            except (ValueError, KeyError, TypeError):
+                result = ''
+            return SourceForgeResult(filename, True, r.status_code, result)
+
+        if r.status_code == requests.codes.unauthorized:
+            error = "access denied - check API key"
+        else:
+            error = f"SourceForge API call failed ({r.status_code})"
+        return SourceForgeResult(filename, False, r.status_code, error=error)
+
+    def set_defaults_bulk(self, files):
+        """
+        Set the download defaults of multiple files concurrently.
+
+        :param files: Dict of file path => list of platforms
+
+        :return: Generator of SourceForgeResult objects, in completion order
+        """
+        with concurrent.futures.ThreadPoolExecutor(self.jobs) as executor:
+            futures = [executor.submit(self.set_defaults, name, defaults)
+                       for name, defaults in files.items()]
+            for future in concurrent.futures.as_completed(futures):
+                yield future.result()
+
+    def list_files(self, directory=''):
+        """
+        List the files in a directory and its subdirectories, from the
+        project's files RSS feed.
+
+        :param directory: Directory, relative to the project's files root
+
+        :return: List of file paths, relative to the project's files root
+        """
+        r = self._request('GET',
+                          f"{self.base_url}{self.project}/rss",
+                          params={'path': '/' + directory.strip('/'),
+                                  'limit': 10000})
+        r.raise_for_status()
+        return [item.text.lstrip('/')
+                for item in ElementTree.fromstring(r.content)
+                                       .iterfind('channel/item/title')
+                if item.text]
+
+
+class GitHub:
+    """
+    GitHub API client for the release announcements.
+
+    The release, its tag and its milestone are retrieved with a single
+    GraphQL query; the changes (creating the release, closing the
+    milestone) use the REST API. All requests share a pooled session.
+    """
+    api_url = 'https://api.github.com/'
+    uploads_url = 'https://uploads.github.com/'
+    repo = ''
+    timeout = 60
+
+    _release_query = """
+        query($owner: String!, $name: String!, $tag: String!,
+              $ref: String!, $milestone: String!, $after: String) {
+          repository(owner: $owner, name: $name) {
+            release(tagName: $tag) {
+              databaseId
+              url
+              description
+            }
+            ref(qualifiedName: $ref) {
+              target { oid }
+            }
+            milestones(query: $milestone, states: [OPEN, CLOSED],
+                       first: 100, after: $after) {
+              nodes { number title state url }
+              pageInfo { hasNextPage endCursor }
+            }
+          }
+        }
+        """
+
+    def __init__(self, token, repo, api_url=None, uploads_url=None,
+                 timeout=60):
+        """
+        Class Constructor.
+
+        :param token: GitHub API token
+        :param repo: Repository, e.g. 'ADOdb/ADOdb'
+        :param api_url: API base URL (e.g. a local stub for testing)
+        :param uploads_url: Release assets upload base URL
+        :param timeout: HTTP requests timeout, in seconds
+        """
+        self.repo = repo
+        self.timeout = timeout
+        if api_url is not None:
+            self.api_url = api_url.rstrip('/') + '/'
+        if uploads_url is not None:
+            self.uploads_url = uploads_url.rstrip('/') + '/'
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Accept': 'application/vnd.github+json',
+            'Authorization': 'Bearer ' + token.strip(),
+            'X-GitHub-Api-Version': '2022-11-28',
+        })
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def _request(self, method, endpoint, expected=requests.codes.ok,
+                 **kwargs):
+        """
+        Send a REST API request.
+
+        :param endpoint: API endpoint, relative to the repository's
+        :param expected: Expected HTTP status
+
+        :return: Decoded JSON response
+        """
+        url = f"{self.api_url}repos/{self.repo}/{endpoint}"
+        r = self.session.request(method, url, timeout=self.timeout,
+                                 **kwargs)
+        if r.status_code != expected:
+            raise Exception(f"GitHub API {method} {endpoint} failed "
+                            f"({r.status_code}): {r.text[:200]}")
+        return r.json()
+
+    def graphql(self, query, **variables):
+        """
+        Run a GraphQL query.
+
+        :return: Query's data
+        """
+        r = self.session.post(self.api_url + 'graphql',
+                              json={'query': query, 'variables': variables},
+                              timeout=self.timeout)
+        if r.status_code != requests.codes.ok:
+            raise Exception(f"GitHub GraphQL query failed "
+                            f"({r.status_code}): {r.text[:200]}")
+        result = r.json()
+        if result.get('errors'):
+            messages = "; ".join(e['message'] for e in result['errors'])
+            raise Exception(f"GitHub GraphQL query failed: {messages}")
+        return result['data']
+
+    def _release(self, release_id, html_url, body):
+        """
+        Build a release dict with the same keys as the REST API's.
+        """
+        endpoint = f"repos/{self.repo}/releases/{release_id}/assets"
+        return {
+            'id': release_id,
+            'html_url': html_url,
+            'body': body or '',
+            'assets_url': self.api_url + endpoint,
+            'upload_url': self.uploads_url + endpoint + '{?name,label}',
+        }
+
+    def release_info(self, tag, milestone):
+        """
+        Look up a release, its tag and its milestone, in a single query.
+
+        :param tag: Release tag name
+        :param milestone: Milestone title
+
+        :return: Dict with
+                 - release: dict (id, html_url, body, assets_url and
+                   upload_url), or None if the release does not exist
+                 - tag: the tagged commit's SHA, or None if the tag does
+                   not exist
+                 - milestone: dict (number, title, state and url), or None
+                   if the milestone does not exist
+        """
+        owner, name = self.repo.split('/')
+        data = self.graphql(self._release_query,
+                            owner=owner, name=name, tag=tag,
+                            ref='refs/tags/' + tag, milestone=milestone)
+        repository = data['repository']
+
+        # The milestones query matches on part of the title, so the exact
+        # one may be on a later page
+        milestones = repository['milestones']
+        while True:
+            found = next((m for m in milestones['nodes']
+                          if m['title'] == milestone), None)
+            if found is not None or not milestones['pageInfo']['hasNextPage']:
+                break
+            page = self.graphql(self._release_query,
+                                owner=owner, name=name, tag=tag,
+                                ref='refs/tags/' + tag, milestone=milestone,
+                                after=milestones['pageInfo']['endCursor'])
+            milestones = page['repository']['milestones']
+
+        release = repository['release']
+        if release is not None:
+            release = self._release(release['databaseId'],
+                                    release['url'],
+                                    release['description'])
+        ref = repository['ref']
+        return {
+            'release': release,
+            'tag': ref['target']['oid'] if ref is not None else None,
+            'milestone': found,
+        }
+
+    def create_release(self, tag, name, body):
+        """
+        Create a release for an existing tag.
+
+        :return: Release dict, as returned by release_info()
+        """
+        r = self._request('POST', 'releases',
+                          expected=requests.codes.created,
+                          json={'tag_name': tag, 'name': name, 'body': body})
+        return self._release(r['id'], r['html_url'], r['body'])
+
+    def close_milestone(self, number, due_on):
+        """
+        Close a milestone, setting its due date.
+
+        :param number: Milestone number
+        :param due_on: Due date (datetime.date)
+        """
+        self._request('PATCH', f"milestones/{number}",
+                      json={'state': 'closed',
+                            'due_on': due_on.isoformat() + 'T00:00:00Z'})
+
+
+class GitHubAssetResult:
+    """
+    Result of a GitHub release asset upload.
+
+    status is 'uploaded', 'skipped' (identical asset already present) or
+    'failed'.
+    """
+    name = ''
+    status = ''
+    error = ''
+
+    def __init__(self, name, status, error=''):
+        self.name = name
+        self.status = status
+        self.error = error
+
+    def __repr__(self):
+        return f"<GitHubAssetResult {self.name} {self.status}>"
+
+
+class GitHubReleaseAssets:
+    """
+    Upload of a GitHub release's assets via the REST API.
+
+    Files are streamed from disk, several at a time over a pooled
+    session. Assets that already exist with the same size and SHA-256
+    digest are skipped; other assets with the same name are replaced.
+    """
+    jobs = 4
+    timeout = 60
+
+    # Content types of the uploaded files, by extension
+    content_types = {
+        '.zip': 'application/zip',
+        '.gz': 'application/gzip',
+        '.xz': 'application/x-xz',
+        '.zst': 'application/zstd',
+        '.json': 'application/json',
+    }
+
+    def __init__(self, token, assets_url, upload_url, jobs=4, timeout=60):
+        """
+        Class Constructor.
+
+        :param token: GitHub API token
+        :param assets_url: Release's assets_url (to list the assets)
+        :param upload_url: Release's upload_url (URI template)
+        :param jobs: Maximum number of concurrent uploads
+        :param timeout: HTTP requests timeout, in seconds
+        """
+        self.timeout = timeout
+        self.assets_url = assets_url
+        self.upload_url = upload_url.split('{', 1)[0]
+        self.jobs = max(1, jobs)
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=2,
+                                                pool_maxsize=self.jobs)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Accept': 'application/vnd.github+json',
+            'Authorization': 'Bearer ' + token.strip(),
+            'X-GitHub-Api-Version': '2022-11-28',
+        })
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def list(self):
+        """
+        Get the release's existing assets.
+
+        :return: Dict of asset name => asset (as returned by the API)
+        """
+        assets = {}
+        url = self.assets_url
+        params = {'per_page': 100}
+        while url:
+            r = self.session.get(url, params=params, timeout=self.timeout)
+            if r.status_code != requests.codes.ok:
+                raise Exception(r.text)
+            for asset in r.json():
+                assets[asset['name']] = asset
+            url = r.links.get('next', {}).get('url')
+            params = None
+        return assets
+
+    @staticmethod
+    def file_digest(filename):
+        """
+        Compute a file's SHA-256, reading it in chunks.
+        """
+        sha256 = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def upload(self, filename, name=None, existing=None, sha256=None):
+        """
+        Upload a file as a release asset, unless an identical one exists.
+
+        :param filename: File to upload
+        :param name: Asset name, defaults to the file's base name
+        :param existing: Existing asset with the same name, if any
+        :param sha256: File's SHA-256, computed if not provided
+
+        :return: GitHubAssetResult object
+        """
+        name = name or path.basename(filename)
+        try:
+            size = path.getsize(filename)
+            if existing is not None:
+                # Assets uploaded before GitHub computed digests only
+                # have a size to compare with
+                digest = existing.get('digest')
+                if existing['size'] == size and (
+                        digest is None
+                        or digest == 'sha256:'
+                        + (sha256 or self.file_digest(filename))):
+                    return GitHubAssetResult(name, 'skipped')
+                r = self.session.delete(existing['url'],
+                                        timeout=self.timeout)
+                if r.status_code != requests.codes.no_content:
+                    return GitHubAssetResult(
+                        name, 'failed',
+                        f"unable to delete existing asset ({r.status_code})")
+
+            ext = path.splitext(name)[1]
+            headers = {
+                'Content-Type': self.content_types.get(ext, 'text/plain'),
+                'Content-Length': str(size),
+            }
+            with open(filename, 'rb') as f:
+                # The file object is streamed by requests
+                r = self.session.post(self.upload_url,
+                                      params={'name': name},
+                                      data=f,
+                                      headers=headers,
+                                      timeout=self.timeout)
+        except (OSError, requests.RequestException) as e:
+            return GitHubAssetResult(name, 'failed', str(e))
+
+        if r.status_code != requests.codes.created:
+            return GitHubAssetResult(
+                name, 'failed',
+                f"upload failed ({r.status_code}): {r.text[:200]}")
+        return GitHubAssetResult(name, 'uploaded')
+
+    def upload_all(self, files):
+        """
+        Upload several files concurrently.
+
+        :param files: Dict of file name => SHA-256 (None to compute it
+                      only if needed)
+
+        :return: Generator of GitHubAssetResult objects, in completion order
+        """
+        existing = self.list()
+        with concurrent.futures.ThreadPoolExecutor(self.jobs) as executor:
+            futures = [
+                executor.submit(self.upload, filename,
+                                existing=existing.get(path.basename(filename)),
+                                sha256=sha256)
+                for filename, sha256 in files.items()
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                yield future.result()
+
 
 # Initialize environment
 env = Environment()
@@ -6,6 +6,10 @@ Posts release announcements to
 - Gitter
 - Twitter
 
+Once the message is final, all channels are posted to concurrently.
+
+Optionally uploads the release files to the GitHub release as assets.
+
 This file is part of ADOdb, a Database Abstraction Layer library for PHP.
 
 @package ADOdb
@@ -24,16 +28,36 @@ See the LICENSE.md file distributed with this source code for details.
 """
 
 import argparse
+import asyncio
 from datetime import date
+import functools
 import re
+import threading
+import time
 from pathlib import Path
 
 import tweepy  # https://www.tweepy.org/
-from git import Repo  # https://gitpython.readthedocs.io
-# https://github.com/PyGithub/PyGithub
-from github import Github, GithubException, Milestone
 
-from adodbutil import env, Matrix
+import changelog
+import instrumentation
+import versions
+from adodbutil import env, GitHub, GitHubReleaseAssets, Matrix
+
+tracer = instrumentation.Tracer('announce')
+
+# Announcement channels' display names
+channel_names = {
+    'github': 'GitHub',
+    'gitter': 'Gitter',
+    'twitter': 'Twitter',
+}
+
+# Default time limit for posting to each channel, in seconds
+channel_timeouts = {
+    'github': 600,      # Includes the upload of the release assets
+    'gitter': 60,
+    'twitter': 60,
+}
 
 
 def process_command_line():
@@ -41,18 +65,11 @@ def process_command_line():
     Parse command-line options
     :return: Namespace
     """
-    # Get most recent Git tag
-    repo = Repo(path=Path(__file__).parents[1])
-    tags = sorted(repo.tags,
-                  key=lambda t: t.tag.tagged_date if t.tag is not None else 0)
-    latest_tag = str(tags[-1])
-
     parser = argparse.ArgumentParser(
         description="Post ADOdb release announcement messages to Gitter."
     )
     parser.add_argument('version',
                         nargs='?',
-                        default=latest_tag,
                         help="Version number to announce; if not specified, "
                              "the latest tag will be used.")
     parser.add_argument('-m', '--message',
@@ -73,52 +90,135 @@ def process_command_line():
                       action="store_true",
                       help="Only post the announcement to GitHub")
 
+    parser.add_argument('-a', '--assets',
+                        metavar='RELEASE_PATH',
+                        help="Upload the release files (archives listed in "
+                             "SHA256SUMS, and the checksum file itself) "
+                             "found in the given directory as GitHub "
+                             "release assets")
+    parser.add_argument('-j', '--jobs',
+                        type=int,
+                        default=GitHubReleaseAssets.jobs,
+                        help="Number of concurrent asset uploads "
+                             "(default: %(default)s)")
+    parser.add_argument('--timeout',
+                        type=int,
+                        help="Time limit in seconds for posting to each "
+                             "channel (default: "
+                             + ", ".join(f"{channel_names[c]} {t}s" for c, t
+                                         in channel_timeouts.items())
+                             + ")")
+    parser.add_argument('--trace',
+                        help="Save the announcement phases' timings trace "
+                             "to the given JSON file (defaults to a new file "
+                             "in the release scripts' cache directory)")
+    parser.add_argument('--profile',
+                        metavar='DIR',
+                        help="Save cProfile and tracemalloc dumps of each "
+                             "phase in the given directory")
+
     return parser.parse_args()
 
 
-def github_close_milestone(repo, version):
+def latest_tag():
+    """
+    Get the most recently created release tag, from the tag index.
+
+    :return: Tag name, or None if there are no release tags
+    """
+    tag = versions.TagIndex.load(Path(__file__).parents[1]).newest()
+    return tag.name if tag is not None else None
+
+
+def github_close_milestone(gh, milestone, version):
+    """
+    Close the release's Milestone.
+
+    :param gh: GitHub client
+    :param milestone: Milestone, as found by GitHub.release_info()
+    :param version: Version number
+
+    :return: Description of the outcome
+    """
     # Milestones do not have the 'v' prefix
     version = version.lstrip('v')
-    print(f"Closing Milestone '{version}'")
-
-    # Search Milestone for version
-    milestone_found = False
-    milestone: Milestone.Milestone
-    for milestone in repo.get_milestones():
-        if milestone.title == version:
-            milestone_found = True
-            break
-
-    # Milestone not found, check if already closed
-    if not milestone_found:
-        # Process closed Milestones in reverse order of due_on, to minimize
-        # number of iterations
-        for milestone in repo.get_milestones(state='closed',
-                                             sort='due_on',
-                                             direction='desc'):
-            if milestone.title == version:
-                print(f"Already closed {milestone.raw_data['html_url']}")
-                return
+
+    if milestone is None:
         raise Exception(f"Milestone '{version}' not found")
+    if milestone['state'] == 'CLOSED':
+        return f"Milestone '{version}' already closed " + milestone['url']
+
+    gh.close_milestone(milestone['number'], date.today())
+    return f"Milestone '{version}' closed"
+
+
+def release_assets(release_path):
+    """
+    Get the release files to upload as GitHub release assets.
+
+    The archives and their SHA-256 are read from the SHA256SUMS file
+    written by buildrelease.py, so they do not have to be hashed again.
+
+    :param release_path: Directory holding the release files
+    :return: Dict of file name => SHA-256 (None if not known)
+    """
+    sums = Path(release_path) / 'SHA256SUMS'
+    if not sums.is_file():
+        raise FileNotFoundError(f"'{sums}' not found, "
+                                "please build the release first")
+
+    files = {}
+    for line in sums.read_text().splitlines():
+        if not line.strip():
+            continue
+        sha256, name = line.split(maxsplit=1)
+        files[str(Path(release_path) / name.lstrip('*'))] = sha256
+    files[str(sums)] = None
+    return files
+
+
+def upload_github_assets(release, release_path, jobs, timeout):
+    """
+    Upload the release files as assets of the GitHub release.
+
+    :param release: GitHub release, as returned by GitHub.release_info()
+    :param release_path: Directory holding the release files
+    :param jobs: Number of concurrent uploads
+    :param timeout: HTTP requests timeout, in seconds
+    :return: List of GitHubAssetResult objects
+    """
+    files = release_assets(release_path)
+    with GitHubReleaseAssets(env.github_token,
+                             release['assets_url'],
+                             release['upload_url'],
+                             jobs, timeout) as assets:
+        return list(assets.upload_all(files))
+
+
+def github_release(version, message):
+    """
+    Look up the GitHub release, before announcing it.
 
-    # Close the milestone
-    # noinspection PyUnboundLocalVariable
-    milestone.edit(title=milestone.title,
-                   state='closed',
-                   due_on=date.today())
+    If the release already exists, the announcement message is taken from
+    its description; otherwise, the release's tag must have been pushed.
+    The release, tag and milestone are retrieved with a single query.
 
+    :param version: Version number, without 'v' prefix
+    :param message: Message provided on command-line
 
-def post_github(version, message, changelog_link):
+    :return: Tuple (GitHub client, release info as returned by
+             GitHub.release_info(), message)
+    """
     print(f"GitHub Release for repository '{env.github_repo}'")
 
-    gh = Github(env.github_token)
-    repo = gh.get_repo(env.github_repo)
+    gh = GitHub(env.github_token, env.github_repo)
+    info = gh.release_info('v' + version, version)
 
     # Check if Release already exists
     version = 'v' + version
-    try:
-        rel = repo.get_release(version)
-        print(f"Existing release '{version}' found", rel.html_url)
+    rel = info['release']
+    if rel is not None:
+        print(f"Existing release '{version}' found", rel['html_url'])
 
         # Discard the message provided on command-line, and use the one from
         # the Release's description, inform user to update it on GitHub.
@@ -130,82 +230,248 @@ def post_github(version, message, changelog_link):
             print("Retrieving the Release's description for the "
                   "announcement message")
 
-        # Remove the changelog link to keep only the release's message
+        # Remove the release notes and changelog link to keep only the
+        # release's message
+        body = re.split(r"^#+ ", rel['body'], maxsplit=1, flags=re.M)[0]
         message = re.sub(r"[,.]?\s*(Please )?See .*$",
                          "",
-                         rel.body,
+                         body.strip(),
                          flags=re.IGNORECASE).strip()
         if message:
             message += ".\n"
-    except GithubException as err:
-        if err.status != 404:
-            raise err
+    else:
         print(f"Release '{version}' does not exist yet")
 
         # Make sure the version has been tagged
-        try:
-            repo.get_git_ref('tags/' + version)
-            print(f"Tag '{version}' found")
-        except GithubException:
+        if info['tag'] is None:
             print(f"ERROR: Tag '{version}' does not exist on GitHub, "
                   "please push it first")
             exit(1)
-
-        # Create the release
-        rel = repo.create_git_release(version,
-                                      version,
-                                      message + changelog_link)
-        print("Release created successfully", rel.html_url)
+        print(f"Tag '{version}' found")
 
     print()
+    return gh, info, message
+
+
+def post_github(tracer, timeout, gh, info, version, message, changelog_link,
+                release_path=None, jobs=GitHubReleaseAssets.jobs):
+    """
+    Create the GitHub release if needed, upload its files and close the
+    release's Milestone.
+
+    :return: Description of the outcome
+    """
+    gh.timeout = timeout
+    version = 'v' + version
+    rel = info['release']
+    if rel is None:
+        # Create the release, with the release notes from the local
+        # changelog
+        body = message + changelog_link
+        notes = changelog.load_index().release_notes(version)
+        if notes:
+            body += "\n\n" + notes
+        with tracer.span('release'):
+            rel = gh.create_release(version, version, body)
+        result = ["Release created " + rel['html_url']]
+        if not notes:
+            result.append(
+                f"WARNING: no Changelog section found for '{version}'")
+    else:
+        result = ["Existing release " + rel['html_url']]
+
+    # Upload the release files
+    if release_path:
+        with tracer.span('assets'):
+            assets = upload_github_assets(rel, release_path, jobs, timeout)
+        count = {}
+        for asset in assets:
+            count[asset.status] = count.get(asset.status, 0) + 1
+            if asset.status == 'failed':
+                result.append(f"WARNING: asset {asset.name} - {asset.error}")
+        result.append("Assets: " + ", ".join(
+            f"{n} {status}" for status, n in sorted(count.items())))
 
     # Closing the Milestone
     try:
-        github_close_milestone(repo, version)
+        with tracer.span('milestone'):
+            result.append(github_close_milestone(gh, info['milestone'],
+                                                 version))
     except Exception as e:
-        print("WARNING: " + str(e) + "\n")
+        result.append("WARNING: " + str(e))
 
-    # Return message to be used for remaining announcements
-    return message
+    return "\n".join(result)
 
 
-def post_gitter(message):
-    print(f"Posting to Gitter ({env.matrix_room})... ")
-    matrix = Matrix(env.matrix_domain, env.matrix_token, env.matrix_room)
-    message_id = matrix.post('# ' + message)
-    print("Message posted successfully\n"
-          f"https://matrix.to/#/{matrix.room_id}/{message_id}")
-    print()
+def post_gitter(tracer, timeout, message):
+    """
+    Post the announcement to Gitter (Matrix room), and to the internal
+    Matrix rooms if any.
 
+    :return: Links to the posted messages
+    """
+    rooms = [env.matrix_room] + (env.matrix_internal_rooms or [])
+    with tracer.span('connect'):
+        matrix = Matrix(env.matrix_domain, env.matrix_token, rooms,
+                        timeout=timeout)
+    with matrix, tracer.span('post'):
+        results = matrix.post_all('# ' + message)
+
+    # Only a failure to post to the public room fails the announcement
+    primary = results.pop(matrix.room_alias)
+    if isinstance(primary, Exception):
+        raise primary
+    result = [f"https://matrix.to/#/{matrix.room_id}/{primary}"]
+    for alias, message_id in results.items():
+        if isinstance(message_id, Exception):
+            result.append(f"WARNING: {alias} - {message_id}")
+        else:
+            result.append("https://matrix.to/#/"
+                          f"{matrix.rooms[alias]}/{message_id}")
+    return "\n".join(result)
 
-def post_twitter(message):
-    print(f"Posting to Twitter ({env.twitter_account})... ",)
+
+def post_twitter(tracer, timeout, message):
+    """
+    Post the announcement to Twitter.
+
+    :return: Link to the tweet
+    """
     twitter = tweepy.Client(
         consumer_key=env.twitter_api_key,
         consumer_secret=env.twitter_api_secret,
         access_token=env.twitter_access_token,
         access_token_secret=env.twitter_access_secret
     )
-    try:
+    # tweepy does not set any timeout on its requests
+    twitter.session.request = functools.partial(twitter.session.request,
+                                                timeout=timeout)
+    with tracer.span('post'):
         r = twitter.create_tweet(text=message)
-    except tweepy.errors.HTTPException as e:
-        print("ERROR:", e)
-        return
-    print("Tweeted successfully\n"
-          f"https://twitter.com/{env.twitter_account}/status/{r.data['id']}")
-    print()
+    return f"https://twitter.com/{env.twitter_account}/status/{r.data['id']}"
+
+
+def _run_in_thread(loop, func, *args):
+    """
+    Run a blocking function in a daemon thread.
+
+    Unlike an executor's threads, daemon threads are not waited for when
+    the script exits, so a channel that timed out can't delay it.
+
+    :param loop: Running event loop
+
+    :return: asyncio.Future receiving the function's result
+    """
+    future = loop.create_future()
+
+    def set_result(result, error):
+        # The future is cancelled when the time limit is reached
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def run():
+        try:
+            result, error = func(*args), None
+        except Exception as e:
+            result, error = None, e
+        try:
+            loop.call_soon_threadsafe(set_result, result, error)
+        except RuntimeError:
+            # Event loop closed, nobody is waiting for the result anymore
+            pass
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+async def _post_channel(channel, timeout, func, *args):
+    """
+    Post to a channel in a worker thread, within the given time limit.
+
+    The time limit is also passed to the channel's function, to apply it
+    to its HTTP requests; a post that timed out may still complete.
+    Each channel records its phases in its own tracer, as spans can't be
+    recorded concurrently in a single one.
+
+    :return: Tuple (channel, success, description, elapsed time, tracer)
+    """
+    loop = asyncio.get_running_loop()
+    channel_tracer = instrumentation.Tracer(channel)
+    start = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(
+            _run_in_thread(loop, func, channel_tracer, timeout, *args),
+            timeout)
+        success = True
+    except asyncio.TimeoutError:
+        success = False
+        result = f"timed out after {timeout}s, may still have been posted"
+    except Exception as e:
+        success, result = False, f"{type(e).__name__}: {e}"
+    return (channel, success, result, time.perf_counter() - start,
+            channel_tracer)
+
+
+async def post_channels(posts, timeouts):
+    """
+    Post the announcement to all channels concurrently.
+
+    :param posts: Dict of channel => (function, arguments)
+    :param timeouts: Dict of channel => time limit in seconds
+
+    :return: List of (channel, success, description, elapsed time, tracer)
+             tuples, in the order of posts
+    """
+    return await asyncio.gather(*(
+        _post_channel(channel, timeouts[channel], func, *args)
+        for channel, (func, args) in posts.items()
+    ))
+
+
+def print_summary(results):
+    """
+    Print the outcome of the posts to each channel.
+
+    :param results: As returned by post_channels()
+    :return: True if all posts succeeded
+    """
+    print("Announcement summary")
+    print("-" * 27)
+    for channel, success, result, elapsed, _ in results:
+        lines = result.splitlines() or ['']
+        print(f"{channel_names[channel]:8} "
+              f"{'OK' if success else 'FAILED':6} "
+              f"{elapsed:5.1f}s  {lines[0]}")
+        for line in lines[1:]:
+            print(" " * 24 + line)
+    print("-" * 27)
+    return all(result[1] for result in results)
 
 
 def main():
     args = process_command_line()
+    tracer.profile_dir = args.profile
 
     post_everywhere = not args.gitter_only \
         and not args.github_only \
         and not args.twitter_only
-    version = args.version.lstrip('v')
+    # Default to the most recent tag, only looked up when needed
+    version = args.version or latest_tag()
+    if version is None:
+        print("ERROR: no release tag found, please specify the version")
+        exit(1)
+    version = version.lstrip('v')
     changelog_url = f"https://github.com/ADOdb/ADOdb/blob/v{version}" \
                     "/docs/changelog.md"
     message = args.message.rstrip(".") + ".\n" if args.message else ""
+    if args.assets and not (Path(args.assets) / 'SHA256SUMS').is_file():
+        print(f"ERROR: no release files found in '{args.assets}', "
+              "please build the release first")
+        exit(1)
 
     # Tell user where the release will be announced
     print(f"Posting to: ", end='')
@@ -219,36 +485,57 @@ def main():
         print(f"Twitter ({env.twitter_account})")
     print()
 
-    # Create GitHub release, retrieve message from it if it already exists
+    # Retrieve message from the GitHub release if it already exists
+    posts = {}
     if post_everywhere or args.github_only:
-        message = post_github(version,
-                              message,
-                              f"See [Changelog]({changelog_url}) for details")
-    if args.github_only:
-        return
+        with tracer.span('github-lookup'):
+            gh, info, message = github_release(version, message)
+        posts['github'] = (post_github, (
+            gh, info, version, message,
+            f"See [Changelog]({changelog_url}) for details",
+            args.assets, args.jobs))
 
     # Build announcement message
     msg_announce = f"ADOdb Version {version} released\n{message}" \
                    "See Changelog " + changelog_url
-
-    # Get confirmation
-    if not args.batch:
-        print("Review ", end='')
-    print("Announcement message")
-    print("-" * 27)
-    print(msg_announce)
-    print("-" * 27)
-    if not args.batch:
-        reply = input("Proceed with posting ? ")
-        if not reply.casefold() == 'y':
-            print("Aborting")
-            exit(1)
-    print()
-
     if post_everywhere or args.gitter_only:
-        post_gitter(msg_announce)
+        posts['gitter'] = (post_gitter, (msg_announce,))
     if post_everywhere or args.twitter_only:
-        post_twitter(msg_announce)
+        posts['twitter'] = (post_twitter, (msg_announce,))
+
+    # Get confirmation (the GitHub release's description is not the
+    # announcement message)
+    if not args.github_only:
+        if not args.batch:
+            print("Review ", end='')
+        print("Announcement message")
+        print("-" * 27)
+        print(msg_announce)
+        print("-" * 27)
+        if not args.batch:
+            reply = input("Proceed with posting ? ")
+            if not reply.casefold() == 'y':
+                print("Aborting")
+                exit(1)
+        print()
+
+    # Post to all channels at once, now that the message is final
+    timeouts = {channel: args.timeout or timeout
+                for channel, timeout in channel_timeouts.items()}
+    print("Posting to " + ", ".join(channel_names[c] for c in posts) + "...")
+    print()
+    with tracer.span('post'):
+        results = asyncio.run(post_channels(posts, timeouts))
+        for channel, _, _, _, channel_tracer in results:
+            # A channel that timed out may still be running
+            spans = list(channel_tracer.spans)
+            if all('wall' in span for span in spans):
+                tracer.merge(spans, channel, channel_tracer.started)
+    success = print_summary(results)
+
+    tracer.report(version, args.trace)
+    if not success:
+        exit(1)
 
 
 if __name__ == "__main__":
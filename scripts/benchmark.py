@@ -0,0 +1,565 @@
+#!/usr/bin/env -S python3 -u
+"""
+ADOdb release scripts benchmark.
+
+Generates synthetic repositories of various sizes, and times the release
+pipeline's steps against them:
+- buildrelease (worktree, Git objects, cached and fresh clone modes)
+- version stamping (updateversion.version_set)
+- changelog update (updateversion.update_changelog)
+
+Everything runs offline, against local bare repositories. Results are
+saved with the commit being benchmarked, so that they can be compared
+with those of previous commits to spot regressions.
+
+This file is part of ADOdb, a Database Abstraction Layer library for PHP.
+
+@package ADOdb
+@link https://adodb.org Project's web site and documentation
+@link https://github.com/ADOdb/ADOdb Source code and issue tracker
+
+The ADOdb Library is dual-licensed, released under both the BSD 3-Clause
+and the GNU Lesser General Public Licence (LGPL) v2.1 or, at your option,
+any later version. This means you can use it in proprietary products.
+See the LICENSE.md file distributed with this source code for details.
+@license BSD-3-Clause
+@license LGPL-2.1-or-later
+
+@copyright 2026 Damien Regad, Mark Newnham and the ADOdb community
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from os import path
+from pathlib import Path
+
+import buildrelease
+import instrumentation
+import releasecache
+import updateversion
+
+# Repository sizes (number of files)
+scales = {
+    'small': 200,
+    'medium': 5000,
+    'large': 50000,
+}
+default_scales = ('small', 'medium')
+
+# File sizes follow a log-normal distribution matching ADOdb's PHP files
+# (median ~3.5 KB, mean ~10 KB)
+size_median = 3500
+size_sigma = 1.4
+size_min = 300
+size_max = 300000
+
+# Top-level directories of the synthetic repositories, with their share of
+# the files; tests and scripts are excluded from the release archives by
+# the .gitattributes file copied from the real repository
+directories = {
+    'drivers': 30,
+    'datadict': 10,
+    'session': 5,
+    'perf': 5,
+    'lang': 10,
+    'pear': 5,
+    'xsl': 5,
+    'docs': 10,
+    'tests': 15,
+    'scripts': 5,
+}
+# Maximum number of files per sub-directory
+files_per_directory = 50
+
+# Version stamped and released in the synthetic repositories; its
+# predecessor must exist in the changelog
+bench_version = '5.22.12'
+
+# Bump this when the generator changes, to invalidate cached repositories
+generator_version = 2
+
+benchmarks = ('build-worktree', 'build-git', 'build-git-cached',
+              'build-fresh', 'version-set', 'changelog')
+
+# A benchmark is flagged as a regression when it is this much slower
+# than the baseline...
+regression_threshold = 1.10
+# ... by at least that many seconds, to ignore noise on short benchmarks
+regression_min_delta = 0.05
+
+repo_root = Path(__file__).parents[1]
+
+
+def process_command_line():
+    """
+    Parse command-line options
+    :return: Namespace
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark the ADOdb release scripts on synthetic "
+                    "repositories."
+    )
+    parser.add_argument('-s', '--scale',
+                        action='append',
+                        choices=list(scales),
+                        help="Repository size to benchmark, can be repeated "
+                             f"(defaults to {', '.join(default_scales)})")
+    parser.add_argument('-b', '--benchmark',
+                        action='append',
+                        choices=benchmarks,
+                        help="Benchmark to run, can be repeated "
+                             "(defaults to all)")
+    parser.add_argument('-r', '--repeat',
+                        type=int,
+                        default=3,
+                        help="Number of timed runs of each benchmark "
+                             "(default: %(default)s)")
+    parser.add_argument('--seed',
+                        type=int,
+                        default=0,
+                        help="Random seed for the repositories generation")
+    parser.add_argument('-o', '--output',
+                        help="Results file (defaults to a new file in "
+                             f"'{results_dir()}')")
+    parser.add_argument('-c', '--compare',
+                        metavar='BASELINE',
+                        help="Results file or commit to compare with; "
+                             "defaults to the latest results for another "
+                             "commit")
+    parser.add_argument('-p', '--profile',
+                        metavar='DIR',
+                        help="Save cProfile and tracemalloc dumps of each "
+                             "benchmark run in the given directory")
+
+    args = parser.parse_args()
+    args.scale = args.scale or list(default_scales)
+    args.benchmark = args.benchmark or list(benchmarks)
+    return args
+
+
+def results_dir():
+    """
+    Return the directory where benchmark results are saved.
+    """
+    return path.join(releasecache.cache_dir(), 'benchmarks')
+
+
+def current_commit():
+    """
+    Return the SHA of the commit being benchmarked, with a '+' suffix if
+    the scripts have uncommitted changes.
+    """
+    sha = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                  cwd=repo_root, text=True).rstrip()
+    dirty = subprocess.check_output(['git', 'status', '--porcelain', '--',
+                                     'scripts'], cwd=repo_root, text=True)
+    return sha + ('+' if dirty.strip() else '')
+
+
+def _git(*args, cwd):
+    subprocess.check_call(
+        ['git',
+         '-c', 'user.name=ADOdb Benchmark',
+         '-c', 'user.email=benchmark@adodb.org',
+         '-c', 'commit.gpgSign=false',
+         '-c', 'tag.gpgSign=false'] + list(args),
+        cwd=cwd,
+        stdout=subprocess.DEVNULL
+    )
+
+
+def _corpus(rnd, size=1024 * 1024):
+    """
+    Generate PHP-like source code, with the redundancy of real code.
+
+    :param rnd: random.Random instance
+    :param size: Approximate corpus size
+
+    :return: Corpus string
+    """
+    words = ['sql', 'rs', 'conn', 'field', 'table', 'row', 'col', 'value',
+             'query', 'result', 'db', 'index', 'name', 'type', 'len', 'key',
+             'meta', 'cursor', 'param', 'bind', 'error', 'offset', 'limit']
+    templates = [
+        "\t\t${0} = $this->{1}(${2});\n",
+        "\t\tif (${0} === false) {{\n\t\t\treturn ${1};\n\t\t}}\n",
+        "\t/**\n\t * {0} the {1} {2}.\n\t *\n\t * @param string ${1}\n"
+        "\t * @return bool\n\t */\n",
+        "\tfunction {0}{1}(${2}, ${0} = null)\n\t{{\n",
+        "\t}}\n\n",
+        "\t\tforeach (${0} as ${1} => ${2}) {{\n\t\t\t${0}[] = ${2};\n"
+        "\t\t}}\n",
+        "\t\t$sql = \"SELECT {0}, {1} FROM {2} WHERE {0} = ?\";\n",
+        "\t\t// {0} {1} {2}\n",
+        "\tvar ${0}{1} = '{2}';\n",
+    ]
+    parts = []
+    length = 0
+    while length < size:
+        line = rnd.choice(templates).format(rnd.choice(words),
+                                            rnd.choice(words).capitalize(),
+                                            rnd.choice(words))
+        parts.append(line)
+        length += len(line)
+    return ''.join(parts)
+
+
+def _file_paths(rnd, count):
+    """
+    Generate the synthetic repository's file names.
+
+    :param rnd: random.Random instance
+    :param count: Number of files
+
+    :return: List of relative paths
+    """
+    total = sum(directories.values())
+    paths = []
+    for top, share in directories.items():
+        n = max(1, count * share // total)
+        for i in range(n):
+            directory = top
+            if n > files_per_directory:
+                directory += '/sub{:03d}'.format(i // files_per_directory)
+            paths.append('{}/{}-{:05d}.php'.format(directory, top, i))
+    rnd.shuffle(paths)
+    return paths[:count]
+
+
+def generate_repository(root, files, seed=0):
+    """
+    Create a synthetic ADOdb-like repository, as a bare upstream
+    repository with a working clone, tagged with bench_version.
+
+    :param root: Directory to create the repositories in
+    :param files: Number of files
+    :param seed: Random seed
+
+    :return: Total size of the files
+    """
+    rnd = random.Random(seed)
+    corpus = _corpus(rnd)
+    work = path.join(root, 'work')
+    os.makedirs(work)
+    _git('init', '--quiet', '--initial-branch=master', work, cwd=root)
+
+    # Real files used by the version stamping, changelog update and
+    # release files filter
+    total = 0
+    for name in ('adodb.inc.php', 'docs/changelog.md', '.gitattributes'):
+        target = path.join(work, name)
+        os.makedirs(path.dirname(target), exist_ok=True)
+        shutil.copyfile(path.join(repo_root, name), target)
+        total += path.getsize(target)
+
+    for name in _file_paths(rnd, files - 3):
+        size = int(rnd.lognormvariate(0, size_sigma) * size_median)
+        size = min(max(size, size_min), size_max)
+        start = rnd.randrange(len(corpus))
+        content = '<?php\n' + (corpus[start:] + corpus)[:size]
+        target = path.join(work, name)
+        os.makedirs(path.dirname(target), exist_ok=True)
+        with open(target, 'w') as f:
+            f.write(content)
+        total += len(content)
+
+    _git('add', '--all', cwd=work)
+    _git('commit', '--quiet', '--message', 'Synthetic repository',
+         '--date', '2026-01-01T00:00:00Z', cwd=work)
+    _git('tag', updateversion.tag_name(bench_version), cwd=work)
+    _git('clone', '--quiet', '--bare', work, path.join(root, 'upstream.git'),
+         cwd=root)
+    _git('remote', 'add', 'origin', path.join(root, 'upstream.git'), cwd=work)
+    _git('fetch', '--quiet', 'origin', cwd=work)
+    return total
+
+
+def get_repository(files, seed=0):
+    """
+    Get a synthetic repository, generating it if it is not cached yet.
+
+    :param files: Number of files
+    :param seed: Random seed
+
+    :return: Tuple (repositories directory, total size of the files)
+    """
+    root = path.join(releasecache.cache_dir(), 'benchmark-repos',
+                     '{}-{}-{}'.format(generator_version, files, seed))
+    info_file = path.join(root, 'info.json')
+    if path.isfile(info_file):
+        with open(info_file) as f:
+            return root, json.load(f)['size']
+
+    if path.isdir(root):
+        # Incomplete generation
+        shutil.rmtree(root)
+    print(f"Generating repository with {files} files...")
+    size = generate_repository(root, files, seed)
+    with open(info_file, 'w') as f:
+        json.dump({'files': files, 'size': size}, f)
+    return root, size
+
+
+class BenchmarkRunner:
+    """
+    Runs the benchmarks on a synthetic repository.
+    """
+    root = ''
+    work = ''
+
+    def __init__(self, root, tracer):
+        """
+        Class Constructor.
+
+        :param root: Repositories directory, see get_repository()
+        :param tracer: instrumentation.Tracer recording the runs
+        """
+        self.root = root
+        self.work = path.join(root, 'work')
+        self.tracer = tracer
+        self._tmp = tempfile.mkdtemp(prefix='adodb-benchmark-')
+
+    def close(self):
+        """
+        Delete the temporary files.
+        """
+        shutil.rmtree(self._tmp)
+
+    def _build(self, output, **settings):
+        settings.setdefault('use_cache', False)
+        builder = buildrelease.ReleaseBuilder(bench_version,
+                                              path.join(self._tmp, output),
+                                              branch='master',
+                                              repo_path=self.work,
+                                              **settings)
+        builder.build()
+
+    def _reset(self):
+        _git('checkout', '--quiet', '--', '.', cwd=self.work)
+
+    def setup(self, benchmark):
+        """
+        Prepare for a benchmark: run it once untimed when it relies on
+        a warm cache or mirror.
+        """
+        if benchmark in ('build-git-cached', 'build-fresh'):
+            self.run(benchmark)
+
+    def run(self, benchmark):
+        """
+        Run a benchmark once.
+        """
+        if benchmark == 'build-worktree':
+            self._build('worktree')
+        elif benchmark == 'build-git':
+            self._build('git', git_objects=True)
+        elif benchmark == 'build-git-cached':
+            self._build('cached', git_objects=True, use_cache=True)
+        elif benchmark == 'build-fresh':
+            self._build('fresh',
+                        git_objects=True,
+                        fresh=True,
+                        upstream=path.join(self.root, 'upstream.git'),
+                        mirror=path.join(self._tmp, 'mirror.git'))
+        elif benchmark == 'version-set':
+            updateversion.version_set(bench_version, do_commit=False,
+                                      cwd=self.work)
+        elif benchmark == 'changelog':
+            updateversion.update_changelog(bench_version, cwd=self.work)
+
+    def teardown(self, benchmark):
+        """
+        Restore the repository after a benchmark run.
+        """
+        if benchmark in ('version-set', 'changelog'):
+            self._reset()
+
+    def measure(self, benchmark, repeat):
+        """
+        Run a benchmark several times.
+
+        :param benchmark: Benchmark name
+        :param repeat: Number of timed runs
+
+        :return: List of span records, see instrumentation.Tracer
+        """
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.setup(benchmark)
+            runs = []
+            for i in range(repeat):
+                with self.tracer.span(benchmark, run=i):
+                    self.run(benchmark)
+                runs.append(self.tracer.spans[-1])
+                self.teardown(benchmark)
+        return runs
+
+
+def _summarize(scale, files, size, benchmark, runs):
+    """
+    Compute and print a benchmark's statistics.
+
+    :return: Result dict
+    """
+    walls = [r['wall'] for r in runs]
+    result = {
+        'scale': scale,
+        'files': files,
+        'size': size,
+        'benchmark': benchmark,
+        'median': statistics.median(walls),
+        'min': min(walls),
+        'cpu': statistics.median(r['cpu'] for r in runs),
+        'peak_rss': max(r['peak_rss'] for r in runs),
+        'runs': runs,
+    }
+    print(f"  {benchmark:<20} {result['median']:8.3f}s "
+          f"(min {result['min']:.3f}s, CPU {result['cpu']:.3f}s)")
+    return result
+
+
+@contextlib.contextmanager
+def _cache_home(directory):
+    """
+    Temporarily relocate the release scripts' cache, to isolate the
+    benchmarked builds from the user's cache.
+    """
+    previous = os.environ.get('XDG_CACHE_HOME')
+    os.environ['XDG_CACHE_HOME'] = directory
+    try:
+        yield
+    finally:
+        if previous is None:
+            del os.environ['XDG_CACHE_HOME']
+        else:
+            os.environ['XDG_CACHE_HOME'] = previous
+
+
+def run_benchmarks(args):
+    """
+    Run the selected benchmarks at the selected scales.
+
+    :return: Results dict
+    """
+    cache = tempfile.mkdtemp(prefix='adodb-benchmark-cache-')
+
+    results = {
+        'commit': current_commit(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'results': [],
+    }
+    try:
+        for scale in args.scale:
+            files = scales[scale]
+            root, size = get_repository(files, args.seed)
+            print(f"Scale '{scale}': {files} files, "
+                  f"{instrumentation.format_size(size)}")
+
+            tracer = instrumentation.Tracer('benchmark', args.profile and
+                                            path.join(args.profile, scale))
+            runner = BenchmarkRunner(root, tracer)
+            try:
+                with _cache_home(cache):
+                    for benchmark in args.benchmark:
+                        runs = runner.measure(benchmark, args.repeat)
+                        results['results'].append(
+                            _summarize(scale, files, size, benchmark, runs))
+            finally:
+                runner.close()
+    finally:
+        shutil.rmtree(cache)
+    return results
+
+
+def load_baseline(results, baseline=None):
+    """
+    Find the results to compare with.
+
+    :param results: Current results
+    :param baseline: Results file, or commit SHA (prefix); defaults to the
+                     latest results for another commit
+
+    :return: Baseline results dict, or None if not found
+    """
+    if baseline and path.isfile(baseline):
+        with open(baseline) as f:
+            return json.load(f)
+
+    for filename in sorted(glob.glob(path.join(results_dir(), '*.json')),
+                           reverse=True):
+        with open(filename) as f:
+            previous = json.load(f)
+        if baseline:
+            if previous['commit'].startswith(baseline):
+                return previous
+        elif previous['commit'] != results['commit']:
+            return previous
+    return None
+
+
+def compare(results, baseline):
+    """
+    Print a comparison of the results with a baseline.
+
+    :return: Number of regressions
+    """
+    print(f"\nComparison with {baseline['commit'][:12]} "
+          f"({baseline['date']})")
+    reference = {(r['scale'], r['benchmark']): r['median']
+                 for r in baseline['results']}
+    regressions = 0
+    for result in results['results']:
+        before = reference.get((result['scale'], result['benchmark']))
+        if not before:
+            continue
+        ratio = result['median'] / before
+        flag = ''
+        if ratio > regression_threshold \
+                and result['median'] - before > regression_min_delta:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"  {result['scale']:<8} {result['benchmark']:<20} "
+              f"{before:8.3f}s -> {result['median']:8.3f}s "
+              f"({ratio - 1:+.0%}){flag}")
+    return regressions
+
+
+def main():
+    args = process_command_line()
+    print(f"Benchmarking commit {current_commit()[:12]}\n")
+
+    results = run_benchmarks(args)
+
+    output = args.output or path.join(
+        results_dir(),
+        f"{time.strftime('%Y%m%d-%H%M%S')}-{results['commit'][:12]}.json"
+    )
+    os.makedirs(path.dirname(path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print(f"\nResults saved in '{output}'")
+
+    baseline = load_baseline(results, args.compare)
+    if baseline is not None:
+        if compare(results, baseline):
+            sys.exit(1)
+    elif args.compare:
+        print(f"ERROR: no results found for '{args.compare}'")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
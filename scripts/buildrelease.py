@@ -3,8 +3,12 @@
 ADOdb release build script
 
 - Create release tag if it does not exist
-- Copy release files to target directory
-- Generate zip/tar balls
+- Generate zip/tar balls directly from the repository's files, either
+  from a worktree checked out at the tag or from the tag's Git objects
+
+Builds are performed by the ReleaseBuilder class, which holds no global
+state and never changes the current directory, so that several releases
+can be built in parallel (see build_batch()).
 
 This file is part of ADOdb, a Database Abstraction Layer library for PHP.
 
@@ -23,17 +27,25 @@ See the LICENSE.md file distributed with this source code for details.
 @author Damien Regad
 """
 
-import errno
+import concurrent.futures
+import contextlib
+import fcntl
 import getopt
-import re
 import os
 from os import path
 import shutil
 import subprocess
 import sys
 import tempfile
+import time
 
+import exportignore
+import gitrepo
+import instrumentation
+import releasearchive
+import releasecache
 import updateversion
+import versions
 
 
 # ADOdb Repository reference
@@ -41,35 +53,32 @@ origin_repo = "https://github.com/ADOdb/ADOdb.git"
 release_branch = "master"
 release_prefix = "adodb"
 
-# Directories and files to exclude from release tarballs
-# For consistency, this should match the list in .gitattributes
-exclude_list = (".git*",
-                ".mailmap",
-                "replicate",
-                "scripts",
-                "tests",
-                "cute_icons_for_site",
-                ".idea",
-                )
+# Local mirror of the upstream repository, for fresh clones
+mirror_path = path.join(releasecache.cache_dir(), 'mirror.git')
 
-# Command-line options
-options = "hb:dfk"
-long_options = ["help", "branch=", "debug", "fresh", "keep"]
+# Name of the lock files preventing concurrent builds from stepping on
+# each other (created in the release path and in the Git directory)
+lock_file = '.buildrelease.lock'
 
-# Global flags
-debug_mode = False
-fresh_clone = False
-cleanup = True
+# Command-line options
+options = "hb:dfkgr:F:l:j:nRu:m:P:"
+long_options = ["help", "branch=", "debug", "fresh", "keep", "git-objects",
+                "ref=", "format=", "level=", "jobs=", "no-cache",
+                "reproducible", "upstream=", "mirror=", "parallel=",
+                "trace=", "profile="]
 
 
 def usage():
     """
     Print script's command-line arguments help.
     """
-    print('''Usage: {} [options] version release_path
+    print('''Usage: {} [options] version [version...] release_path
 
     Parameters:
-        version                 ADOdb version to bundle (e.g. v5.19)
+        version                 ADOdb version to bundle (e.g. v5.19); when
+                                several versions are given, they are built
+                                in parallel, each in a subdirectory of
+                                release_path named after the version
         release_path            Where to save the release tarballs
 
     Options:
@@ -79,51 +88,611 @@ def usage():
                                 releases, or 'hotfix/<version>' for patches)
         -d | --debug            Debug mode (ignores upstream: no fetch, allows
                                 build even if local branch is not in sync)
-        -f | --fresh            Create a fresh clone of the repository
-        -k | --keep             Keep build directories after completion
-                                (useful for debugging)
+        -f | --fresh            Create a fresh clone of the repository,
+                                sharing objects with a local mirror of the
+                                upstream repository
+        -m | --mirror <path>    Location of the local mirror
+                                (defaults to '{}')
+        -u | --upstream <url>   Upstream repository (defaults to '{}')
+        -k | --keep             Keep the fresh clone's directory after
+                                completion (useful for debugging)
+        -g | --git-objects      Read the release files from the tag's tree in
+                                the Git object database instead of a
+                                checked out worktree
+        -r | --ref <tree-ish>   Build the given tag or commit, without
+                                checking or creating the release tag
+                                (implies --git-objects)
+        -F | --format <list>    Comma-separated list of archive formats to
+                                create, among {} (defaults to '{}')
+        -l | --level <level>    Compression level (defaults to {})
+        -j | --jobs <count>     Number of parallel compression jobs per build
+                                (defaults to the number of CPUs, divided by
+                                the number of parallel builds)
+        -n | --no-cache         Do not use the artifact cache (Git objects
+                                mode only) located in '{}'
+        -R | --reproducible     Create byte-for-byte reproducible archives,
+                                with timestamps set to the release commit's
+                                date (or $SOURCE_DATE_EPOCH if defined)
+        -P | --parallel <count> Maximum number of releases to build in
+                                parallel (defaults to the number of CPUs)
+        --trace <file>          Save the build phases' timings trace to the
+                                given JSON file (defaults to a new file in
+                                '{}')
+        --profile <dir>         Save cProfile and tracemalloc dumps of each
+                                build phase in the given directory
 '''.format(
         path.basename(__file__),
-        release_branch
+        release_branch,
+        mirror_path,
+        origin_repo,
+        ', '.join(releasearchive.all_formats),
+        ','.join(releasearchive.default_formats),
+        releasearchive.default_level,
+        releasecache.cache_dir(),
+        path.dirname(instrumentation.trace_file('buildrelease'))
     ))
 # end usage()
 
 
-def set_version_and_tag(version):
-    global release_branch, debug_mode, fresh_clone, cleanup
+def _int_option(opt, val, minimum):
+    """
+    Parse a numeric command-line option's value, exiting with an error
+    message if it is not a valid number.
+
+    :param opt: Option name, for the error message
+    :param val: Option value
+    :param minimum: Smallest allowed value
+
+    :return: Value as an int
+    """
+    try:
+        value = int(val)
+    except ValueError:
+        value = None
+    if value is None or value < minimum:
+        usage()
+        print("ERROR: {} must be an integer greater than or equal to {}"
+              .format(opt, minimum))
+        sys.exit(1)
+    return value
+
+
+class BuildError(Exception):
+    """
+    Release build failure.
+
+    The status attribute holds the script's exit code.
+    """
+
+    def __init__(self, message, status=1):
+        super().__init__(message)
+        self.status = status
+
+
+@contextlib.contextmanager
+def locked(filename):
+    """
+    Context manager holding an exclusive lock on the given file, waiting
+    until it is available.
 
-    # Delete existing tag to force creation in debug mode
-    if debug_mode:
+    :param filename: Lock file, created if needed
+    """
+    with open(filename, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
         try:
-            updateversion.tag_delete(version)
-        except subprocess.CalledProcessError:
-            pass
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def default_branch(version):
+    """
+    Get the branch a release is built from.
+
+    :param version: Normalized version number
+    :return: 'hotfix/X.Y' for patch releases, release_branch otherwise
+    """
+    version = versions.Version.parse(version)
+    if version.is_patch:
+        return 'hotfix/' + version.series
+    return release_branch
+
+
+def source_date(reader, rev):
+    """
+    Get the timestamp to use for the archives' entries.
+
+    :param reader: gitrepo.GitObjectReader instance
+    :param rev: Release tag or commit
+
+    :return: $SOURCE_DATE_EPOCH if defined (see
+             https://reproducible-builds.org/specs/source-date-epoch/),
+             the commit's date otherwise
+    """
+    epoch = os.environ.get('SOURCE_DATE_EPOCH')
+    if epoch:
+        return int(epoch)
+    return reader.commit_time(rev)
+
+
+class ReleaseBuilder:
+    """
+    Builds one ADOdb release.
+
+    All settings and state are held by the instance. The repository's
+    working copy is never modified: files are archived from a dedicated
+    worktree or straight from the Git objects, and the version bump commit
+    is made in a worktree of the release branch, unless that branch is
+    the one currently checked out.
+    """
+    version = ''
+    release_path = ''
+    branch = ''
+    repo_path = ''
+
+    def __init__(self, version, release_path, branch=None, repo_path=None,
+                 debug=False, fresh=False, keep=False, git_objects=False,
+                 ref=None, formats=releasearchive.default_formats,
+                 level=releasearchive.default_level, jobs=None,
+                 use_cache=True, reproducible=False, upstream=origin_repo,
+                 mirror=mirror_path, log_prefix='', profile_dir=None,
+                 opener=None):
+        """
+        Class Constructor.
+
+        :param version: Normalized version number (see
+                        updateversion.version_check())
+        :param release_path: Where to save the release files
+        :param branch: Release branch, defaults to default_branch()
+        :param repo_path: Git repository, defaults to the one containing
+                          the current directory (ignored if fresh is True)
+        :param debug: Debug mode (no fetch, no upstream sync check, tag
+                      is recreated)
+        :param fresh: Build from a fresh clone of the upstream repository
+        :param keep: Keep the fresh clone after completion
+        :param git_objects: Archive the tag's Git objects directly
+        :param ref: Tag or commit to build instead of the release tag
+        :param formats: Archive formats to create
+        :param level: Compression level
+        :param jobs: Number of parallel compression jobs
+        :param use_cache: Use the artifact cache
+        :param reproducible: Create reproducible archives
+        :param upstream: Upstream repository URL
+        :param mirror: Location of the upstream repository's local mirror
+        :param log_prefix: Prefix for the messages printed during the build
+        :param profile_dir: Where to save the build phases' profiling data
+                            (see instrumentation.Tracer)
+        :param opener: Callable returning the binary stream to write a
+                       release file to, given its full path (see
+                       releasearchive.ReleaseArchiver); by default, the
+                       files are created in release_path. Otherwise,
+                       nothing is written there, and the artifact cache
+                       is only used for the zip members.
+        """
+        self.version = version
+        self.release_path = path.abspath(release_path)
+        self.branch = branch or default_branch(version)
+        self.repo_path = repo_path
+        self.debug = debug
+        self.fresh = fresh
+        self.keep = keep
+        self.git_objects = git_objects or ref is not None
+        self.ref = ref
+        self.formats = formats
+        self.level = level
+        self.jobs = jobs
+        self.use_cache = use_cache
+        self.reproducible = reproducible
+        self.upstream = upstream
+        self.mirror = mirror
+        self.log_prefix = log_prefix
+        self.tracer = instrumentation.Tracer('buildrelease', profile_dir)
+        self.opener = opener
+
+        self._worktrees = []
+        self._repo = None
+
+    def log(self, message=''):
+        """
+        Print a progress message.
+        """
+        print(self.log_prefix + message)
+
+    def _git(self, *args, cwd=None):
+        """
+        Run a git command in the repository (or the given directory).
+
+        :return: Command's output
+        """
+        return subprocess.check_output(('git',) + args,
+                                       cwd=cwd or self.repo_path,
+                                       text=True)
+
+    @property
+    def repo(self):
+        """
+        In-process access to the repository (refs, objects and status),
+        shared by all the build's steps.
+        """
+        if self._repo is None or self._repo.root != self.repo_path:
+            self._close_repo()
+            self._repo = gitrepo.Repository(self.repo_path)
+        return self._repo
+
+    def _close_repo(self):
+        if self._repo is not None:
+            self._repo.close()
+            self._repo = None
+
+    def _repo_lock(self):
+        """
+        Lock serializing the builds' operations on the shared repository
+        (fetch, tags, worktrees).
+        """
+        return locked(path.join(self.repo.common_dir, lock_file))
+
+    def build(self):
+        """
+        Build the release.
+
+        :return: List of created files
+        """
+        if self.opener is not None:
+            release_lock = contextlib.nullcontext()
+        else:
+            os.makedirs(self.release_path, exist_ok=True)
+            release_lock = locked(path.join(self.release_path, lock_file))
+        try:
+            with release_lock:
+                try:
+                    return self._build()
+                finally:
+                    with self.tracer.span('cleanup'):
+                        self._cleanup()
+        except subprocess.CalledProcessError as err:
+            message = "command '{}' failed with exit status {}".format(
+                ' '.join(err.cmd), err.returncode)
+            raise BuildError(message) from err
+
+    def _build(self):
+        if self.opener is None:
+            self.log("Building ADOdb release {} into '{}'\n".format(
+                self.version,
+                self.release_path
+            ))
+        else:
+            self.log("Building ADOdb release {}\n".format(self.version))
+
+        if self.debug:
+            self.log("DEBUG MODE: ignoring upstream repository status")
+
+        with self.tracer.span('repository', fresh=self.fresh):
+            self._prepare_repository()
+        with self.tracer.span('tag'):
+            rev = self._prepare_tag()
+
+        # Create tarballs
+        release_files = release_prefix + self.version.split(".")[0]
+        release_name = release_prefix + '-' + self.version
+        basename = path.join(self.release_path, release_name)
+        if self.opener is None:
+            self.log("Creating release tarballs in '{}'...".format(
+                self.release_path))
+        else:
+            self.log("Creating and streaming release tarballs...")
+        with self.tracer.span('archive', formats=list(self.formats)):
+            if self.git_objects:
+                self.log("Reading release files from Git objects for '{}'"
+                         .format(rev))
+                archives, manifest = self._build_from_git(rev, basename,
+                                                          release_files)
+            else:
+                archives, manifest = self._build_from_worktree(
+                    rev, basename, release_files)
+        for archive in archives.values():
+            self.log("- " + path.basename(archive))
+
+        # Checksums and manifest, computed while writing the archives
+        self.log("Saving checksums and manifest")
+        created = list(archives.values())
+        with self.tracer.span('manifest'):
+            sums = releasearchive.write_manifest(manifest, basename,
+                                                 self.opener)
+        for filename in sums:
+            self.log("- " + path.basename(filename))
+            created.append(filename)
+
+        # Done
+        if self.opener is None:
+            self.log("\nADOdb release {} build complete, files saved in '{}'."
+                     .format(self.version, self.release_path))
+        else:
+            self.log("\nADOdb release {} build complete.".format(self.version))
+        return created
+
+    def _prepare_repository(self):
+        """
+        Set up the repository to build from: either create a fresh clone,
+        or update the existing one.
+        """
+        # Only the release branch and tag are fetched from upstream
+        fetch_tags = [updateversion.tag_name(self.version)]
+        if self.ref is not None:
+            fetch_tags.append(self.ref)
+
+        if self.fresh:
+            # Update the local mirror, and create a new repo clone from it
+            self.log("Updating local mirror '{}'".format(self.mirror))
+            os.makedirs(path.dirname(self.mirror), exist_ok=True)
+            try:
+                with locked(self.mirror + '.lock'), \
+                        self.tracer.span('mirror'):
+                    gitrepo.update_mirror(self.mirror, self.upstream,
+                                          self.branch, fetch_tags)
+            except subprocess.CalledProcessError:
+                raise BuildError("unable to fetch from '{}'"
+                                 .format(self.upstream), 3)
+            self.log("Cloning a new repository")
+            self.repo_path = tempfile.mkdtemp(prefix=release_prefix + "-",
+                                              suffix=".git")
+            with self.tracer.span('clone'):
+                gitrepo.clone_from_mirror(self.mirror, self.upstream,
+                                          self.repo_path, self.branch)
+            return
+
+        # Git repo's root directory
+        self.repo_path = updateversion.git_root(self.repo_path)
+        if self.repo_path is None:
+            raise BuildError("cannot build from a bare repository", 3)
+
+        # Update the repository
+        if not self.debug and self.ref is None:
+            self.log("Updating repository in '{}'".format(self.repo_path))
+            try:
+                with self._repo_lock(), self.tracer.span('fetch'):
+                    gitrepo.fetch_release_refs(self.repo_path, 'origin',
+                                               self.branch, fetch_tags)
+            except subprocess.CalledProcessError:
+                raise BuildError("unable to fetch", 3)
+
+    def _prepare_tag(self):
+        """
+        Check existence of Tag for version in repo, create if not found.
 
-    # Checkout release branch
-    subprocess.call("git checkout {}".format(release_branch), shell=True)
+        :return: Tag or commit to build
+        """
+        if self.ref is not None:
+            return self.ref
 
-    if not debug_mode:
-        # Make sure we're up-to-date, ignore untracked files
-        ret = subprocess.check_output(
-            "git status --branch --porcelain --untracked-files=no",
-            text=True,
-            shell=True
+        with self._repo_lock():
+            tag_exists = updateversion.tag_check(self.version,
+                                                 repo=self.repo)
+
+            if not tag_exists or self.debug:
+                self._set_version_and_tag()
+                if not updateversion.tag_check(self.version, repo=self.repo):
+                    raise BuildError("failed to create tag '{}'".format(
+                        updateversion.tag_name(self.version)))
+
+        return updateversion.tag_name(self.version)
+
+    def _set_version_and_tag(self):
+        # Delete existing tag to force creation in debug mode
+        if self.debug:
+            try:
+                updateversion.tag_delete(self.version, self.repo_path)
+            except subprocess.CalledProcessError:
+                pass
+
+        workdir = self._branch_workdir()
+
+        if not self.debug:
+            # Make sure we're up-to-date with the upstream branch, if any
+            upstream = self.repo.ref('refs/remotes/origin/' + self.branch)
+            if upstream is not None \
+                    and upstream != self.repo.ref('refs/heads/' + self.branch):
+                raise BuildError("branch must be aligned with upstream", 4)
+
+        # Update the code, create commit and tag
+        updateversion.version_set(self.version, cwd=workdir)
+
+        # Make sure we don't delete the modified repo
+        if self.fresh:
+            self.keep = True
+
+    def _branch_workdir(self):
+        """
+        Get a working copy of the release branch, to commit the version
+        bump in.
+
+        :return: The repository itself if the release branch is checked
+                 out there, otherwise a new worktree
+        """
+        if self.repo.head_branch() == self.branch:
+            if not self.repo.is_clean():
+                raise BuildError("there are uncommitted changes in the "
+                                 "repository", 3)
+            return self.repo_path
+
+        try:
+            return self._add_worktree(self.branch)
+        except subprocess.CalledProcessError:
+            raise BuildError("unable to check out branch '{}' in a worktree"
+                             .format(self.branch), 3)
+
+    def _add_worktree(self, rev, detach=False):
+        """
+        Create a temporary worktree, removed after the build.
+
+        :param rev: Branch or commit to check out
+        :param detach: Detach HEAD instead of checking out the branch
+
+        :return: Worktree path
+        """
+        worktree = tempfile.mkdtemp(prefix=release_prefix + "-worktree-")
+        args = ['worktree', 'add', '--quiet']
+        if detach:
+            args.append('--detach')
+        self._git(*args, worktree, rev)
+        self._worktrees.append(worktree)
+        return worktree
+
+    def _cleanup(self):
+        """
+        Delete the temporary worktrees, close the repository and delete the
+        fresh clone unless it must be kept.
+        """
+        if self._worktrees:
+            with self._repo_lock():
+                for worktree in self._worktrees:
+                    self._git('worktree', 'remove', '--force', worktree)
+            self._worktrees = []
+        self._close_repo()
+
+        if self.fresh and self.repo_path:
+            if not self.keep:
+                self.log("Deleting repository clone")
+                shutil.rmtree(self.repo_path)
+            else:
+                self.log("\nThe repository clone in '{}' was kept."
+                         .format(self.repo_path))
+                self.log("Delete it manually when it is no longer needed.")
+
+    def _build_from_worktree(self, rev, basename, prefix):
+        """
+        Create the release archives from a worktree checked out at the tag.
+
+        :param rev: Tag or commit to archive
+        :param basename: Archives' full path, without extension
+        :param prefix: Top-level directory name inside the archives
+
+        :return: Tuple (dict of archive format => archive file, manifest)
+        """
+        with self._repo_lock():
+            worktree = self._add_worktree(rev, detach=True)
+
+        mtime = None
+        if self.reproducible:
+            mtime = source_date(self.repo.objects, rev)
+        return releasearchive.build_archives(
+            releasearchive.walk_tree(
+                worktree,
+                exportignore.ExportIgnore.load(worktree)
+            ),
+            basename,
+            prefix,
+            mtime,
+            formats=self.formats,
+            level=self.level,
+            jobs=self.jobs,
+            reproducible=self.reproducible,
+            opener=self.opener
         )
-        if not re.search(release_branch + "$", ret):
-            print("\nERROR: branch must be aligned with upstream")
-            sys.exit(4)
 
-    # Update the code, create commit and tag
-    updateversion.version_set(version)
+    def _build_from_git(self, rev, basename, prefix):
+        """
+        Create the release archives from a Git tag or commit's objects.
+
+        The archives are retrieved from the artifact cache if the same tree
+        was already built with the same settings; otherwise, they are built
+        reusing the cached zip members of unchanged files, and then stored
+        in the cache.
+
+        :param rev: Tag or commit to archive
+        :param basename: Archives' full path, without extension
+        :param prefix: Top-level directory name inside the archives
+
+        :return: Tuple (dict of archive format => archive file, manifest)
+        """
+        reader = self.repo.objects
+        tree = reader.resolve(rev + '^{tree}')
+        mtime = source_date(reader, rev)
+        exclude = exportignore.ExportIgnore.from_git(reader, rev)
+
+        files = {fmt: basename + '.' + fmt for fmt in self.formats}
+        cache = releasecache.ArtifactCache() if self.use_cache else None
+        # Cached archives are files, they can't be reused when streaming
+        store = cache is not None and self.opener is None
+        if store:
+            # Non-reproducible zips store local times, which depend on the
+            # timezone's offset at the archives' timestamp
+            utc_offset = None
+            if not self.reproducible:
+                utc_offset = time.localtime(mtime).tm_gmtoff
+            key = cache.key(tree,
+                            mtime=mtime,
+                            prefix=prefix,
+                            exclude=exclude.key,
+                            formats=sorted(self.formats),
+                            level=self.level,
+                            reproducible=self.reproducible,
+                            utc_offset=utc_offset)
+            with self.tracer.span('cache-fetch'):
+                manifest = cache.fetch(key, files)
+            if manifest is not None:
+                self.log("Retrieved archives for tree {} from cache"
+                         .format(tree))
+                return files, manifest
+
+        archives, manifest = releasearchive.build_archives(
+            releasearchive.walk_git_tree(reader, rev, exclude),
+            basename,
+            prefix,
+            mtime,
+            self.formats,
+            self.level,
+            self.jobs,
+            cache.member_cache(self.level) if cache else None,
+            self.reproducible,
+            self.opener
+        )
 
-    # Make sure we don't delete the modified repo
-    if fresh_clone:
-        cleanup = False
+        if store:
+            with self.tracer.span('cache-store'):
+                cache.store(key, archives, manifest)
+        return archives, manifest
 
 
-def main():
-    global release_branch, debug_mode, fresh_clone, cleanup
+def _run_build(settings):
+    """
+    Build a release in a worker process, see build_batch().
 
+    :return: Tuple (list of created files, recorded spans, tracer's start
+             time)
+    """
+    builder = ReleaseBuilder(**settings)
+    return builder.build(), builder.tracer.spans, builder.tracer.started
+
+
+def build_batch(builds, processes=None, tracer=None):
+    """
+    Build several releases in parallel, in a process pool.
+
+    :param builds: List of dicts of ReleaseBuilder constructor arguments
+    :param processes: Maximum number of concurrent builds, defaults to the
+                      number of CPUs
+    :param tracer: instrumentation.Tracer to add the builds' spans to
+
+    :return: Dict of version => list of created files, or the exception
+             that caused the build to fail
+    """
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+        futures = {pool.submit(_run_build, settings): settings['version']
+                   for settings in builds}
+        for future in concurrent.futures.as_completed(futures):
+            version = futures[future]
+            try:
+                results[version], spans, started = future.result()
+            except Exception as err:
+                results[version] = err
+                continue
+            if tracer is not None:
+                tracer.merge(spans, version, started)
+    return results
+
+
+def main():
     # Get command-line options
     try:
         opts, args = getopt.gnu_getopt(sys.argv[1:], options, long_options)
@@ -137,145 +706,138 @@ def main():
         print("ERROR: please specify the version and release_path")
         sys.exit(1)
 
+    settings = {}
+    parallel = None
+    trace = None
     for opt, val in opts:
         if opt in ("-h", "--help"):
             usage()
             sys.exit(0)
 
         elif opt in ("-b", "--branch"):
-            release_branch = val
+            settings['branch'] = val
 
         elif opt in ("-d", "--debug"):
-            debug_mode = True
+            settings['debug'] = True
 
         elif opt in ("-f", "--fresh"):
-            fresh_clone = True
+            settings['fresh'] = True
 
         elif opt in ("-k", "--keep"):
-            cleanup = False
+            settings['keep'] = True
 
-    # Mandatory parameters
-    version = updateversion.version_check(args[0])
-    release_path = args[1]
+        elif opt in ("-g", "--git-objects"):
+            settings['git_objects'] = True
 
-    # Default release branch
-    if updateversion.version_is_patch(version):
-        release_branch = 'hotfix/' + version.rsplit('.', 1)[0]
+        elif opt in ("-r", "--ref"):
+            settings['ref'] = val
 
-    # -------------------------------------------------------------------------
-    # Start the build
-    #
-    global release_prefix
+        elif opt in ("-F", "--format"):
+            settings['formats'] = val.split(',')
+            for fmt in settings['formats']:
+                if fmt not in releasearchive.all_formats:
+                    usage()
+                    print("ERROR: unsupported archive format '{}'"
+                          .format(fmt))
+                    sys.exit(1)
+            if ('tar.zst' in settings['formats']
+                    and releasearchive.zstandard is None):
+                print("ERROR: the tar.zst format requires the 'zstandard' "
+                      "Python package")
+                sys.exit(1)
 
-    print("Building ADOdb release {} into '{}'\n".format(
-        version,
-        release_path
-    ))
+        elif opt in ("-l", "--level"):
+            settings['level'] = _int_option(opt, val, 0)
 
-    if debug_mode:
-        print("DEBUG MODE: ignoring upstream repository status")
-
-    if fresh_clone:
-        # Create a new repo clone
-        print("Cloning a new repository")
-        repo_path = tempfile.mkdtemp(prefix=release_prefix + "-",
-                                     suffix=".git")
-        subprocess.call(
-            "git clone {} {}".format(origin_repo, repo_path),
-            shell=True
-        )
-        os.chdir(repo_path)
-    else:
-        # Git repo's root directory
-        repo_path = updateversion.git_root()
-        os.chdir(repo_path)
+        elif opt in ("-j", "--jobs"):
+            settings['jobs'] = _int_option(opt, val, 1)
 
-        # Check for any uncommitted changes
-        try:
-            subprocess.check_output(
-                "git diff --exit-code && "
-                "git diff --cached --exit-code",
-                shell=True
-                )
-        except subprocess.CalledProcessError:
-            print("ERROR: there are uncommitted changes in the repository")
-            sys.exit(3)
+        elif opt in ("-n", "--no-cache"):
+            settings['use_cache'] = False
 
-        # Update the repository
-        if not debug_mode:
-            print("Updating repository in '{}'".format(os.getcwd()))
-            try:
-                subprocess.check_output("git fetch", shell=True)
-            except subprocess.CalledProcessError:
-                print("ERROR: unable to fetch\n")
-                sys.exit(3)
+        elif opt in ("-R", "--reproducible"):
+            settings['reproducible'] = True
 
-    # Check existence of Tag for version in repo, create if not found
-    try:
-        updateversion.tag_check(version)
-        if debug_mode:
-            set_version_and_tag(version)
-    except subprocess.CalledProcessError:
-        set_version_and_tag(version)
-
-    # Copy files to release dir
-    release_files = release_prefix + version.split(".")[0]
-    release_tmp_dir = path.join(release_path, release_files)
-    print("Copying release files to '{}'".format(release_tmp_dir))
-    retry = True
-    while True:
+        elif opt in ("-u", "--upstream"):
+            settings['upstream'] = val
+
+        elif opt in ("-m", "--mirror"):
+            settings['mirror'] = path.abspath(val)
+
+        elif opt in ("-P", "--parallel"):
+            parallel = _int_option(opt, val, 1)
+
+        elif opt == "--trace":
+            trace = path.abspath(val)
+
+        elif opt == "--profile":
+            settings['profile_dir'] = path.abspath(val)
+
+    # Only xz supports level 0 (no compression)
+    formats = settings.get('formats', releasearchive.default_formats)
+    min_level = 0 if set(formats) == {'tar.xz'} else 1
+    level = settings.get('level', releasearchive.default_level)
+    if not min_level <= level <= 9:
+        usage()
+        print("ERROR: compression level must be between {} and 9"
+              .format(min_level))
+        sys.exit(1)
+
+    # Mandatory parameters
+    requested = [updateversion.version_check(v) for v in args[:-1]]
+    release_path = path.abspath(args[-1])
+
+    # Single release build
+    if len(requested) == 1:
+        builder = ReleaseBuilder(requested[0], release_path, **settings)
         try:
-            shutil.copytree(
-                repo_path,
-                release_tmp_dir,
-                ignore=shutil.ignore_patterns(*exclude_list)
-            )
-            break
-        except OSError as err:
-            # First try and file exists, try to delete dir
-            if retry and err.errno == errno.EEXIST:
-                print("WARNING: Directory '{}' exists, delete it and retry"
-                      .format(release_tmp_dir))
-                shutil.rmtree(release_tmp_dir)
-                retry = False
-                continue
-            else:
-                # We already tried to delete or some other error occurred
-                raise
-
-    # Create tarballs
-    print("Creating release tarballs...")
-    release_name = release_prefix + '-' + version
-
-    os.chdir(release_path)
-    print("- tar")
-    subprocess.call(
-        "tar -czf {}.tar.gz {}".format(release_name, release_files),
-        shell=True
-    )
-    print("- zip")
-    subprocess.call(
-        "zip -rq {}.zip {}".format(release_name, release_files),
-        shell=True
-    )
-
-    if cleanup:
-        print("Deleting working directories")
-        shutil.rmtree(release_tmp_dir)
-        if fresh_clone:
-            shutil.rmtree(repo_path)
-    else:
-        print("\nThe following working directories were kept:")
-        if fresh_clone:
-            print("- '{}' (repo clone)".format(repo_path))
-        print("- '{}' (release temp dir)".format(release_tmp_dir))
-        print("Delete them manually when they are no longer needed.")
-
-    # Done
-    print("\nADOdb release {} build complete, files saved in '{}'.".format(
-        version,
-        release_path
+            builder.build()
+        except BuildError as err:
+            print("\nERROR: {}".format(err))
+            sys.exit(err.status)
+        builder.tracer.report(requested[0], trace)
+        print("Don't forget to generate a README file with the changelog")
+        return
+
+    # Batch build
+    if 'branch' in settings or 'ref' in settings:
+        print("ERROR: --branch and --ref can't be used with multiple versions")
+        sys.exit(1)
+    if parallel is None:
+        parallel = min(len(requested), os.cpu_count() or 1)
+    if 'jobs' not in settings:
+        settings['jobs'] = max(1, (os.cpu_count() or 1) // parallel)
+
+    print("Building {} ADOdb releases, {} at a time\n".format(
+        len(requested),
+        parallel
     ))
+    builds = [dict(settings,
+                   version=version,
+                   release_path=path.join(release_path, version),
+                   log_prefix='[{}] '.format(version))
+              for version in requested]
+    if 'profile_dir' in settings:
+        for build in builds:
+            build['profile_dir'] = path.join(settings['profile_dir'],
+                                             build['version'])
+    tracer = instrumentation.Tracer('buildrelease')
+    with tracer.span('batch', parallel=parallel):
+        results = build_batch(builds, parallel, tracer)
+
+    print()
+    status = 0
+    for version in requested:
+        result = results[version]
+        if isinstance(result, Exception):
+            print("{}: FAILED - {}".format(version, result))
+            status = getattr(result, 'status', 1)
+        else:
+            output = path.join(release_path, version)
+            print("{}: OK - {}".format(version, output))
+    tracer.report(','.join(requested), trace)
+    if status:
+        sys.exit(status)
     print("Don't forget to generate a README file with the changelog")
 
 # end main()
@@ -0,0 +1,550 @@
+"""
+ADOdb Changelog index and editor.
+
+- ChangelogFile class
+  Parses a changelog file once, mapping each version section and link
+  reference to its byte range in the file; parsed files are cached until
+  they are modified.
+- ChangelogIndex class
+  Queries across the current changelog (docs/changelog.md) and the older
+  versions' archives: section lookup, previous version, sections between
+  two versions, release notes.
+- ChangelogEditor class
+  Applies section and link edits to a changelog in memory, shows the
+  resulting diff, and writes the file once, atomically.
+
+This file is part of ADOdb, a Database Abstraction Layer library for PHP.
+
+@package ADOdb
+@link https://adodb.org Project's web site and documentation
+@link https://github.com/ADOdb/ADOdb Source code and issue tracker
+
+The ADOdb Library is dual-licensed, released under both the BSD 3-Clause
+and the GNU Lesser General Public Licence (LGPL) v2.1 or, at your option,
+any later version. This means you can use it in proprietary products.
+See the LICENSE.md file distributed with this source code for details.
+@license BSD-3-Clause
+@license LGPL-2.1-or-later
+
+@copyright 2026 Damien Regad, Mark Newnham and the ADOdb community
+"""
+
+import bisect
+import difflib
+import glob
+import os
+import re
+import tempfile
+from os import path
+from pathlib import Path
+
+import versions
+
+# Current changelog, and older versions' archives
+changelog_file = 'docs/changelog.md'
+archives_pattern = 'docs/changelog_v*.md'
+
+# Section heading, e.g. `## [5.22.0] - 2022-02-08` or `## 4.990/5.05 - ...`
+_section_regex = re.compile(rb'^## \[?([^\]\s]+)\]?(?: - (.*?))?[ \t]*$',
+                            re.M)
+# Link reference definition, e.g. `[5.22.0]: https://...`
+_link_regex = re.compile(rb'^\[([^\]]+)\]: (\S+)[ \t]*$', re.M)
+
+
+def version_key(version):
+    """
+    Get a sort key for a version number (see versions.Version), with a
+    fallback for section names that are not valid version numbers.
+
+    :param version: Version number, with or without 'v' prefix
+
+    :return: Tuple
+    """
+    try:
+        return versions.Version.parse(version).key
+    except ValueError:
+        numbers = [int(n) for n in re.findall(r'\d+', version)][:3]
+        return tuple(numbers + [0] * (3 - len(numbers))) + ('', -1, 0)
+
+
+class Section:
+    """
+    A version's section in a changelog file.
+
+    start and end are the byte offsets of the section (including its
+    heading) in the file, body_start the offset following the heading.
+    """
+    version = ''
+    date = ''
+    file = None
+    start = 0
+    body_start = 0
+    end = 0
+
+    def __init__(self, version, date, file, start, body_start, end):
+        self.version = version
+        self.date = date
+        self.file = file
+        self.start = start
+        self.body_start = body_start
+        self.end = end
+
+    @property
+    def released(self):
+        """
+        Whether the version has been released (i.e. it has a date).
+        """
+        return bool(self.date) and self.date != 'Unreleased'
+
+    @property
+    def aliases(self):
+        """
+        Version numbers covered by the section; old v4/v5 sections are
+        named after both releases, e.g. `4.990/5.05`.
+        """
+        return self.version.split('/')
+
+    @property
+    def text(self):
+        """
+        Section's full text, including the heading.
+        """
+        return self.file.data[self.start:self.end].decode()
+
+    @property
+    def body(self):
+        """
+        Section's contents, without the heading and surrounding blank lines.
+        """
+        return self.file.data[self.body_start:self.end].decode().strip()
+
+    def __repr__(self):
+        return "<Section {} ({}) in {}>".format(self.version, self.date,
+                                                self.file.filename)
+
+
+class Link:
+    """
+    A link reference definition, e.g. `[5.22.0]: https://...`
+    """
+    label = ''
+    url = ''
+    start = 0
+    end = 0
+
+    def __init__(self, label, url, start, end):
+        self.label = label
+        self.url = url
+        self.start = start
+        self.end = end
+
+
+class ChangelogFile:
+    """
+    Parsed changelog file.
+
+    Use ChangelogFile.load() to benefit from the parsed files cache.
+    """
+    filename = ''
+    data = b''
+    sections = None
+    links = None
+
+    _cache = {}
+
+    def __init__(self, filename, data):
+        """
+        Class Constructor.
+
+        :param filename: Changelog file
+        :param data: File contents
+        """
+        self.filename = filename
+        self.data = data
+        self.sections = []
+        self.links = {}
+        self._parse()
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Get a parsed changelog file, parsing it only if it was modified
+        since the last call.
+
+        :param filename: Changelog file
+
+        :return: ChangelogFile object
+        """
+        filename = path.abspath(filename)
+        st = os.stat(filename)
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = cls._cache.get(filename)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        with open(filename, 'rb') as f:
+            parsed = cls(filename, f.read())
+        cls._cache[filename] = (stamp, parsed)
+        return parsed
+
+    def _parse(self):
+        links = [Link(m.group(1).decode(), m.group(2).decode(),
+                      m.start(), m.end())
+                 for m in _link_regex.finditer(self.data)]
+        self.links = {link.label: link for link in links}
+        link_starts = [link.start for link in links]
+
+        headings = list(_section_regex.finditer(self.data))
+        for i, match in enumerate(headings):
+            if i + 1 < len(headings):
+                end = headings[i + 1].start()
+            else:
+                # The last section ends where the link references start
+                pos = bisect.bisect_left(link_starts, match.end())
+                end = link_starts[pos] if pos < len(link_starts) \
+                    else len(self.data)
+            date = match.group(2).decode() if match.group(2) else ''
+            self.sections.append(Section(match.group(1).decode(),
+                                         date,
+                                         self,
+                                         match.start(),
+                                         match.end(),
+                                         end))
+
+
+class ChangelogIndex:
+    """
+    Index of the versions documented in a set of changelog files.
+
+    When a version appears in several files, the first file wins.
+    """
+    files = None
+
+    def __init__(self, files):
+        """
+        Class Constructor.
+
+        :param files: List of ChangelogFile objects, by priority
+        """
+        self.files = files
+        self._sections = {}
+        for changelog in files:
+            for section in changelog.sections:
+                for alias in section.aliases:
+                    self._sections.setdefault(alias, section)
+
+        entries = sorted((version_key(v), v)
+                         for v in self._sections)
+        self._keys = [key for key, version in entries]
+        self._versions = [version for key, version in entries]
+
+    def __contains__(self, version):
+        return version in self._sections
+
+    def section(self, version):
+        """
+        Get a version's section.
+
+        :param version: Version number
+
+        :return: Section object, or None if not found
+        """
+        return self._sections.get(version)
+
+    def text(self, version):
+        """
+        Get a version's section text.
+
+        :param version: Version number
+
+        :return: Section text including its heading, or None if not found
+        """
+        section = self.section(version)
+        return section.text if section is not None else None
+
+    def release_notes(self, version):
+        """
+        Get a version's release notes.
+
+        :param version: Version number
+
+        :return: Section contents without the heading, or None if not found
+        """
+        section = self.section(version.lstrip('v'))
+        return section.body if section is not None else None
+
+    def link(self, version):
+        """
+        Get a version's link reference definition.
+
+        :param version: Version number
+
+        :return: Link object, or None if not found
+        """
+        for changelog in self.files:
+            if version in changelog.links:
+                return changelog.links[version]
+        return None
+
+    def previous(self, version, released=False):
+        """
+        Get the most recent version preceding the given one.
+
+        :param version: Version number (does not need to be in the index)
+        :param released: Only consider released versions
+
+        :return: Version number, or None if there is no previous version
+        """
+        pos = bisect.bisect_left(self._keys, version_key(version))
+        while pos > 0:
+            pos -= 1
+            previous = self._versions[pos]
+            if not released or self._sections[previous].released:
+                return previous
+        return None
+
+    def latest(self, released=False):
+        """
+        Get the most recent version.
+
+        :param released: Only consider released versions
+
+        :return: Version number, or None if the index is empty
+        """
+        for version in reversed(self._versions):
+            if not released or self._sections[version].released:
+                return version
+        return None
+
+    def between(self, start, end):
+        """
+        Get the sections of the versions after start, up to end included.
+
+        :param start: Version number (excluded)
+        :param end: Version number (included)
+
+        :return: List of Section objects, most recent first
+        """
+        low = bisect.bisect_right(self._keys, version_key(start))
+        high = bisect.bisect_right(self._keys, version_key(end))
+        sections = []
+        for version in reversed(self._versions[low:high]):
+            section = self._sections[version]
+            if section not in sections:
+                sections.append(section)
+        return sections
+
+
+class ChangelogEditor:
+    """
+    In-memory changelog editor.
+
+    The file is loaded once; each operation edits the in-memory copy and
+    returns whether it could be applied. Nothing is written until save()
+    is called, so diff() can be used to review the changes beforehand.
+    """
+    filename = ''
+    operations = None
+
+    def __init__(self, filename):
+        """
+        Class Constructor.
+
+        :param filename: Changelog file
+        """
+        self.filename = filename
+        self._original = ChangelogFile.load(filename).data
+        self._file = ChangelogFile(filename, self._original)
+        self.operations = []
+
+    @property
+    def data(self):
+        """
+        Current (edited) contents.
+        """
+        return self._file.data
+
+    @property
+    def sections(self):
+        """
+        Current sections, in file order.
+        """
+        return self._file.sections
+
+    @property
+    def changed(self):
+        """
+        Whether the contents differ from the file on disk.
+        """
+        return self._file.data != self._original
+
+    def _splice(self, start, end, text, operation):
+        data = self._file.data
+        self._file = ChangelogFile(self.filename,
+                                   data[:start] + text.encode() + data[end:])
+        self.operations.append(operation)
+
+    def section(self, version):
+        """
+        Find a version's section.
+
+        :param version: Version number, or prefix of the version number
+                        followed by '*' (e.g. `5.22*`)
+
+        :return: First matching Section object, or None if not found
+        """
+        for section in self._file.sections:
+            if version.endswith('*'):
+                if section.version.startswith(version[:-1]):
+                    return section
+            elif section.version == version:
+                return section
+        return None
+
+    def link(self, label):
+        """
+        Find a link reference definition.
+
+        :param label: Link label, or prefix of the label followed by '*'
+
+        :return: First matching Link object, or None if not found
+        """
+        for link in self._file.links.values():
+            if label.endswith('*'):
+                if link.label.startswith(label[:-1]):
+                    return link
+            elif link.label == label:
+                return link
+        return None
+
+    def set_date(self, version, date):
+        """
+        Set a section's release date.
+
+        :param version: Version number
+        :param date: Release date, or 'Unreleased'
+
+        :return: True if the section was found
+        """
+        section = self.section(version)
+        if section is None:
+            return False
+        self._splice(section.start, section.body_start,
+                     "## [{}] - {}".format(version, date),
+                     "set date of {} to {}".format(version, date))
+        return True
+
+    def insert_section(self, version, date, anchor=None, after=False):
+        """
+        Insert a new, empty section.
+
+        :param version: Version number
+        :param date: Release date, or 'Unreleased'
+        :param anchor: Section to insert the new one next to, see section();
+                       defaults to the first section
+        :param after: Insert after the anchor section's heading instead of
+                      before the section
+
+        :return: True if the anchor section was found
+        """
+        target = self.section(anchor) if anchor else self._file.sections[0]
+        if target is None:
+            return False
+        heading = "## [{}] - {}".format(version, date)
+        if after:
+            self._splice(target.body_start, target.body_start,
+                         "\n\n" + heading,
+                         "insert section {} after {}".format(version,
+                                                             target.version))
+        else:
+            self._splice(target.start, target.start,
+                         heading + "\n\n",
+                         "insert section {} before {}".format(version,
+                                                              target.version))
+        return True
+
+    def set_link_head(self, label, head):
+        """
+        Set the head of a version's compare link (the part after `...`).
+
+        :param label: Link label
+        :param head: New head revision, e.g. `v5.22.0`
+
+        :return: True if the link was found
+        """
+        link = self.link(label)
+        if link is None or '...' not in link.url:
+            return False
+        url = link.url.split('...', 1)[0] + '...' + head
+        self._splice(link.start, link.end,
+                     "[{}]: {}".format(label, url),
+                     "set {} link head to {}".format(label, head))
+        return True
+
+    def insert_link(self, label, url, anchor, blank_line=False):
+        """
+        Insert a link reference definition.
+
+        :param label: Link label
+        :param url: Link target
+        :param anchor: Link to insert the new one before, see link()
+        :param blank_line: Add a blank line after the new link
+
+        :return: True if the anchor link was found
+        """
+        target = self.link(anchor)
+        if target is None:
+            return False
+        self._splice(target.start, target.start,
+                     "[{}]: {}\n{}".format(label, url,
+                                           "\n" if blank_line else ""),
+                     "insert link {} before {}".format(label, target.label))
+        return True
+
+    def diff(self):
+        """
+        Get the changes made so far.
+
+        :return: Unified diff
+        """
+        name = path.basename(self.filename)
+        return ''.join(difflib.unified_diff(
+            self._original.decode().splitlines(keepends=True),
+            self._file.data.decode().splitlines(keepends=True),
+            'a/' + name,
+            'b/' + name
+        ))
+
+    def save(self):
+        """
+        Atomically write the changes to the file, if any.
+
+        :return: True if the file was modified
+        """
+        if not self.changed:
+            return False
+        fd, tmp = tempfile.mkstemp(dir=path.dirname(path.abspath(
+            self.filename)), prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self._file.data)
+        os.chmod(tmp, os.stat(self.filename).st_mode & 0o7777)
+        os.replace(tmp, self.filename)
+        self._original = self._file.data
+        return True
+
+
+def load_index(root=None):
+    """
+    Get the index of all the changelog files.
+
+    :param root: Repository's root directory, defaults to the one
+                 containing this script
+
+    :return: ChangelogIndex object
+    """
+    root = root or Path(__file__).parents[1]
+    filenames = [path.join(root, changelog_file)]
+    filenames += sorted(glob.glob(path.join(root, archives_pattern)),
+                        reverse=True)
+    return ChangelogIndex([ChangelogFile.load(f) for f in filenames
+                           if path.isfile(f)])
@@ -0,0 +1,241 @@
+"""
+ADOdb release files filter, based on the `export-ignore` attribute.
+
+The files and directories excluded from the release archives are defined
+once, in the repository's .gitattributes file, so that the release script
+and `git archive` always agree.
+
+- ExportIgnore class
+  Compiles the `export-ignore` rules from a .gitattributes file into a
+  single regular expression. Patterns follow the gitattributes syntax:
+  basename or anchored (`/dir`, `dir/file`) patterns, directory-only
+  patterns (`dir/`), `*`, `?`, `[...]` and `**` wildcards. Later lines
+  override earlier ones, so a rule can be cancelled with `-export-ignore`
+  or `!export-ignore`. As with `git archive`, everything inside an
+  excluded directory is excluded too, which lets the tree walkers prune
+  whole subtrees without visiting them.
+
+Only the top-level .gitattributes file is taken into account.
+
+This file is part of ADOdb, a Database Abstraction Layer library for PHP.
+
+@package ADOdb
+@link https://adodb.org Project's web site and documentation
+@link https://github.com/ADOdb/ADOdb Source code and issue tracker
+
+The ADOdb Library is dual-licensed, released under both the BSD 3-Clause
+and the GNU Lesser General Public Licence (LGPL) v2.1 or, at your option,
+any later version. This means you can use it in proprietary products.
+See the LICENSE.md file distributed with this source code for details.
+@license BSD-3-Clause
+@license LGPL-2.1-or-later
+
+@copyright 2026 Damien Regad, Mark Newnham and the ADOdb community
+"""
+
+import re
+from os import path
+
+attributes_file = '.gitattributes'
+attribute = 'export-ignore'
+
+# Quoted pattern, e.g. `"name with spaces" export-ignore`
+_quoted_regex = re.compile(r'^"((?:[^"\\]|\\.)*)"\s*(.*)$')
+
+
+def _translate(pattern):
+    """
+    Convert a gitattributes glob pattern to a regular expression, matching
+    the path relative to the repository's root.
+
+    :param pattern: Pattern, without leading and trailing '/'
+
+    :return: Regular expression (string)
+    """
+    regex = ''
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        at_start = i == 0 or pattern[i - 1] == '/'
+        if at_start and pattern.startswith('**/', i):
+            # Leading or middle `**/`: zero or more directories
+            regex += '(?:.*/)?'
+            i += 3
+        elif at_start and i == n - 2 and pattern.startswith('**', i):
+            # Trailing `/**`: everything inside
+            regex += '.*'
+            i += 2
+        elif c == '*':
+            regex += '[^/]*'
+            while i < n and pattern[i] == '*':
+                i += 1
+        elif c == '?':
+            regex += '[^/]'
+            i += 1
+        elif c == '[':
+            end = i + 1
+            if end < n and pattern[end] in '!^':
+                end += 1
+            if end < n and pattern[end] == ']':
+                end += 1
+            end = pattern.find(']', end)
+            if end == -1:
+                regex += re.escape(c)
+                i += 1
+                continue
+            chars = pattern[i + 1:end].replace('\\', '\\\\')
+            if chars[0] in '!^':
+                chars = '^' + chars[1:]
+            regex += '[' + chars + ']'
+            i = end + 1
+        elif c == '\\' and i + 1 < n:
+            regex += re.escape(pattern[i + 1])
+            i += 2
+        else:
+            regex += re.escape(c)
+            i += 1
+    return regex
+
+
+class ExportIgnore:
+    """
+    Matcher for the files excluded from the release archives.
+    """
+    rules = ()
+
+    def __init__(self, text=''):
+        """
+        Class Constructor.
+
+        :param text: Contents of the .gitattributes file
+        """
+        rules = []
+        for line in text.splitlines():
+            line = line.strip()
+            if not line or line.startswith('#') or line.startswith('[attr]'):
+                continue
+            quoted = _quoted_regex.match(line)
+            if quoted:
+                pattern = re.sub(r'\\(.)', r'\1', quoted.group(1))
+                attrs = quoted.group(2).split()
+            else:
+                pattern, *attrs = line.split()
+            # Negative patterns are not allowed in attributes files
+            if pattern.startswith('!'):
+                continue
+
+            state = None
+            for attr in attrs:
+                name = attr.lstrip('-!').split('=', 1)[0]
+                if name == attribute:
+                    state = attr == attribute
+            if state is not None:
+                rules.append((pattern, state))
+        self.rules = tuple(rules)
+
+        self._file_regex = self._compile(dirs=False)
+        self._dir_regex = self._compile(dirs=True)
+
+    def _compile(self, dirs):
+        """
+        Combine the rules into a single regex, one named group per rule.
+
+        Alternatives are tried in order, so the rules are reversed: the
+        first matching group is the last matching rule, which wins.
+
+        :param dirs: Whether the regex is for directories, otherwise
+                     directory-only rules are left out
+
+        :return: Compiled regex, or None if there are no rules
+        """
+        alternatives = []
+        for index in reversed(range(len(self.rules))):
+            pattern = self.rules[index][0]
+            dir_only = pattern.endswith('/')
+            if dir_only and not dirs:
+                continue
+            pattern = pattern.rstrip('/')
+            # Patterns without a slash match at any level
+            anchored = '/' in pattern
+            regex = _translate(pattern.lstrip('/'))
+            if not anchored:
+                regex = '(?:.*/)?' + regex
+            alternatives.append('(?P<r{}>{})'.format(index, regex))
+        if not alternatives:
+            return None
+        return re.compile('(?:' + '|'.join(alternatives) + r')\Z', re.S)
+
+    @classmethod
+    def load(cls, root):
+        """
+        Read the rules from a directory's .gitattributes file.
+
+        :param root: Top-level directory of the tree
+
+        :return: ExportIgnore object (without rules if there is no file)
+        """
+        try:
+            with open(path.join(root, attributes_file),
+                      encoding='utf-8') as f:
+                return cls(f.read())
+        except FileNotFoundError:
+            return cls()
+
+    @classmethod
+    def from_git(cls, reader, rev):
+        """
+        Read the rules from a Git tree's .gitattributes file, like
+        `git archive` does.
+
+        :param reader: gitrepo.GitObjectReader instance
+        :param rev: Tag name, commit SHA or any Git revision expression
+
+        :return: ExportIgnore object (without rules if there is no file)
+        """
+        try:
+            obj_type, data = reader.read(rev + ':' + attributes_file)
+        except KeyError:
+            return cls()
+        return cls(data.decode('utf-8'))
+
+    @property
+    def key(self):
+        """
+        Rules, in a form suitable for cache keys.
+        """
+        return [[pattern, state] for pattern, state in self.rules]
+
+    def match(self, name, is_dir=False):
+        """
+        Check whether the rules exclude the given path itself (the parent
+        directories are not checked, see is_excluded()).
+
+        Tree walkers should call this for each entry, and not descend into
+        excluded directories.
+
+        :param name: Path relative to the tree's root, '/'-separated
+        :param is_dir: Whether the path is a directory
+
+        :return: True if the path is excluded
+        """
+        regex = self._dir_regex if is_dir else self._file_regex
+        if regex is None:
+            return False
+        match = regex.match(name)
+        return match is not None and self.rules[int(match.lastgroup[1:])][1]
+
+    def is_excluded(self, name):
+        """
+        Check whether a file is excluded, either by the rules or because
+        one of its parent directories is.
+
+        :param name: File path relative to the tree's root, '/'-separated
+
+        :return: True if the file is excluded
+        """
+        parts = name.split('/')
+        for i in range(1, len(parts)):
+            if self.match('/'.join(parts[:i]), True):
+                return True
+        return self.match(name)
@@ -0,0 +1,693 @@
+"""
+ADOdb release scripts Git object database access.
+
+- GitObjectReader class
+  Reads objects (commits, trees, blobs) straight from the repository's
+  object database through a single long-lived `git cat-file --batch`
+  process, without checking anything out.
+- Repository class
+  In-process repository access: locating the work tree and Git
+  directories, reading refs and HEAD, and checking whether the work tree
+  is clean, falling back to git commands only when needed.
+- Targeted fetches and local mirror
+  Fetch only the release branch and tags actually needed, and maintain a
+  persistent local bare mirror of the upstream repository, used as
+  alternate object store for fresh clones.
+
+This file is part of ADOdb, a Database Abstraction Layer library for PHP.
+
+@package ADOdb
+@link https://adodb.org Project's web site and documentation
+@link https://github.com/ADOdb/ADOdb Source code and issue tracker
+
+The ADOdb Library is dual-licensed, released under both the BSD 3-Clause
+and the GNU Lesser General Public Licence (LGPL) v2.1 or, at your option,
+any later version. This means you can use it in proprietary products.
+See the LICENSE.md file distributed with this source code for details.
+@license BSD-3-Clause
+@license LGPL-2.1-or-later
+
+@copyright 2026 Damien Regad, Mark Newnham and the ADOdb community
+"""
+
+import hashlib
+import os
+import re
+import stat
+import struct
+import subprocess
+from os import path
+
+# Git tree entries modes
+MODE_TREE = 0o040000
+MODE_SYMLINK = 0o120000
+MODE_GITLINK = 0o160000
+
+
+class GitObjectReader:
+    """
+    Read objects from a Git repository's object database.
+
+    All requests go through one `git cat-file --batch` process, which is
+    started on first use and kept alive until close() is called.
+    Use as a context manager to make sure the process is terminated.
+    """
+    repo_path = ''
+
+    _proc = None
+
+    def __init__(self, repo_path='.'):
+        """
+        Class Constructor.
+
+        :param repo_path: Path to the Git repository
+        """
+        self.repo_path = repo_path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Terminate the cat-file process.
+        """
+        if self._proc is not None:
+            self._proc.stdin.close()
+            self._proc.wait()
+            self._proc.stdout.close()
+            self._proc = None
+
+    def _request(self, rev):
+        """
+        Send an object request to cat-file, and read the response header.
+
+        The object's contents must be fully read from self._proc.stdout
+        (followed by the terminating LF) before sending another request.
+
+        :param rev: Object name or revision expression (e.g. `v5.22.0^{tree}`)
+
+        :return: Tuple (sha, object type, size)
+        """
+        if self._proc is None:
+            self._proc = subprocess.Popen(
+                ['git', 'cat-file', '--batch'],
+                cwd=self.repo_path,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE
+            )
+
+        self._proc.stdin.write(rev.encode() + b'\n')
+        self._proc.stdin.flush()
+        header = self._proc.stdout.readline().decode().split()
+        if len(header) != 3:
+            raise KeyError("Git object '{}' not found".format(rev))
+
+        sha, obj_type, size = header
+        return sha, obj_type, int(size)
+
+    def read(self, rev):
+        """
+        Read an object's full contents in memory.
+
+        :param rev: Object name or revision expression
+
+        :return: Tuple (object type, contents)
+        """
+        sha, obj_type, size = self._request(rev)
+        data = self._proc.stdout.read(size)
+        self._proc.stdout.read(1)
+        return obj_type, data
+
+    def open(self, rev):
+        """
+        Open an object for reading, without loading it in memory.
+
+        The returned stream must be fully read before any other object
+        is requested.
+
+        :param rev: Object name or revision expression
+
+        :return: Tuple (object type, size, binary file-like object)
+        """
+        sha, obj_type, size = self._request(rev)
+        return obj_type, size, _ObjectStream(self._proc.stdout, size)
+
+    def resolve(self, rev):
+        """
+        Get the full SHA of the given revision.
+
+        :param rev: Object name or revision expression
+
+        :return: SHA-1 hex string
+        """
+        sha, obj_type, size = self._request(rev)
+        self._proc.stdout.read(size + 1)
+        return sha
+
+    def commit_time(self, rev):
+        """
+        Get the commit date of the given revision.
+
+        :param rev: Commit or tag name
+
+        :return: Committer timestamp (seconds since the epoch)
+        """
+        obj_type, data = self.read(rev + '^{commit}')
+        match = re.search(rb'^committer .* (\d+) [-+]\d{4}$', data, re.M)
+        return int(match.group(1))
+
+    def tree(self, rev):
+        """
+        Get the entries of a tree object.
+
+        :param rev: Tree object name or revision expression
+
+        :return: List of (name, mode, sha) tuples, in the tree's order
+        """
+        obj_type, data = self.read(rev)
+        if obj_type != 'tree':
+            raise ValueError("'{}' is a {}, not a tree".format(rev, obj_type))
+
+        entries = []
+        pos = 0
+        while pos < len(data):
+            space = data.index(b' ', pos)
+            nul = data.index(b'\0', space)
+            mode = int(data[pos:space], 8)
+            name = data[space + 1:nul].decode()
+            sha = data[nul + 1:nul + 21].hex()
+            entries.append((name, mode, sha))
+            pos = nul + 21
+        return entries
+
+
+class _ObjectStream:
+    """
+    Binary file-like object reading one object's contents from the
+    cat-file output stream.
+    """
+
+    def __init__(self, stream, size):
+        self._stream = stream
+        self._remaining = size
+        self._finished = False
+
+    def read(self, size=-1):
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._stream.read(size) if size else b''
+        self._remaining -= len(data)
+        if not self._remaining:
+            self._finish()
+        return data
+
+    def _finish(self):
+        # Consume the LF terminating the object's contents
+        if not self._finished:
+            self._stream.read(1)
+            self._finished = True
+
+    def close(self):
+        # Skip any unread data so the next request can proceed
+        while self._remaining:
+            self.read(65536)
+        self._finish()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class Repository:
+    """
+    Git repository accessed in-process.
+
+    Refs are read directly from the Git directory (loose refs and
+    packed-refs), and the clean-tree check compares the index with the
+    work tree and HEAD, so that common queries do not spawn any process.
+    Objects are read through a GitObjectReader, started on first use.
+    Use as a context manager to make sure it is terminated.
+    """
+    root = None
+    git_dir = ''
+    common_dir = ''
+
+    _objects = None
+    _packed_refs = None
+
+    def __init__(self, repo_path='.'):
+        """
+        Class Constructor.
+
+        :param repo_path: Any directory within the repository's work tree,
+                          or a bare repository
+        """
+        self.root, self.git_dir = self._discover(path.abspath(repo_path))
+        try:
+            with open(path.join(self.git_dir, 'commondir')) as f:
+                self.common_dir = path.normpath(
+                    path.join(self.git_dir, f.read().strip()))
+        except FileNotFoundError:
+            self.common_dir = self.git_dir
+
+        # Repositories using the reftable format are handled by git itself
+        self._reftable = path.isdir(path.join(self.common_dir, 'reftable'))
+
+    @staticmethod
+    def _discover(directory):
+        """
+        Find the repository containing the given directory.
+
+        :return: Tuple (work tree root or None if bare, Git directory)
+        """
+        if 'GIT_DIR' in os.environ:
+            output = subprocess.check_output(
+                ['git', 'rev-parse', '--absolute-git-dir',
+                 '--show-toplevel'],
+                cwd=directory, text=True).splitlines()
+            return (output[1] if len(output) > 1 else None), output[0]
+
+        current = directory
+        while True:
+            dotgit = path.join(current, '.git')
+            if path.isdir(dotgit):
+                return current, dotgit
+            if path.isfile(dotgit):
+                # Linked worktree or submodule
+                with open(dotgit) as f:
+                    gitdir = f.read().strip()
+                if gitdir.startswith('gitdir: '):
+                    return current, path.normpath(
+                        path.join(current, gitdir[len('gitdir: '):]))
+            if all(path.exists(path.join(current, name))
+                   for name in ('HEAD', 'objects', 'refs')):
+                return None, current
+            parent = path.dirname(current)
+            if parent == current:
+                raise ValueError("'{}' is not in a Git repository"
+                                 .format(directory))
+            current = parent
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Terminate the object reader process, if started.
+        """
+        if self._objects is not None:
+            self._objects.close()
+            self._objects = None
+
+    @property
+    def objects(self):
+        """
+        The repository's GitObjectReader.
+        """
+        if self._objects is None:
+            self._objects = GitObjectReader(self.root or self.git_dir)
+        return self._objects
+
+    def _git(self, *args):
+        return subprocess.check_output(('git',) + args,
+                                       cwd=self.root or self.git_dir,
+                                       text=True)
+
+    def _read_packed_refs(self):
+        """
+        Get the packed refs, parsing the file only when it was modified.
+
+        :return: Dict of ref name => SHA
+        """
+        filename = path.join(self.common_dir, 'packed-refs')
+        try:
+            mtime = os.stat(filename).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        if self._packed_refs is None or self._packed_refs[0] != mtime:
+            refs = {}
+            with open(filename) as f:
+                for line in f:
+                    if line[0] in '#^':
+                        continue
+                    sha, name = line.split()
+                    refs[name] = sha
+            self._packed_refs = (mtime, refs)
+        return self._packed_refs[1]
+
+    def _read_ref_file(self, name):
+        """
+        Read a loose ref (or HEAD), in the worktree's Git directory for
+        per-worktree refs, in the common directory otherwise.
+
+        :return: File contents, or None if it does not exist
+        """
+        if name == 'HEAD' or not name.startswith('refs/') \
+                or name.startswith(('refs/bisect/', 'refs/worktree/')):
+            directory = self.git_dir
+        else:
+            directory = self.common_dir
+        try:
+            with open(path.join(directory, name)) as f:
+                return f.read().strip()
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            return None
+
+    def ref(self, name):
+        """
+        Get the SHA a ref points to, following symbolic refs. Tags are not
+        peeled.
+
+        :param name: Full ref name, e.g. `refs/tags/v5.22.0` or `HEAD`
+
+        :return: SHA, or None if the ref does not exist
+        """
+        if self._reftable:
+            try:
+                return self._git('rev-parse', '--verify', '--quiet',
+                                 name).strip()
+            except subprocess.CalledProcessError:
+                return None
+
+        for depth in range(5):
+            value = self._read_ref_file(name)
+            if value is None:
+                return self._read_packed_refs().get(name)
+            if not value.startswith('ref: '):
+                return value
+            name = value[len('ref: '):]
+        return None
+
+    def refs(self, prefix):
+        """
+        List the refs with the given prefix.
+
+        :param prefix: Ref names prefix, e.g. `refs/tags/`
+
+        :return: Dict of ref name => SHA
+        """
+        if self._reftable:
+            output = self._git('for-each-ref', '--format=%(objectname) '
+                               '%(refname)', prefix)
+            return {name: sha for sha, name in
+                    (line.split() for line in output.splitlines())}
+
+        refs = {name: sha for name, sha in self._read_packed_refs().items()
+                if name.startswith(prefix)}
+        base = path.join(self.common_dir, prefix)
+        for dirpath, dirnames, filenames in os.walk(base):
+            for filename in filenames:
+                name = path.relpath(path.join(dirpath, filename),
+                                    self.common_dir).replace(os.sep, '/')
+                sha = self.ref(name)
+                if sha is not None:
+                    refs[name] = sha
+        return refs
+
+    def head_branch(self):
+        """
+        Get the currently checked out branch.
+
+        :return: Branch name, or None if HEAD is detached
+        """
+        value = self._read_ref_file('HEAD')
+        if value and value.startswith('ref: refs/heads/'):
+            return value[len('ref: refs/heads/'):]
+        return None
+
+    def is_clean(self):
+        """
+        Check whether the work tree and index match HEAD, ignoring
+        untracked files (like `git diff --quiet && git diff --cached --quiet`).
+
+        The index is compared with the work tree using the cached file
+        stats, hashing only the files whose stats changed; git is only
+        called to confirm differences (e.g. due to filters or line endings
+        conversion) or when the index uses unsupported features.
+        """
+        try:
+            index = _read_index(path.join(self.git_dir, 'index'))
+        except _UnsupportedIndex:
+            index = None
+        if index is None or not self._index_matches_head(index):
+            return self._git_is_clean()
+
+        for entry in index.entries:
+            if not self._entry_clean(entry, index.mtime):
+                return self._git_is_clean()
+        return True
+
+    def _git_is_clean(self):
+        for args in (('diff', '--quiet'), ('diff', '--cached', '--quiet')):
+            if subprocess.call(('git',) + args, cwd=self.root) != 0:
+                return False
+        return True
+
+    def _index_matches_head(self, index):
+        """
+        Compare the index with HEAD's tree.
+        """
+        head = self.ref('HEAD')
+        if head is None:
+            return not index.entries
+        tree = self.objects.resolve(head + '^{tree}')
+        if index.tree is not None:
+            return index.tree == tree
+
+        # No valid cached tree: compare all entries
+        expected = {}
+        pending = [('', tree)]
+        while pending:
+            prefix, sha = pending.pop()
+            for name, mode, entry_sha in self.objects.tree(sha):
+                if mode == MODE_TREE:
+                    pending.append((prefix + name + '/', entry_sha))
+                else:
+                    expected[prefix + name] = (mode, entry_sha)
+        actual = {e.path: (e.mode, e.sha) for e in index.entries}
+        return expected == actual
+
+    def _entry_clean(self, entry, index_mtime):
+        """
+        Compare an index entry with the work tree's file.
+        """
+        if entry.mode == MODE_GITLINK or entry.skip_worktree:
+            return True
+        filename = path.join(self.root, entry.path)
+        try:
+            st = os.lstat(filename)
+        except FileNotFoundError:
+            return False
+
+        if stat.S_ISLNK(st.st_mode) != (entry.mode == MODE_SYMLINK):
+            return False
+        if not stat.S_ISLNK(st.st_mode) \
+                and bool(st.st_mode & 0o100) != bool(entry.mode & 0o100):
+            return False
+
+        # Same stats as when the file was added to the index: unchanged,
+        # unless it was modified in the same second the index was written
+        if st.st_size == entry.size \
+                and (int(st.st_mtime), st.st_mtime_ns % 10**9) == entry.mtime \
+                and entry.mtime[0] < index_mtime:
+            return True
+
+        if stat.S_ISLNK(st.st_mode):
+            data = os.readlink(filename).encode()
+        else:
+            with open(filename, 'rb') as f:
+                data = f.read()
+        blob = hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+        return blob == entry.sha
+
+
+class _UnsupportedIndex(Exception):
+    pass
+
+
+class _IndexEntry:
+    """
+    Git index entry.
+    """
+    __slots__ = ('path', 'mode', 'sha', 'size', 'mtime', 'skip_worktree')
+
+    def __init__(self, path, mode, sha, size, mtime, skip_worktree):
+        self.path = path
+        self.mode = mode
+        self.sha = sha
+        self.size = size
+        self.mtime = mtime
+        self.skip_worktree = skip_worktree
+
+
+class _Index:
+    """
+    Contents of the Git index: stage 0 entries, cached root tree (if
+    valid) and the index file's modification time (seconds).
+    """
+
+    def __init__(self, entries, tree, mtime):
+        self.entries = entries
+        self.tree = tree
+        self.mtime = mtime
+
+
+_index_header = struct.Struct('>4sLL')
+_index_entry = struct.Struct('>LLLLLLLLLL20sH')
+
+
+def _read_index(filename):
+    """
+    Parse a Git index file (versions 2 and 3).
+
+    :param filename: Index file
+
+    :return: _Index object, or None if there is no index
+    :raise _UnsupportedIndex: if the index uses unsupported features
+             (version 4, split or sparse index) or has conflicts
+    """
+    try:
+        with open(filename, 'rb') as f:
+            data = f.read()
+            mtime = int(os.fstat(f.fileno()).st_mtime)
+    except FileNotFoundError:
+        return None
+
+    signature, version, count = _index_header.unpack_from(data)
+    if signature != b'DIRC' or version not in (2, 3):
+        raise _UnsupportedIndex()
+
+    entries = []
+    pos = _index_header.size
+    for i in range(count):
+        (ctime, ctime_ns, mtime_s, mtime_ns, dev, ino, mode, uid, gid, size,
+         sha, flags) = _index_entry.unpack_from(data, pos)
+        entry_start = pos
+        pos += _index_entry.size
+        extended = flags & 0x4000
+        skip_worktree = False
+        if extended:
+            extra, = struct.unpack_from('>H', data, pos)
+            skip_worktree = bool(extra & 0x4000)
+            pos += 2
+        if flags & 0x3000:
+            # Stage > 0: unresolved merge conflict
+            raise _UnsupportedIndex()
+        end = data.index(b'\0', pos)
+        name = data[pos:end].decode()
+        # Entries are NUL-padded to a multiple of 8 bytes
+        pos = entry_start + ((end - entry_start) // 8 + 1) * 8
+        entries.append(_IndexEntry(name, mode, sha.hex(), size,
+                                   (mtime_s, mtime_ns),
+                                   skip_worktree or bool(flags & 0x8000)))
+
+    # Extensions; the trailing 20 bytes are the index checksum
+    tree = None
+    while pos + 8 <= len(data) - 20:
+        ext, size = struct.unpack_from('>4sL', data, pos)
+        pos += 8
+        if ext == b'TREE':
+            # Root entry: path (empty), NUL, entry count, space,
+            # subtrees count, LF, then SHA if entry count is not -1
+            nul = data.index(b'\0', pos)
+            lf = data.index(b'\n', nul)
+            entry_count = int(data[nul + 1:lf].split(b' ')[0])
+            if entry_count >= 0:
+                tree = data[lf + 1:lf + 21].hex()
+        elif ext in (b'link', b'sdir'):
+            raise _UnsupportedIndex()
+        pos += size
+
+    return _Index(entries, tree, mtime)
+
+
+def fetch_release_refs(repo_path, remote, branch, tags=(), refs_prefix=None):
+    """
+    Fetch only the given branch and tags from a remote.
+
+    The branch is mandatory, while tags that do not exist on the remote
+    are silently skipped. Existing local tags are never overwritten.
+
+    :param repo_path: Git repository
+    :param remote: Remote name or URL
+    :param branch: Branch name
+    :param tags: List of tag names
+    :param refs_prefix: Where to store the branch's ref; defaults to
+                        the remote-tracking branch refs/remotes/<remote>/
+
+    :return: List of the tags that were found on the remote
+    """
+    if refs_prefix is None:
+        refs_prefix = 'refs/remotes/{}/'.format(remote)
+    subprocess.check_call(
+        ['git', 'fetch', '--quiet', '--no-tags', remote,
+         '+refs/heads/{0}:{1}{0}'.format(branch, refs_prefix)],
+        cwd=repo_path
+    )
+
+    found = []
+    for tag in tags:
+        result = subprocess.call(
+            ['git', 'fetch', '--quiet', '--no-tags', remote,
+             'refs/tags/{0}:refs/tags/{0}'.format(tag)],
+            cwd=repo_path,
+            stderr=subprocess.DEVNULL
+        )
+        if result == 0:
+            found.append(tag)
+    return found
+
+
+def update_mirror(mirror_path, url, branch, tags=()):
+    """
+    Create or incrementally update a local bare mirror of a repository.
+
+    Only the given branch and tags are fetched, so after the initial
+    download an update costs just a few ref updates.
+
+    :param mirror_path: Location of the mirror
+    :param url: Upstream repository URL
+    :param branch: Branch name
+    :param tags: List of tag names
+    """
+    if not path.isdir(mirror_path):
+        os.makedirs(path.dirname(mirror_path), exist_ok=True)
+        subprocess.check_call(['git', 'init', '--quiet', '--bare',
+                               mirror_path])
+        subprocess.check_call(['git', 'remote', 'add', 'origin', url],
+                              cwd=mirror_path)
+    else:
+        subprocess.check_call(['git', 'remote', 'set-url', 'origin', url],
+                              cwd=mirror_path)
+
+    # In a bare mirror, branches are stored as local branches
+    fetch_release_refs(mirror_path, 'origin', branch, tags, 'refs/heads/')
+
+
+def clone_from_mirror(mirror_path, url, repo_path, branch):
+    """
+    Clone a repository using the local mirror's object store.
+
+    The clone borrows the mirror's objects (alternates) instead of copying
+    or downloading them, and its origin remote points to the upstream URL.
+    The mirror must not be pruned while the clone is in use.
+
+    :param mirror_path: Location of the mirror, see update_mirror()
+    :param url: Upstream repository URL
+    :param repo_path: Where to create the clone
+    :param branch: Branch to check out
+    """
+    subprocess.check_call(
+        ['git', 'clone', '--quiet', '--shared', '--branch', branch,
+         mirror_path, repo_path]
+    )
+    subprocess.check_call(['git', 'remote', 'set-url', 'origin', url],
+                          cwd=repo_path)
@@ -0,0 +1,371 @@
+"""
+ADOdb release scripts instrumentation.
+
+- Tracer class
+  Records a span for each phase of a script's run, with wall and CPU time
+  (including child processes such as git, ssh or rsync), bytes read and
+  written and peak RSS; optionally captures cProfile and tracemalloc dumps
+  for each phase.
+- Trace output
+  JSON trace file, summary table, and a local SQLite history of previous
+  runs, used to flag phases that suddenly take much longer than usual.
+
+The trace and history are stored in the release scripts' cache directory
+(see releasecache.cache_dir()).
+
+This file is part of ADOdb, a Database Abstraction Layer library for PHP.
+
+@package ADOdb
+@link https://adodb.org Project's web site and documentation
+@link https://github.com/ADOdb/ADOdb Source code and issue tracker
+
+The ADOdb Library is dual-licensed, released under both the BSD 3-Clause
+and the GNU Lesser General Public Licence (LGPL) v2.1 or, at your option,
+any later version. This means you can use it in proprietary products.
+See the LICENSE.md file distributed with this source code for details.
+@license BSD-3-Clause
+@license LGPL-2.1-or-later
+
+@copyright 2026 Damien Regad, Mark Newnham and the ADOdb community
+"""
+
+import contextlib
+import cProfile
+import json
+import os
+import re
+import resource
+import sqlite3
+import statistics
+import sys
+import time
+import tracemalloc
+from os import path
+
+import releasecache
+
+# A phase is flagged as a regression when it takes more than this many
+# times the median of the previous runs...
+regression_ratio = 2.0
+# ... and at least that many seconds more, to ignore noise on short phases
+regression_min_delta = 1.0
+# Number of previous runs to compare with
+history_depth = 10
+
+
+def history_file():
+    """
+    Return the location of the runs history database.
+    """
+    return path.join(releasecache.cache_dir(), 'history.sqlite')
+
+
+def trace_file(script):
+    """
+    Return a new trace file name for the given script.
+    """
+    return path.join(releasecache.cache_dir(), 'traces', '{}-{}.json'.format(
+        script,
+        time.strftime('%Y%m%d-%H%M%S')
+    ))
+
+
+def _io_counters():
+    """
+    Get the number of bytes read and written by this process and its
+    terminated children.
+
+    :return: Tuple (read, written); (0, 0) if not available on this system
+    """
+    try:
+        with open('/proc/self/io') as f:
+            counters = dict(line.split(': ') for line in f.read().splitlines())
+        return int(counters['rchar']), int(counters['wchar'])
+    except (OSError, KeyError, ValueError):
+        pass
+
+    # Fall back to block I/O operations (512-byte units)
+    read = written = 0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        read += usage.ru_inblock * 512
+        written += usage.ru_oublock * 512
+    return read, written
+
+
+def _peak_rss():
+    """
+    Get the peak resident set size of this process or its largest
+    terminated child, in bytes.
+    """
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in kilobytes, except on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _cpu_time():
+    """
+    Get the CPU time (user + system) used by this process and its
+    terminated children.
+    """
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+class Tracer:
+    """
+    Records the phases (spans) of a script's run.
+
+    Spans are nested: each one is identified by its path, e.g.
+    `build/archive/zip`. The recorded spans are plain dicts, so they
+    can be passed between processes and merged into another tracer.
+    """
+    script = ''
+    spans = None
+    profile_dir = None
+    started = 0.0
+
+    def __init__(self, script, profile_dir=None):
+        """
+        Class Constructor.
+
+        :param script: Name of the instrumented script
+        :param profile_dir: Where to save cProfile (.prof) and tracemalloc
+                            (.tracemalloc) dumps for each phase; profiling
+                            is disabled if None
+        """
+        self.script = script
+        self.profile_dir = profile_dir
+        self.spans = []
+        self.started = time.time()
+
+        self._stack = []
+        self._profiling = False
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        """
+        Context manager recording a phase.
+
+        :param name: Phase name
+        :param attributes: Additional information to save in the trace
+        """
+        span_path = '/'.join(self._stack + [name])
+        self._stack.append(name)
+
+        # Only the outermost phases are profiled, as profilers can't nest
+        profiler = None
+        if self.profile_dir is not None and not self._profiling:
+            self._profiling = True
+            profiler = cProfile.Profile()
+            tracemalloc.start()
+            profiler.enable()
+
+        # Spans are stored in start order, so that nested spans follow
+        # their parent
+        record = dict(attributes,
+                      name=span_path,
+                      depth=len(self._stack) - 1,
+                      start=round(time.time() - self.started, 6))
+        index = len(self.spans)
+        self.spans.append(record)
+
+        wall = time.perf_counter()
+        cpu = _cpu_time()
+        read, written = _io_counters()
+        try:
+            yield
+        finally:
+            end_read, end_written = _io_counters()
+            record.update(wall=time.perf_counter() - wall,
+                          cpu=_cpu_time() - cpu,
+                          read_bytes=end_read - read,
+                          write_bytes=end_written - written,
+                          peak_rss=_peak_rss())
+            self._stack.pop()
+
+            if profiler is not None:
+                profiler.disable()
+                record['traced_peak'] = tracemalloc.get_traced_memory()[1]
+                self._dump_profile(index, span_path, profiler,
+                                   tracemalloc.take_snapshot())
+                tracemalloc.stop()
+                self._profiling = False
+
+    def _dump_profile(self, index, span_path, profiler, snapshot):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        basename = path.join(self.profile_dir, '{:02d}-{}'.format(
+            index,
+            re.sub(r'[^\w.-]+', '_', span_path)
+        ))
+        profiler.dump_stats(basename + '.prof')
+        snapshot.dump(basename + '.tracemalloc')
+
+    def merge(self, spans, prefix, started):
+        """
+        Add spans recorded by another tracer (e.g. in a worker process),
+        under a new phase summarizing them.
+
+        :param spans: List of span records
+        :param prefix: Name of the phase to nest the spans under
+        :param started: Other tracer's start time
+        """
+        if not spans:
+            return
+        depth = len(self._stack)
+        parent = '/'.join(self._stack + [prefix])
+        offset = started - self.started
+        top = [s for s in spans if s['depth'] == 0]
+        wall = max(s['start'] + s['wall'] for s in top) - spans[0]['start']
+        self.spans.append({
+            'name': parent,
+            'depth': depth,
+            'start': round(spans[0]['start'] + offset, 6),
+            'wall': wall,
+            'cpu': sum(s['cpu'] for s in top),
+            'read_bytes': sum(s['read_bytes'] for s in top),
+            'write_bytes': sum(s['write_bytes'] for s in top),
+            'peak_rss': max(s['peak_rss'] for s in top),
+        })
+        for record in spans:
+            self.spans.append(dict(record,
+                                   name=parent + '/' + record['name'],
+                                   depth=record['depth'] + depth + 1,
+                                   start=round(record['start'] + offset, 6)))
+
+    def write_trace(self, filename):
+        """
+        Save the recorded spans to a JSON file.
+
+        :param filename: Trace file
+        """
+        os.makedirs(path.dirname(path.abspath(filename)), exist_ok=True)
+        with open(filename, 'w') as f:
+            json.dump({'script': self.script,
+                       'started': self.started,
+                       'spans': self.spans},
+                      f, indent=1)
+
+    def summary(self):
+        """
+        Format the recorded spans as a table.
+
+        :return: Table as a multi-line string
+        """
+        lines = ['{:<40} {:>9} {:>9} {:>9} {:>9} {:>9}'.format(
+            'Phase', 'Wall', 'CPU', 'Read', 'Written', 'Peak RSS')]
+        for record in self.spans:
+            name = '  ' * record['depth'] + record['name'].rsplit('/', 1)[-1]
+            lines.append('{:<40} {:>8.2f}s {:>8.2f}s {:>9} {:>9} {:>9}'.format(
+                name[:40],
+                record['wall'],
+                record['cpu'],
+                format_size(record['read_bytes']),
+                format_size(record['write_bytes']),
+                format_size(record['peak_rss'])
+            ))
+        return '\n'.join(lines)
+
+    def record_history(self, label='', filename=None):
+        """
+        Append this run to the history database, and compare its phases
+        with the previous runs of the same script.
+
+        :param label: Free text identifying the run (e.g. the version)
+        :param filename: History database, defaults to history_file()
+
+        :return: List of warning messages for phases that took much longer
+                 than usual (see regression_ratio)
+        """
+        filename = filename or history_file()
+        os.makedirs(path.dirname(filename), exist_ok=True)
+        warnings = []
+        with contextlib.closing(sqlite3.connect(filename)) as db, db:
+            db.executescript('''
+                CREATE TABLE IF NOT EXISTS runs (
+                    id INTEGER PRIMARY KEY,
+                    script TEXT NOT NULL,
+                    label TEXT,
+                    started REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS spans (
+                    run_id INTEGER NOT NULL REFERENCES runs(id),
+                    name TEXT NOT NULL,
+                    wall REAL,
+                    cpu REAL,
+                    read_bytes INTEGER,
+                    write_bytes INTEGER,
+                    peak_rss INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS spans_name ON spans(name, run_id);
+            ''')
+
+            for record in self.spans:
+                previous = [row[0] for row in db.execute(
+                    '''SELECT wall FROM spans JOIN runs ON run_id = id
+                       WHERE script = ? AND name = ?
+                       ORDER BY run_id DESC LIMIT ?''',
+                    (self.script, record['name'], history_depth)
+                )]
+                if not previous:
+                    continue
+                median = statistics.median(previous)
+                if record['wall'] > median * regression_ratio \
+                        and record['wall'] - median > regression_min_delta:
+                    warnings.append(
+                        "phase '{}' took {:.2f}s, {:.1f}x the median of the "
+                        "{} previous runs ({:.2f}s)".format(
+                            record['name'],
+                            record['wall'],
+                            record['wall'] / median if median else 0,
+                            len(previous),
+                            median
+                        ))
+
+            run_id = db.execute(
+                'INSERT INTO runs (script, label, started) VALUES (?, ?, ?)',
+                (self.script, label, self.started)
+            ).lastrowid
+            db.executemany(
+                '''INSERT INTO spans (run_id, name, wall, cpu, read_bytes,
+                                      write_bytes, peak_rss)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                [(run_id, s['name'], s['wall'], s['cpu'], s['read_bytes'],
+                  s['write_bytes'], s['peak_rss']) for s in self.spans]
+            )
+        return warnings
+
+    def report(self, label='', trace=None):
+        """
+        Print the summary table, save the trace and the run's history,
+        and print warnings for regressions.
+
+        :param label: Free text identifying the run (e.g. the version)
+        :param trace: Trace file, defaults to trace_file()
+        """
+        trace = trace or trace_file(self.script)
+        self.write_trace(trace)
+
+        print()
+        print(self.summary())
+        print("Trace saved in '{}'".format(trace))
+        if self.profile_dir is not None:
+            print("Profiling data saved in '{}'".format(self.profile_dir))
+        for warning in self.record_history(label):
+            print("WARNING: " + warning)
+
+
+def format_size(size):
+    """
+    Format a number of bytes in human-readable form.
+
+    :param size: Number of bytes
+    """
+    for unit in ('', 'K', 'M', 'G'):
+        if size < 1024:
+            break
+        size /= 1024
+    else:
+        unit = 'T'
+    return '{:.1f}{}'.format(size, unit) if unit else str(int(size))
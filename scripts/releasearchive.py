@@ -0,0 +1,1020 @@
+"""
+ADOdb release archives writer.
+
+Builds the release tarballs and zip file in a single pass over the source
+tree: each file is read only once, in fixed-size chunks, and its contents
+are fed to both archives at the same time. No staging copy of the tree is
+needed, and memory usage does not depend on the size of the files.
+
+The source tree can be either a directory, or a tag or commit read
+straight from the Git object database (see gitrepo.py).
+
+Tarballs can be compressed with gzip (using parallel deflate blocks, like
+pigz), xz or zstd.
+
+In reproducible mode, building the same tree twice gives byte-for-byte
+identical archives: entries are sorted, timestamps, ownership and
+permissions are normalized, and no build time is recorded anywhere.
+
+Checksums of the archives and of each file are computed as the data
+streams through, and saved in SHA256SUMS/SHA512SUMS files and a JSON
+manifest, which also records the location of each file's compressed data
+in the zip archive (allowing retrieval with HTTP range requests).
+
+The archives are written sequentially, without ever seeking, so the output
+can be any writable stream (e.g. a pipe to an upload process) instead of
+a local file, see the `opener` parameters.
+
+This file is part of ADOdb, a Database Abstraction Layer library for PHP.
+
+@package ADOdb
+@link https://adodb.org Project's web site and documentation
+@link https://github.com/ADOdb/ADOdb Source code and issue tracker
+
+The ADOdb Library is dual-licensed, released under both the BSD 3-Clause
+and the GNU Lesser General Public Licence (LGPL) v2.1 or, at your option,
+any later version. This means you can use it in proprietary products.
+See the LICENSE.md file distributed with this source code for details.
+@license BSD-3-Clause
+@license LGPL-2.1-or-later
+
+@copyright 2026 Damien Regad, Mark Newnham and the ADOdb community
+"""
+
+import collections
+import concurrent.futures
+import hashlib
+import json
+import lzma
+import os
+import shutil
+import stat
+import struct
+import tarfile
+import time
+import zipfile
+import zlib
+from os import path
+
+try:
+    import zstandard  # Optional, only needed for .tar.zst archives
+except ImportError:
+    zstandard = None
+
+import gitrepo
+
+# Size of the chunks read from the source files
+chunk_size = 1024 * 1024
+
+# Default compression level, same as gzip and zip command-line tools
+default_level = 6
+
+# Supported archive formats
+tar_formats = ('tar.gz', 'tar.xz', 'tar.zst')
+all_formats = tar_formats + ('zip',)
+default_formats = ('tar.gz', 'zip')
+
+# Checksum algorithms computed for the archives
+checksum_algorithms = ('sha256', 'sha512')
+
+
+class ArchiveEntry:
+    """
+    A directory, file or symbolic link to add to the release archives.
+    """
+    DIRECTORY = 'dir'
+    FILE = 'file'
+    SYMLINK = 'symlink'
+
+    def __init__(self, name, entry_type, mode, mtime, size=0, opener=None,
+                 linkname='', key=None):
+        """
+        Class Constructor.
+
+        :param name: Path relative to the tree's root, '/'-separated
+        :param entry_type: One of DIRECTORY, FILE or SYMLINK
+        :param mode: Permissions
+        :param mtime: Modification time (seconds since the epoch)
+        :param size: File size in bytes
+        :param opener: Function returning a binary file object to read
+                       the file's contents from
+        :param linkname: Symbolic link's target
+        :param key: Content hash identifying the file (Git blob SHA)
+        """
+        self.name = name
+        self.type = entry_type
+        self.mode = stat.S_IMODE(mode)
+        self.mtime = int(mtime)
+        self.size = size
+        self.opener = opener
+        self.linkname = linkname
+        self.key = key
+
+
+def walk_tree(root, exclude=None):
+    """
+    Walk the directory tree, skipping excluded files and directories.
+
+    Excluded directories are pruned, so their contents are never visited.
+    Entries are returned in sorted order, parent directories first.
+
+    :param root: Top-level directory to walk
+    :param exclude: exportignore.ExportIgnore matcher, None to include
+                    everything
+
+    :return: Generator of ArchiveEntry objects
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        relpath = path.relpath(dirpath, root)
+        if relpath == os.curdir:
+            relpath = ''
+        else:
+            relpath = relpath.replace(os.sep, '/') + '/'
+        if exclude is not None:
+            dirnames[:] = [d for d in dirnames
+                           if not exclude.match(relpath + d, True)]
+            filenames = [f for f in filenames
+                         if not exclude.match(relpath + f)]
+        dirnames.sort()
+
+        for name in dirnames:
+            st = os.stat(path.join(dirpath, name))
+            yield ArchiveEntry(relpath + name, ArchiveEntry.DIRECTORY,
+                               st.st_mode, st.st_mtime)
+
+        for name in sorted(filenames):
+            fullpath = path.join(dirpath, name)
+            st = os.stat(fullpath)
+            yield ArchiveEntry(relpath + name, ArchiveEntry.FILE,
+                               st.st_mode, st.st_mtime, st.st_size,
+                               lambda p=fullpath: open(p, 'rb'))
+
+
+def walk_git_tree(reader, rev, exclude=None):
+    """
+    Walk the tree of a Git commit or tag, skipping excluded files and
+    directories.
+
+    Objects are read directly from the repository's object database, so
+    the working copy and index are never touched. Excluded subtrees are
+    pruned without being read. All entries get the commit's date as
+    modification time.
+
+    Files are streamed from the object database: each entry must be fully
+    processed before requesting the next one.
+
+    :param reader: gitrepo.GitObjectReader instance
+    :param rev: Tag name, commit SHA or any Git revision expression
+    :param exclude: exportignore.ExportIgnore matcher, None to include
+                    everything
+
+    :return: Generator of ArchiveEntry objects
+    """
+    mtime = reader.commit_time(rev)
+
+    def walk(tree, prefix):
+        subtrees = []
+        for name, mode, sha in reader.tree(tree):
+            name = prefix + name
+            if exclude is not None \
+                    and exclude.match(name, mode == gitrepo.MODE_TREE):
+                continue
+            if mode == gitrepo.MODE_TREE:
+                yield ArchiveEntry(name, ArchiveEntry.DIRECTORY, 0o755, mtime)
+                subtrees.append((sha, name + '/'))
+            elif mode == gitrepo.MODE_SYMLINK:
+                obj_type, target = reader.read(sha)
+                yield ArchiveEntry(name, ArchiveEntry.SYMLINK, 0o777, mtime,
+                                   linkname=target.decode())
+            elif mode == gitrepo.MODE_GITLINK:
+                # Submodules are not part of the release
+                continue
+            else:
+                obj_type, size, stream = reader.open(sha)
+                with stream:
+                    yield ArchiveEntry(name, ArchiveEntry.FILE, mode, mtime,
+                                       size, lambda s=stream: s, key=sha)
+
+        for sha, name in subtrees:
+            yield from walk(sha, name)
+
+    yield from walk(rev + '^{tree}', '')
+
+
+class _TeeReader:
+    """
+    File-like object reading from a source file, and copying everything
+    that is read to one or more sinks.
+    """
+
+    def __init__(self, source, *sinks):
+        self._source = source
+        self._sinks = sinks
+
+    def read(self, size=-1):
+        data = self._source.read(size)
+        for sink in self._sinks:
+            sink.write(data)
+        return data
+
+
+class _HashingWriter:
+    """
+    File-like object computing checksums of the data written through it.
+    """
+
+    def __init__(self, fileobj, algorithms=checksum_algorithms):
+        self._fileobj = fileobj
+        self.size = 0
+        self.hashes = {name: hashlib.new(name) for name in algorithms}
+
+    def write(self, data):
+        for h in self.hashes.values():
+            h.update(data)
+        self.size += len(data)
+        if self._fileobj is not None:
+            self._fileobj.write(data)
+        return len(data)
+
+    def flush(self):
+        if self._fileobj is not None:
+            self._fileobj.flush()
+
+    def close(self):
+        if self._fileobj is not None:
+            self._fileobj.close()
+
+    def hexdigests(self):
+        """
+        Get the checksums.
+
+        :return: Dict of algorithm => hex digest
+        """
+        return {name: h.hexdigest() for name, h in self.hashes.items()}
+
+
+class _NullWriter:
+    """
+    File-like object discarding everything written to it.
+    """
+
+    def write(self, data):
+        return len(data)
+
+
+class _MultiWriter:
+    """
+    File-like object writing the same data to several streams, used to
+    compress a single tar stream in multiple formats.
+    """
+
+    def __init__(self, *streams):
+        self._streams = streams
+
+    def write(self, data):
+        for stream in self._streams:
+            stream.write(data)
+        return len(data)
+
+
+def _deflate_block(data, zdict, level, last):
+    """
+    Compress a block of data as raw deflate, for ParallelGzipWriter.
+
+    Runs in a worker process. Non-final blocks are terminated with a sync
+    flush, so that the compressed blocks can be concatenated into a single
+    valid deflate stream.
+
+    :param data: Block of data to compress
+    :param zdict: Last 32 KiB of the previous block, used as dictionary
+                  to keep the compression ratio close to a serial gzip
+    :param level: Compression level
+    :param last: True if this is the stream's final block
+
+    :return: Compressed data
+    """
+    if zdict:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS,
+                                      zlib.DEF_MEM_LEVEL,
+                                      zlib.Z_DEFAULT_STRATEGY, zdict)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(
+        zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class ParallelGzipWriter:
+    """
+    Gzip compressor splitting the data into independent deflate blocks,
+    compressed concurrently in a process pool (like pigz).
+
+    The output is a regular single-member .gz file. Only a bounded number
+    of blocks is in flight at any time, so memory usage stays flat.
+    """
+    block_size = 1024 * 1024
+
+    # Size of the deflate window, primed from the previous block
+    _dict_size = 32 * 1024
+
+    def __init__(self, fileobj, level=default_level, jobs=None, mtime=None):
+        """
+        Class Constructor.
+
+        :param fileobj: Binary file object to write the compressed data to
+        :param level: Compression level (1-9)
+        :param jobs: Number of worker processes, defaults to the number of
+                     CPUs; with 1, blocks are compressed in-process
+        :param mtime: Timestamp stored in the gzip header, defaults to the
+                      current time; 0 means no timestamp
+        """
+        self._fileobj = fileobj
+        self._level = level
+        self._jobs = jobs or os.cpu_count() or 1
+        self._buffer = bytearray()
+        self._zdict = b''
+        self._crc = 0
+        self._size = 0
+        self._pending = collections.deque()
+        self._pool = None
+        if self._jobs > 1:
+            self._pool = concurrent.futures.ProcessPoolExecutor(self._jobs)
+
+        if mtime is None:
+            mtime = time.time()
+        if level >= 9:
+            xfl = 2
+        elif level <= 1:
+            xfl = 4
+        else:
+            xfl = 0
+        # Magic, deflate method, no flags, mtime, extra flags, OS unknown
+        self._fileobj.write(b'\x1f\x8b\x08\x00'
+                            + struct.pack('<L', int(mtime) & 0xffffffff)
+                            + bytes((xfl, 255)))
+
+    def write(self, data):
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            block = bytes(self._buffer[:self.block_size])
+            del self._buffer[:self.block_size]
+            self._submit(block, False)
+        return len(data)
+
+    def _submit(self, block, last):
+        """
+        Queue a block for compression, writing out completed blocks in
+        order when too many are in flight.
+        """
+        if self._pool is None:
+            self._fileobj.write(
+                _deflate_block(block, self._zdict, self._level, last))
+        else:
+            self._pending.append(self._pool.submit(
+                _deflate_block, block, self._zdict, self._level, last))
+            while len(self._pending) > 2 * self._jobs:
+                self._fileobj.write(self._pending.popleft().result())
+        self._zdict = block[-self._dict_size:]
+
+    def close(self):
+        """
+        Compress the remaining data and write the gzip trailer.
+        The underlying file object is not closed.
+        """
+        if self._fileobj is None:
+            return
+        self._submit(bytes(self._buffer), True)
+        while self._pending:
+            self._fileobj.write(self._pending.popleft().result())
+        if self._pool is not None:
+            self._pool.shutdown()
+        self._fileobj.write(struct.pack('<LL', self._crc,
+                                        self._size & 0xffffffff))
+        self._fileobj = None
+
+    def abort(self):
+        """
+        Stop compressing, without writing the remaining data.
+        The underlying file object is not closed.
+        """
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        if self._pool is not None:
+            self._pool.shutdown()
+        self._fileobj = None
+
+
+def _open_compressor(fmt, fileobj, level, jobs, reproducible=False):
+    """
+    Create a compressing stream for the given tarball format.
+
+    :param fmt: Archive format, one of tar_formats
+    :param fileobj: Binary file object to write the compressed data to
+    :param level: Compression level
+    :param jobs: Number of parallel compression jobs
+    :param reproducible: Do not record the build time in the gzip header
+
+    :return: Writable binary stream, must be closed to finalize the data
+    """
+    if fmt == 'tar.gz':
+        return ParallelGzipWriter(fileobj, min(level, 9), jobs,
+                                  0 if reproducible else None)
+    elif fmt == 'tar.xz':
+        return lzma.LZMAFile(fileobj, 'w', preset=min(level, 9))
+    elif fmt == 'tar.zst':
+        if zstandard is None:
+            raise RuntimeError("zstd compression requires the 'zstandard' "
+                               "Python package")
+        compressor = zstandard.ZstdCompressor(level=level,
+                                              threads=jobs or -1)
+        return compressor.stream_writer(fileobj, closefd=False)
+    raise ValueError("Unsupported archive format '{}'".format(fmt))
+
+
+class ZipWriter:
+    """
+    Streaming zip file writer.
+
+    Unlike zipfile.ZipFile, it can insert members that were compressed
+    beforehand (see releasecache.MemberCache), and it never seeks in the
+    output: sizes and CRC of members compressed on the fly are written in
+    a data descriptor after their contents.
+
+    The Zip64 extensions are not supported, so the archive is limited to
+    65535 members and 4 GiB.
+    """
+
+    def __init__(self, fileobj, level=default_level, utc=False):
+        """
+        Class Constructor.
+
+        :param fileobj: Binary file object to write the zip file to
+        :param level: Compression level (1-9)
+        :param utc: Store timestamps as UTC instead of local time, so the
+                    archive does not depend on the build host's timezone
+        """
+        self._fileobj = fileobj
+        self._level = level
+        self._localtime = time.gmtime if utc else time.localtime
+        self._offset = 0
+        self._central_directory = []
+
+    def _write(self, data):
+        self._fileobj.write(data)
+        self._offset += len(data)
+
+    def _dos_date_time(self, mtime):
+        """
+        Convert a timestamp to MS-DOS date and time; the zip format can't
+        store dates before 1980.
+        """
+        t = max(self._localtime(mtime)[0:6], (1980, 1, 1, 0, 0, 0))
+        return ((t[0] - 1980) << 9 | t[1] << 5 | t[2],
+                t[3] << 11 | t[4] << 5 | t[5] // 2)
+
+    def _add_member(self, name, external_attr, mtime, method, crc, csize,
+                    size, descriptor=False):
+        """
+        Write a member's local file header, and register its central
+        directory record.
+
+        :return: Offset of the member's data in the zip file
+        """
+        if len(self._central_directory) >= 0xffff:
+            raise ValueError("Too many files for a zip archive")
+
+        raw_name = name.encode()
+        flags = 0x800 if not raw_name.isascii() else 0  # UTF-8 name
+        if descriptor:
+            flags |= 0x08
+        dos_date, dos_time = self._dos_date_time(mtime)
+        fields = (20, flags, method, dos_time, dos_date, crc, csize, size,
+                  len(raw_name), 0)
+
+        self._central_directory.append((fields, external_attr, self._offset,
+                                        raw_name))
+        self._write(struct.pack('<LHHHHHLLLHH', 0x04034b50, *fields)
+                    + raw_name)
+        return self._offset
+
+    def add_directory(self, name, mode, mtime):
+        """
+        Add a directory entry.
+
+        :param name: Directory name, without trailing '/'
+        :param mode: Permissions
+        :param mtime: Modification time (seconds since the epoch)
+        """
+        self._add_member(name + '/',
+                         (stat.S_IFDIR | stat.S_IMODE(mode)) << 16
+                         | 0x10,  # MS-DOS directory flag
+                         mtime, 0, 0, 0, 0)
+
+    def add_symlink(self, name, linkname, mtime):
+        """
+        Add a symbolic link, stored with the link target as contents.
+
+        :param name: Link name
+        :param linkname: Link target
+        :param mtime: Modification time (seconds since the epoch)
+        """
+        data = linkname.encode()
+        self._add_member(name, (stat.S_IFLNK | 0o777) << 16, mtime, 0,
+                         zlib.crc32(data), len(data), len(data))
+        self._write(data)
+
+    def add_raw(self, name, mode, mtime, crc, size, csize, fileobj):
+        """
+        Add a file member from already raw-deflated data.
+
+        :param name: File name
+        :param mode: Permissions
+        :param mtime: Modification time (seconds since the epoch)
+        :param crc: CRC-32 of the uncompressed data
+        :param size: Uncompressed size
+        :param csize: Compressed size
+        :param fileobj: Binary file object to read the compressed data from
+
+        :return: Offset of the member's data in the zip file
+        """
+        # The member is laid out exactly as if it had been compressed on
+        # the fly by open(), so the archive does not depend on the cache
+        offset = self._add_member(name,
+                                  (stat.S_IFREG | stat.S_IMODE(mode)) << 16,
+                                  mtime, zipfile.ZIP_DEFLATED, 0, 0, 0,
+                                  descriptor=True)
+        while True:
+            data = fileobj.read(chunk_size)
+            if not data:
+                break
+            self._write(data)
+        self._finish_member(crc, csize, size)
+        return offset
+
+    def open(self, name, mode, mtime, raw_sink=None):
+        """
+        Add a file member, compressing its contents on the fly.
+
+        :param name: File name
+        :param mode: Permissions
+        :param mtime: Modification time (seconds since the epoch)
+        :param raw_sink: Optional object with a write() method, receiving
+                         a copy of the compressed data
+
+        :return: Writable stream for the member's contents, to be closed
+                 when done; its offset, crc, size and compressed_size
+                 attributes are then available
+        """
+        offset = self._add_member(name,
+                                  (stat.S_IFREG | stat.S_IMODE(mode)) << 16,
+                                  mtime, zipfile.ZIP_DEFLATED, 0, 0, 0,
+                                  descriptor=True)
+        return _ZipMemberWriter(self, offset, raw_sink)
+
+    def _finish_member(self, crc, csize, size):
+        """
+        Write the data descriptor of the last member opened with open(),
+        and update its central directory record.
+        """
+        self._check_size(size, csize)
+        fields, external_attr, offset, raw_name = self._central_directory[-1]
+        fields = fields[0:5] + (crc, csize, size) + fields[8:]
+        self._central_directory[-1] = (fields, external_attr, offset,
+                                       raw_name)
+        self._write(struct.pack('<LLLL', 0x08074b50, crc, csize, size))
+
+    @staticmethod
+    def _check_size(size, csize):
+        if max(size, csize) >= 0xffffffff:
+            raise ValueError("File too large for a zip archive")
+
+    def close(self):
+        """
+        Write the central directory. The file object is not closed.
+        """
+        start = self._offset
+        for fields, external_attr, offset, raw_name in self._central_directory:
+            # Version made by: 2.0, Unix
+            self._write(struct.pack('<LHHHHHHLLLHHHHHLL', 0x02014b50,
+                                    3 << 8 | 20, *fields, 0, 0, 0,
+                                    external_attr, offset)
+                        + raw_name)
+        if self._offset >= 0xffffffff:
+            raise ValueError("Zip archive too large")
+
+        count = len(self._central_directory)
+        self._write(struct.pack('<LHHHHLLH', 0x06054b50, 0, 0, count, count,
+                                self._offset - start, start, 0))
+
+
+class _ZipMemberWriter:
+    """
+    Writable stream compressing a zip member's contents.
+    """
+
+    def __init__(self, writer, offset, raw_sink=None):
+        self._writer = writer
+        self._raw_sink = raw_sink
+        self._compressor = zlib.compressobj(writer._level, zlib.DEFLATED,
+                                            -zlib.MAX_WBITS)
+        self.offset = offset
+        self.crc = 0
+        self.size = 0
+        self.compressed_size = 0
+
+    def _output(self, data):
+        if data:
+            self._writer._write(data)
+            self.compressed_size += len(data)
+            if self._raw_sink is not None:
+                self._raw_sink.write(data)
+
+    def write(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+        self._output(self._compressor.compress(data))
+        return len(data)
+
+    def close(self):
+        self._output(self._compressor.flush())
+        self._writer._finish_member(self.crc, self.compressed_size, self.size)
+
+
+class ReleaseArchiver:
+    """
+    Writes the release tarballs and zip file simultaneously.
+
+    All tarball formats share a single tar stream, which is compressed
+    once per format. Use as a context manager; the archives are finalized
+    on exit.
+    """
+    files = None
+    members = None
+
+    def __init__(self, basename, formats=default_formats,
+                 level=default_level, jobs=None, member_cache=None,
+                 reproducible=False, opener=None):
+        """
+        Class Constructor.
+
+        :param basename: Archives' full path, without extension
+        :param formats: List of archive formats to create (see all_formats)
+        :param level: Compression level
+        :param jobs: Number of parallel compression jobs, defaults to the
+                     number of CPUs
+        :param member_cache: Optional releasecache.MemberCache, to reuse
+                             compressed zip members of files having a key
+        :param reproducible: Do not record the build time in the archives
+        :param opener: Callable returning the binary stream to write an
+                       archive to, given its file name; defaults to
+                       creating the file
+        """
+        for fmt in formats:
+            if fmt not in all_formats:
+                raise ValueError("Unsupported archive format '{}'"
+                                 .format(fmt))
+
+        self.files = {}
+        self.members = []
+        self._outputs = {}
+        self._partials = {}
+        self._compressors = []
+        self._tar = None
+        self._zip = None
+        self._member_cache = member_cache
+        self._opener = opener
+
+        try:
+            for fmt in tar_formats:
+                if fmt not in formats:
+                    continue
+                self.files[fmt] = basename + '.' + fmt
+                output = self._open_output(fmt)
+                self._compressors.append(
+                    _open_compressor(fmt, output, level, jobs, reproducible))
+            if self._compressors:
+                self._tar = tarfile.open(
+                    fileobj=_MultiWriter(*self._compressors),
+                    mode='w|', bufsize=chunk_size, format=tarfile.PAX_FORMAT)
+
+            if 'zip' in formats:
+                self.files['zip'] = basename + '.zip'
+                self._zip = ZipWriter(self._open_output('zip'),
+                                      min(level, 9), utc=reproducible)
+        except BaseException:
+            # __exit__() is not called when the constructor fails
+            self.abort()
+            raise
+
+    def _open_output(self, fmt):
+        """
+        Create the output file for the given format, computing its
+        checksums as it is written.
+
+        The archive is written to a hidden temporary file, renamed once
+        finalized (see close()), so a failed build never leaves a truncated
+        archive behind. Renaming also replaces an existing file rather
+        than overwriting it, as it may be hard-linked to a cached artifact.
+        """
+        filename = self.files[fmt]
+        if self._opener is not None:
+            output = _HashingWriter(self._opener(filename))
+            self._outputs[fmt] = output
+            return output
+
+        partial = path.join(path.dirname(filename),
+                            '.' + path.basename(filename) + '.tmp')
+        self._partials[fmt] = partial
+        output = _HashingWriter(open(partial, 'wb'))
+        self._outputs[fmt] = output
+        return output
+
+    def manifest(self):
+        """
+        Get the archives' manifest, once they have been finalized.
+
+        :return: Dict with 'archives' (name, format, size and checksums of
+                 each archive) and 'files' (path, size, SHA-256 and zip
+                 data location of each file) lists
+        """
+        archives = []
+        for fmt, output in self._outputs.items():
+            archive = {'name': path.basename(self.files[fmt]),
+                       'format': fmt,
+                       'size': output.size}
+            archive.update(output.hexdigests())
+            archives.append(archive)
+        return {'archives': archives, 'files': self.members}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def close(self):
+        """
+        Finalize the archives; they are discarded if that fails.
+        """
+        try:
+            if self._zip is not None:
+                self._zip.close()
+            if self._tar is not None:
+                self._tar.close()
+            for compressor in self._compressors:
+                compressor.close()
+            for output in self._outputs.values():
+                output.close()
+            for fmt, partial in self._partials.items():
+                os.replace(partial, self.files[fmt])
+        except BaseException:
+            self.abort()
+            raise
+        self._partials = {}
+
+    def abort(self):
+        """
+        Discard the archives after a failure, without finalizing them.
+
+        The incomplete files are removed; streams returned by the opener
+        are left open, for the caller to discard.
+        """
+        for compressor in self._compressors:
+            if isinstance(compressor, ParallelGzipWriter):
+                compressor.abort()
+        if self._opener is None:
+            for output in self._outputs.values():
+                try:
+                    output.close()
+                except OSError:
+                    pass
+        for partial in self._partials.values():
+            if path.lexists(partial):
+                os.remove(partial)
+        self._partials = {}
+
+    def add_directory(self, arcname, mode, mtime):
+        """
+        Add a directory entry to the archives.
+
+        :param arcname: Directory name in the archive
+        :param mode: Permissions
+        :param mtime: Modification time (seconds since the epoch)
+        """
+        if self._tar is not None:
+            tarinfo = tarfile.TarInfo(arcname)
+            tarinfo.type = tarfile.DIRTYPE
+            tarinfo.mode = stat.S_IMODE(mode)
+            tarinfo.mtime = int(mtime)
+            self._tar.addfile(tarinfo)
+
+        if self._zip is not None:
+            self._zip.add_directory(arcname, mode, mtime)
+
+    def add_file(self, arcname, fileobj, size, mode, mtime, key=None):
+        """
+        Add a regular file to the archives, reading its contents only once.
+
+        :param arcname: File name in the archive
+        :param fileobj: Binary file object to read the contents from
+        :param size: File size in bytes
+        :param mode: Permissions
+        :param mtime: Modification time (seconds since the epoch)
+        :param key: Content hash (Git blob SHA) identifying the file in the
+                    member cache, if any
+        """
+        member = {'path': arcname, 'size': size}
+        hasher = _HashingWriter(None, ('sha256',))
+        sinks = [hasher]
+        zip_member = None
+        raw_sink = None
+        if self._zip is not None:
+            use_cache = key is not None and self._member_cache is not None
+            cached = self._member_cache.get(key) if use_cache else None
+            if cached is not None:
+                crc, cached_size, csize, sha256, raw = cached
+                with raw:
+                    offset = self._zip.add_raw(arcname, mode, mtime, crc,
+                                               cached_size, csize, raw)
+                member['sha256'] = sha256
+                member['zip'] = {'offset': offset, 'compressed_size': csize}
+            else:
+                raw_sink = self._member_cache.writer(key) if use_cache \
+                    else None
+                zip_member = self._zip.open(arcname, mode, mtime, raw_sink)
+                sinks.append(zip_member)
+
+        try:
+            if self._tar is not None:
+                self._add_tar_file(arcname, _TeeReader(fileobj, *sinks),
+                                   size, mode, mtime)
+            elif zip_member is not None:
+                shutil.copyfileobj(_TeeReader(fileobj, *sinks),
+                                   _NullWriter(), chunk_size)
+            if zip_member is not None:
+                zip_member.close()
+        except BaseException:
+            # Don't leave the member's temporary file in the cache
+            if raw_sink is not None:
+                raw_sink.abort()
+            raise
+
+        if 'sha256' not in member:
+            member['sha256'] = hasher.hexdigests()['sha256']
+        if zip_member is not None:
+            member['zip'] = {'offset': zip_member.offset,
+                             'compressed_size': zip_member.compressed_size}
+            if raw_sink is not None:
+                raw_sink.commit(zip_member.crc, zip_member.size,
+                                member['sha256'])
+        self.members.append(member)
+
+    def _add_tar_file(self, arcname, fileobj, size, mode, mtime):
+        """
+        Add a regular file to the tarballs.
+        """
+        tarinfo = tarfile.TarInfo(arcname)
+        tarinfo.size = size
+        tarinfo.mode = stat.S_IMODE(mode)
+        tarinfo.mtime = int(mtime)
+        self._tar.addfile(tarinfo, fileobj)
+
+    def add_symlink(self, arcname, linkname, mtime):
+        """
+        Add a symbolic link to the archives.
+
+        :param arcname: Link name in the archive
+        :param linkname: Link target
+        :param mtime: Modification time (seconds since the epoch)
+        """
+        if self._tar is not None:
+            tarinfo = tarfile.TarInfo(arcname)
+            tarinfo.type = tarfile.SYMTYPE
+            tarinfo.linkname = linkname
+            tarinfo.mode = 0o777
+            tarinfo.mtime = int(mtime)
+            self._tar.addfile(tarinfo)
+
+        if self._zip is not None:
+            self._zip.add_symlink(arcname, linkname, mtime)
+
+    def add_entry(self, entry, prefix):
+        """
+        Add an ArchiveEntry to the archives.
+
+        :param entry: ArchiveEntry object
+        :param prefix: Top-level directory name inside the archives
+        """
+        arcname = prefix + '/' + entry.name
+        if entry.type == ArchiveEntry.DIRECTORY:
+            self.add_directory(arcname, entry.mode, entry.mtime)
+        elif entry.type == ArchiveEntry.SYMLINK:
+            self.add_symlink(arcname, entry.linkname, entry.mtime)
+        else:
+            with entry.opener() as f:
+                self.add_file(arcname, f, entry.size, entry.mode, entry.mtime,
+                              entry.key)
+
+
+def normalize_entries(entries, mtime):
+    """
+    Normalize entries' metadata for reproducible archives.
+
+    All entries get the same modification time, and permissions are
+    reduced to 0755 for directories and executable files, 0644 otherwise.
+
+    :param entries: Iterable of ArchiveEntry objects
+    :param mtime: Modification time to set (seconds since the epoch)
+
+    :return: Generator of ArchiveEntry objects
+    """
+    for entry in entries:
+        entry.mtime = int(mtime)
+        if entry.type == ArchiveEntry.SYMLINK:
+            entry.mode = 0o777
+        elif entry.type == ArchiveEntry.DIRECTORY or entry.mode & 0o111:
+            entry.mode = 0o755
+        else:
+            entry.mode = 0o644
+        yield entry
+
+
+def build_archives(entries, basename, prefix, mtime=None,
+                   formats=default_formats, level=default_level, jobs=None,
+                   member_cache=None, reproducible=False, opener=None):
+    """
+    Create the release tarballs and zip file.
+
+    :param entries: Iterable of ArchiveEntry objects, parents first
+                    (see walk_tree() and walk_git_tree())
+    :param basename: Archives' full path, without extension
+    :param prefix: Top-level directory name inside the archives
+    :param mtime: Modification time of the top-level directory,
+                  defaults to the current time
+    :param formats: List of archive formats to create (see all_formats)
+    :param level: Compression level
+    :param jobs: Number of parallel compression jobs, defaults to the
+                 number of CPUs
+    :param member_cache: Optional releasecache.MemberCache, to reuse
+                         compressed zip members
+    :param reproducible: Create byte-for-byte reproducible archives; all
+                         entries get the given mtime (which is required)
+                         and normalized permissions, see normalize_entries()
+    :param opener: Callable returning the binary stream to write an archive
+                   to, given its file name; defaults to creating the file
+
+    :return: Tuple (dict of archive format => created archive file,
+             manifest as returned by ReleaseArchiver.manifest())
+    """
+    if reproducible:
+        if mtime is None:
+            raise ValueError("Reproducible archives require a fixed mtime")
+        entries = normalize_entries(entries, mtime)
+    elif mtime is None:
+        mtime = time.time()
+
+    with ReleaseArchiver(basename, formats, level, jobs, member_cache,
+                         reproducible, opener) as archiver:
+        archiver.add_directory(prefix, 0o755, mtime)
+        for entry in entries:
+            archiver.add_entry(entry, prefix)
+
+    return archiver.files, archiver.manifest()
+
+
+def write_manifest(manifest, basename, opener=None):
+    """
+    Save the archives' checksums and manifest.
+
+    Creates SHA256SUMS and SHA512SUMS files (in the format expected by
+    `sha256sum --check`) next to the archives, and a JSON manifest.
+
+    :param manifest: Manifest, as returned by build_archives()
+    :param basename: Archives' full path, without extension
+    :param opener: Callable returning the binary stream to write a file
+                   to, given its name; defaults to creating the file
+
+    :return: List of created files
+    """
+    if opener is None:
+        def opener(name):
+            return open(name, 'wb')
+
+    release_path = path.dirname(basename)
+    contents = {}
+    for algorithm in checksum_algorithms:
+        filename = path.join(release_path, algorithm.upper() + 'SUMS')
+        contents[filename] = ''.join(
+            '{}  {}\n'.format(archive[algorithm], archive['name'])
+            for archive in manifest['archives'])
+    contents[basename + '.manifest.json'] = json.dumps(manifest, indent=1)
+
+    for filename, text in contents.items():
+        with opener(filename) as f:
+            f.write(text.encode())
+    return list(contents)
@@ -0,0 +1,250 @@
+"""
+ADOdb release build artifacts cache.
+
+- ArtifactCache class
+  Content-addressed store of release archives, keyed by the Git tree they
+  were built from plus the settings affecting their contents, so that
+  rebuilding an unchanged release just retrieves the previous archives.
+- MemberCache class
+  Store of individual compressed zip members, keyed by Git blob SHA, so
+  that only the files that changed need to be compressed again.
+
+The cache is located in $XDG_CACHE_HOME/adodb-release (~/.cache by
+default); it is safe to delete it at any time.
+
+This file is part of ADOdb, a Database Abstraction Layer library for PHP.
+
+@package ADOdb
+@link https://adodb.org Project's web site and documentation
+@link https://github.com/ADOdb/ADOdb Source code and issue tracker
+
+The ADOdb Library is dual-licensed, released under both the BSD 3-Clause
+and the GNU Lesser General Public Licence (LGPL) v2.1 or, at your option,
+any later version. This means you can use it in proprietary products.
+See the LICENSE.md file distributed with this source code for details.
+@license BSD-3-Clause
+@license LGPL-2.1-or-later
+
+@copyright 2026 Damien Regad, Mark Newnham and the ADOdb community
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import struct
+import tempfile
+from os import path
+
+# Bump this when a change in the archive writer alters the archives'
+# contents, to invalidate previously cached artifacts
+cache_format = 2
+
+
+def cache_dir():
+    """
+    Return the release scripts' cache directory.
+    """
+    root = os.environ.get('XDG_CACHE_HOME') or path.expanduser('~/.cache')
+    return path.join(root, 'adodb-release')
+
+
+def _link_or_copy(src, dst):
+    """
+    Hard-link src to dst, falling back to a copy (e.g. across filesystems).
+    An existing dst is replaced.
+    """
+    if path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class ArtifactCache:
+    """
+    Cache of complete release archives.
+    """
+    root = ''
+
+    def __init__(self, root=None):
+        """
+        Class Constructor.
+
+        :param root: Cache directory, defaults to cache_dir()
+        """
+        self.root = root or cache_dir()
+
+    @staticmethod
+    def key(tree, **settings):
+        """
+        Compute the cache key for a build.
+
+        :param tree: SHA of the Git tree being archived
+        :param settings: Any other parameters affecting the archives'
+                         contents (exclusions, formats, compression, ...)
+
+        :return: Key (SHA-256 hex string)
+        """
+        data = json.dumps(dict(settings, tree=tree, format=cache_format),
+                          sort_keys=True, default=list)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def _path(self, key):
+        return path.join(self.root, 'artifacts', key[:2], key)
+
+    def fetch(self, key, files):
+        """
+        Retrieve cached archives.
+
+        :param key: Cache key, see key()
+        :param files: Dict of archive format => target file path
+
+        :return: The archives' manifest (see releasearchive.py), with
+                 archive names matching the target files, if all the
+                 archives were found and retrieved; None otherwise
+        """
+        entry = self._path(key)
+        manifest_file = path.join(entry, 'manifest.json')
+        if not path.isfile(manifest_file) \
+                or not all(path.isfile(path.join(entry, fmt))
+                           for fmt in files):
+            return None
+
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+        for archive in manifest['archives']:
+            archive['name'] = path.basename(files[archive['format']])
+
+        for fmt, target in files.items():
+            _link_or_copy(path.join(entry, fmt), target)
+        return manifest
+
+    def store(self, key, files, manifest):
+        """
+        Add archives to the cache.
+
+        :param key: Cache key, see key()
+        :param files: Dict of archive format => file path
+        :param manifest: The archives' manifest
+        """
+        entry = self._path(key)
+        os.makedirs(path.dirname(entry), exist_ok=True)
+
+        # Populate a temporary directory, then rename it into place so
+        # that concurrent readers never see a partial entry
+        tmp = tempfile.mkdtemp(dir=path.dirname(entry), prefix='.tmp-')
+        for fmt, source in files.items():
+            _link_or_copy(source, path.join(tmp, fmt))
+        with open(path.join(tmp, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            # Already stored by another build
+            shutil.rmtree(tmp)
+
+    def member_cache(self, level):
+        """
+        Get the compressed zip members cache for the given compression level.
+
+        :param level: Compression level
+
+        :return: MemberCache object
+        """
+        return MemberCache(path.join(self.root, 'members',
+                                     '{}-{}'.format(cache_format, level)))
+
+
+class MemberCache:
+    """
+    Cache of raw-deflated zip members.
+
+    Each member is stored in a file named after the Git blob's SHA,
+    containing the CRC-32, uncompressed size and SHA-256, followed by the
+    compressed data.
+    """
+    directory = ''
+
+    _header = struct.Struct('<LQ32s')
+
+    def __init__(self, directory):
+        """
+        Class Constructor.
+
+        :param directory: Directory where members are stored
+        """
+        self.directory = directory
+
+    def _path(self, key):
+        return path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """
+        Look up a cached member.
+
+        :param key: Git blob SHA
+
+        :return: Tuple (crc, uncompressed size, compressed size, SHA-256
+                 hex digest, open binary file positioned at the compressed
+                 data), or None if the member is not cached
+        """
+        try:
+            f = open(self._path(key), 'rb')
+        except FileNotFoundError:
+            return None
+        crc, size, sha256 = self._header.unpack(f.read(self._header.size))
+        csize = os.fstat(f.fileno()).st_size - self._header.size
+        return crc, size, csize, sha256.hex(), f
+
+    def writer(self, key):
+        """
+        Create a writer to add a member to the cache.
+
+        :param key: Git blob SHA
+
+        :return: _MemberWriter object; write() the compressed data to it,
+                 then call commit()
+        """
+        target = self._path(key)
+        os.makedirs(path.dirname(target), exist_ok=True)
+        return _MemberWriter(target, self._header)
+
+
+class _MemberWriter:
+    """
+    Writes a compressed member to a temporary file, which is moved to its
+    final location on commit.
+    """
+
+    def __init__(self, target, header):
+        self._target = target
+        self._header = header
+        fd, self._tmp = tempfile.mkstemp(dir=path.dirname(target),
+                                         prefix='.tmp-')
+        self._file = os.fdopen(fd, 'wb')
+        self._file.write(bytes(header.size))
+
+    def write(self, data):
+        self._file.write(data)
+
+    def commit(self, crc, size, sha256):
+        """
+        Finalize the member and make it available in the cache.
+
+        :param crc: CRC-32 of the uncompressed data
+        :param size: Uncompressed size
+        :param sha256: SHA-256 hex digest of the uncompressed data
+        """
+        self._file.seek(0)
+        self._file.write(self._header.pack(crc, size, bytes.fromhex(sha256)))
+        self._file.close()
+        os.replace(self._tmp, self._target)
+
+    def abort(self):
+        """
+        Discard the member.
+        """
+        self._file.close()
+        os.remove(self._tmp)
@@ -21,16 +21,24 @@ See the LICENSE.md file distributed with this source code for details.
 @author Damien Regad
 """
 
+import concurrent.futures
 from datetime import date
 import getopt
+import json
 import os
 from os import path
 import re
 import subprocess
 import sys
+import tempfile
+import time
+
+import changelog
+import gitrepo
+import releasecache
+import versions
 
 # ADOdb version validation regex
-# These are used by sed - they are not PCRE !
 _version_dev = "dev"
 _version_abrc = r"(alpha|beta|rc)(\.([0-9]+))?"
 _version_prerelease = r"(-?({0}|{1}))?".format(_version_dev, _version_abrc)
@@ -39,11 +47,23 @@ _version_regex = _version_base + _version_prerelease
 _release_date_regex = r"(Unreleased|[0-9?]+-.*-[0-9]+)"
 _changelog_file = "docs/changelog.md"
 
-_tag_prefix = "v"
+_tag_prefix = versions.tag_prefix
+
+# Version stamping rules: on lines containing the marker, the first match
+# of the regex is replaced by the version number and release date
+_stamp_rules = (
+    ('ADODB_vers', _version_regex + r"(\s+" + _release_date_regex + ")?"),
+)
+_stamp_rules_compiled = tuple((marker, re.compile(regex))
+                              for marker, regex in _stamp_rules)
+_stamp_extensions = ('.php', '.html')
+
+# Stamp index entries not used for that long are removed (seconds)
+_stamp_index_expiry = 90 * 24 * 3600
 
 # Command-line options
-options = "hct"
-long_options = ["help", "commit", "tag"]
+options = "hctn"
+long_options = ["help", "commit", "tag", "dry-run"]
 
 
 def usage():
@@ -58,6 +78,7 @@ def usage():
     Options:
         -c | --commit           Automatically commit the changes
         -t | --tag              Create a tag for the new release
+        -n | --dry-run          Show the changes without modifying the files
         -h | --help             Show this usage message
 '''.format(
         path.basename(__file__)
@@ -69,36 +90,33 @@ def version_is_dev(version):
     """
     Return true if version is a development release.
     """
-    return version.endswith(_version_dev)
+    return versions.Version.parse(version).is_dev
 
 
 def version_is_prerelease(version):
     """
     Return true if version is alpha, beta or release-candidate.
     """
-    return re.search(_version_abrc, version) is not None
+    return versions.Version.parse(version).is_prerelease
 
 
 def version_is_patch(version):
     """
     Return true if version is a patch release (i.e. X.Y.Z with Z > 0).
     """
-    return (re.search('^' + _version_base + '$', version) is not None
-            and not version.endswith('.0'))
+    return versions.Version.parse(version).is_patch
 
 
 def version_parse(version):
     """
-    Breakdown the version into groups (Z and -dev are optional).
+    Parse the version number (Z and -dev are optional).
 
-    Groups:
-      - 1:(X.Y)
-      - 2:(.Z)
-      - 3:(Z)
-      - 4:(-dev or -alpha/beta/rc.N)
-      - 8: N
+    :return: versions.Version object, or None if the version is invalid
     """
-    return re.match(r'^{0}$'.format(_version_regex), version)
+    try:
+        return versions.Version.parse(version)
+    except ValueError:
+        return None
 
 
 def version_check(version):
@@ -108,32 +126,15 @@ def version_check(version):
     Returns the SemVer-normalized version without the "v" prefix
     - add '.0' if missing patch bit
     - add '-' before dev release suffix if needed
+    - add '.1' if no alpha/beta/rc version number is specified
     """
     vparse = version_parse(version)
-    if not vparse:
+    if not vparse or vparse.letter:
         usage()
         print("ERROR: invalid version ! \n")
         sys.exit(1)
 
-    vnorm = vparse.group(1)
-
-    # Add .patch version component
-    if vparse.group(2):
-        vnorm += vparse.group(2)
-    else:
-        # None was specified, assume a .0 release
-        vnorm += '.0'
-
-    # Normalize version number
-    if version_is_dev(version):
-        vnorm += '-' + _version_dev
-    elif version_is_prerelease(version):
-        vnorm += '-' + vparse.group(5)
-        # If no alpha/beta/rc version number specified, assume 1
-        if not vparse.group(8):
-            vnorm += ".1"
-
-    return vnorm
+    return str(vparse)
 
 
 def get_release_date(version):
@@ -148,39 +149,277 @@ def get_release_date(version):
         return date.today().strftime("%Y-%m-%d")
 
 
-def git_root():
+def git_root(cwd=None):
     """
     Return the git repository's root (top-level) directory.
+
+    :param cwd: Directory within the repository, defaults to current one
     """
-    return subprocess.check_output(
-        'git rev-parse --show-toplevel',
-        text=True,
-        shell=True
-        ).rstrip()
+    return gitrepo.Repository(cwd or '.').root
 
 
-def sed_script(version):
+def stamp_text(text, version):
     """
-    Build sed script to update version information in source files.
+    Apply the version stamping rules to a file's contents.
+
+    :param text: File contents
+    :param version: Version number
+
+    :return: Updated contents
     """
-    # Version number and release date
-    script = r"/ADODB_vers/s/{0}(\s+{1})?/v{2}  {3}/".format(
-        _version_regex,
-        _release_date_regex,
-        version,
-        get_release_date(version)
-    )
-    return script
+    stamp = "v{0}  {1}".format(version, get_release_date(version))
+    lines = text.splitlines(keepends=True)
+    for i, line in enumerate(lines):
+        for marker, regex in _stamp_rules_compiled:
+            if marker in line:
+                lines[i] = regex.sub(lambda m: stamp, line, count=1)
+    return ''.join(lines)
 
 
-def sed_run(script, files):
+def _map(function, items):
     """
-    Run sed.
+    Apply a function to a list of items, using a thread pool when there
+    are enough of them to make it worthwhile.
+
+    :return: List of results
     """
-    subprocess.call(
-        "sed -r -i '{0}' {1} ".format(script, files),
-        shell=True
-    )
+    if len(items) < 16:
+        return [function(item) for item in items]
+    with concurrent.futures.ThreadPoolExecutor() as pool:
+        return list(pool.map(function, items))
+
+
+def _has_stamp(filename):
+    """
+    Check whether a file contains text matching the version stamping rules.
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+    for marker, regex in _stamp_rules_compiled:
+        if marker.encode() not in data:
+            continue
+        for line in data.decode('utf-8', 'surrogateescape').splitlines():
+            if marker in line and regex.search(line):
+                return True
+    return False
+
+
+def _walk_files(root):
+    """
+    List the files below root, excluding the .git directory.
+
+    :return: List of file paths, relative to root
+    """
+    files = []
+    pending = ['']
+    while pending:
+        directory = pending.pop()
+        with os.scandir(path.join(root, directory)) as it:
+            for entry in it:
+                name = directory + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name != '.git':
+                        pending.append(name + os.sep)
+                else:
+                    files.append(name)
+    return files
+
+
+def _git_files(root):
+    """
+    List the files of a Git work tree (tracked and untracked, except
+    ignored ones), with the blob SHA of the tracked files matching the
+    index.
+
+    :param root: Work tree directory
+
+    :return: Dict of file path relative to root => blob SHA, or None for
+             modified and untracked files; None if root is not in a Git
+             work tree
+    """
+    def git(*args):
+        output = subprocess.check_output(('git',) + args, cwd=root,
+                                         stderr=subprocess.DEVNULL)
+        return [name for name in output.decode().split('\0') if name]
+
+    try:
+        staged = git('ls-files', '--stage', '-z')
+        modified = set(git('diff', '--name-only', '-z'))
+        untracked = git('ls-files', '--others', '--exclude-standard', '-z')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    files = {}
+    for line in staged:
+        info, name = line.split('\t', 1)
+        mode, sha, stage = info.split()
+        # Skip submodules and symbolic links
+        if mode in ('160000', '120000'):
+            continue
+        if name in modified or stage != '0':
+            if path.isfile(path.join(root, name)):
+                files[name] = None
+        else:
+            files[name] = sha
+    for name in untracked:
+        files[name] = None
+    return files
+
+
+def stamp_index(root):
+    """
+    Find the files containing version markers.
+
+    The result of scanning each Git blob is cached, so that only new or
+    modified files are read again, wherever the work tree is (e.g. in the
+    temporary worktrees used by buildrelease.py). Files that don't match
+    a blob (modified, untracked, or outside a Git repository) are always
+    scanned.
+
+    :param root: Repository's root directory
+
+    :return: Sorted list of file paths, relative to root
+    """
+    root = path.abspath(root)
+    files = _git_files(root)
+    if files is None:
+        files = dict.fromkeys(_walk_files(root))
+    files = {name: sha for name, sha in files.items()
+             if name.endswith(_stamp_extensions)}
+
+    index_file = path.join(releasecache.cache_dir(), 'stamp-index.json')
+    try:
+        with open(index_file) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    rules_key = repr(_stamp_rules)
+    if index.get('rules') != rules_key or 'blobs' not in index:
+        index = {'rules': rules_key, 'blobs': {}}
+    blobs = index['blobs']
+    modified = False
+
+    # Scan new and modified files
+    now = int(time.time())
+    stale = [name for name, sha in files.items() if sha not in blobs]
+    found = dict(zip(stale, _map(
+        lambda name: _has_stamp(path.join(root, name)), stale)))
+    for name, has_stamp in found.items():
+        if files[name] is not None:
+            blobs[files[name]] = [has_stamp, now]
+            modified = True
+
+    # Record when cached entries were last used (at most daily, to avoid
+    # rewriting the index on each run), and remove the expired ones
+    for sha in files.values():
+        if sha is not None and blobs[sha][1] < now - 24 * 3600:
+            blobs[sha][1] = now
+            modified = True
+    expired = [sha for sha, (_, used) in blobs.items()
+               if used < now - _stamp_index_expiry]
+    for sha in expired:
+        del blobs[sha]
+
+    if modified or expired or len(index) > 2:
+        # Only keep the current format's entries
+        index = {'rules': rules_key, 'blobs': blobs}
+        os.makedirs(path.dirname(index_file), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.dirname(index_file),
+                                   prefix='.tmp-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp, index_file)
+
+    return sorted(name for name, sha in files.items()
+                  if (found[name] if sha is None or name in found
+                      else blobs[sha][0]))
+
+
+def _rewrite(filename, text):
+    """
+    Atomically replace a file's contents, preserving its permissions.
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.dirname(filename), prefix='.tmp-')
+    with os.fdopen(fd, 'w', encoding='utf-8', errors='surrogateescape',
+                   newline='') as f:
+        f.write(text)
+    os.chmod(tmp, os.stat(filename).st_mode & 0o7777)
+    os.replace(tmp, filename)
+
+
+def _stamp_diff(name, before, after, context=3):
+    """
+    Build a unified diff of stamped lines.
+
+    Stamping replaces lines one for one, so unlike difflib, there is no
+    need to search for the longest matching blocks.
+
+    :param name: File name
+    :param before: Original lines
+    :param after: Stamped lines (same number of lines)
+    :param context: Number of context lines
+
+    :return: Unified diff
+    """
+    changed = [i for i, (a, b) in enumerate(zip(before, after)) if a != b]
+    if not changed:
+        return ''
+
+    # Group changes whose context overlaps into hunks
+    hunks = []
+    for i in changed:
+        if hunks and i - hunks[-1][-1] <= 2 * context:
+            hunks[-1].append(i)
+        else:
+            hunks.append([i])
+
+    diff = ['--- a/{}\n'.format(name), '+++ b/{}\n'.format(name)]
+    for hunk in hunks:
+        start = max(0, hunk[0] - context)
+        end = min(len(before), hunk[-1] + context + 1)
+        diff.append('@@ -{0},{1} +{0},{1} @@\n'.format(start + 1, end - start))
+        for i in range(start, end):
+            if i in hunk:
+                diff.append('-' + before[i])
+                diff.append('+' + after[i])
+            else:
+                diff.append(' ' + before[i])
+    return ''.join(diff)
+
+
+def stamp_files(version, cwd=None, dry_run=False):
+    """
+    Update version number and release date in all php and html files.
+
+    :param version: Version number
+    :param cwd: Repository's root directory, defaults to current one
+    :param dry_run: Do not modify the files
+
+    :return: Dict of modified file => unified diff of the changes
+    """
+    root = cwd or os.getcwd()
+
+    def stamp(name):
+        # Decoded like in _has_stamp(); bytes that are not valid UTF-8
+        # are preserved as is
+        filename = path.join(root, name)
+        with open(filename, encoding='utf-8', errors='surrogateescape',
+                  newline='') as f:
+            before = f.read()
+        after = stamp_text(before, version)
+        if after == before:
+            return name, None
+        if not dry_run:
+            _rewrite(filename, after)
+        diff = _stamp_diff(name,
+                           before.splitlines(keepends=True),
+                           after.splitlines(keepends=True))
+        # Make the diff printable
+        diff = diff.encode('utf-8', 'surrogateescape')
+        return name, diff.decode('utf-8', 'replace')
+
+    results = _map(stamp, stamp_index(root))
+    return {name: diff for name, diff in results if diff is not None}
 
 
 def tag_name(version):
@@ -190,29 +429,36 @@ def tag_name(version):
     return _tag_prefix + version
 
 
-def tag_check(version):
+def tag_check(version, cwd=None, repo=None):
     """
-    Checks if the tag for the specified version exists in the repository
-    by attempting to check it out, throws exception if not.
+    Checks if the tag for the specified version exists in the repository.
+    The ref is looked up directly, without running git.
+
+    :param version: Version number
+    :param cwd: Directory within the repository, defaults to current one
+    :param repo: gitrepo.Repository to use instead of cwd
+
+    :return: True if the tag exists
     """
-    subprocess.check_call(
-        "git checkout --quiet " + tag_name(version),
-        stderr=subprocess.PIPE,
-        shell=True)
+    if repo is None:
+        repo = gitrepo.Repository(cwd or '.')
+    if repo.ref('refs/tags/' + tag_name(version)) is None:
+        return False
     print("Tag '{0}' already exists".format(tag_name(version)))
+    return True
 
 
-def tag_delete(version):
+def tag_delete(version, cwd=None):
     """
     Deletes the specified tag
     """
     subprocess.check_call(
-        "git tag --delete " + tag_name(version),
+        ['git', 'tag', '--delete', tag_name(version)],
         stderr=subprocess.PIPE,
-        shell=True)
+        cwd=cwd)
 
 
-def tag_create(version):
+def tag_create(version, cwd=None):
     """
     Create the tag for the specified version.
 
@@ -220,117 +466,93 @@ def tag_create(version):
     """
     print("Creating release tag '{0}'".format(tag_name(version)))
     result = subprocess.call(
-        "git tag --sign --message '{0}' {1}".format(
-            "ADOdb version {0} released {1}".format(
-                version,
-                get_release_date(version)
-            ),
-            tag_name(version)
-        ),
-        shell=True
+        ['git', 'tag', '--sign',
+         '--message', "ADOdb version {0} released {1}".format(
+             version,
+             get_release_date(version)
+         ),
+         tag_name(version)],
+        cwd=cwd
     )
     return result == 0
 
 
-def section_exists(filename, version, print_message=True):
+def section_exists(index, version, print_message=True):
     """
-    Check given file for existing section with specified version.
+    Check the changelog for existing section with specified version.
+
+    :param index: changelog.ChangelogIndex of the changelog file
+    :param version: Version number
+    :param print_message: Report the existing section
     """
-    for i, line in enumerate(open(filename)):
-        if re.search(r'^## \[?' + version + r']', line):
-            if print_message:
-                print("  Existing section for v{0} found,"
-                      .format(version), end=" ")
-            return True
+    if version in index:
+        if print_message:
+            print("  Existing section for v{0} found,"
+                  .format(version), end=" ")
+        return True
     return False
 
 
-class UnsupportedPreviousVersion(Exception):
-    pass
-
-
-class NoPreviousVersion(Exception):
-    pass
+def version_get_previous(version, index=None):
+    """
+    Returns the released version preceding the given one in the Changelog.
 
+    For pre-releases, this is the previous pre-release of the same
+    version if any (e.g. beta.1 for beta.2), otherwise the version itself
+    (i.e. X.Y.Z for X.Y.Z-alpha.1).
 
-def version_get_previous(version):
-    """
-    Returns the previous version number.
+    :param version: Version number
+    :param index: changelog.ChangelogIndex to search, defaults to the one
+                  of docs/changelog.md
 
-    In pre-release scenarios, it would be complex to figure out what the
-    previous version is, so it is not worth the effort to implement as
-    this is a rare usage scenario; we just raise an exception in this case.
-    - 'UnsupportedPreviousVersion' when attempting facing pre-release
-      scenarios (rc -> beta -> alpha)
-    - 'NoPreviousVersion' when processing major version or .1 pre-releases
-      (can't handle e.g. alpha.0)
+    :return: Previous version number, or False if there is none
     """
-    vprev = version.split('.')
-    item = len(vprev) - 1
+    if index is None:
+        index = changelog.ChangelogIndex(
+            [changelog.ChangelogFile.load(_changelog_file)])
+    previous = index.previous(version, released=True)
 
-    while item > 0:
-        try:
-            val = int(vprev[item])
-        except ValueError:
-            raise UnsupportedPreviousVersion(
-                "Retrieving pre-release's previous version is not supported")
-        if val > 0:
-            vprev[item] = str(val - 1)
-            break
-        item -= 1
+    if version_is_prerelease(version):
+        version_release = str(versions.Version.parse(version).release)
+        if previous is None or not previous.startswith(version_release):
+            return version_release
 
-    # Unhandled scenarios:
-    # - major version number (item == 0)
-    # - .0 pre-release
-    if (item == 0
-            or version_is_prerelease(version) and vprev[item] == '0'):
-        raise NoPreviousVersion
+    return previous or False
 
-    return '.'.join(vprev)
 
-
-def update_changelog(version):
+def update_changelog(version, cwd=None, dry_run=False):
     """
     Update the release date in the Change Log.
+
+    :param version: Version number
+    :param cwd: Repository's root directory, defaults to current one
+    :param dry_run: Only show the changes, without modifying the file
     """
     print("Updating Changelog")
+    changelog_file = path.join(cwd or '', _changelog_file)
+    editor = changelog.ChangelogEditor(changelog_file)
+    index = changelog.ChangelogIndex(
+        [changelog.ChangelogFile.load(changelog_file)])
 
     # Version number without '-dev' suffix
-    vparse = version_parse(version)
-    version_release = vparse.group(1) + vparse.group(2)
+    version_release = str(versions.Version.parse(version).release)
 
-    # Make sure previous version exists in changelog, ignore .0 pre-releases
-    try:
-        if version_is_dev(version):
-            version_previous = version_get_previous(version_release)
-        else:
-            version_previous = version_get_previous(version)
-        if not section_exists(_changelog_file, version_previous, False):
-            raise ValueError(
-                "ERROR: previous version {0} does not exist in changelog"
-                .format(version_previous)
-                )
-    except NoPreviousVersion:
-        if version_is_prerelease(version):
-            version_previous = version_release
-        else:
-            version_previous = False
+    # Previous version, as found in the changelog
+    if version_is_dev(version):
+        version_previous = version_get_previous(version_release, index)
+    else:
+        version_previous = version_get_previous(version, index)
 
     # Remove patch component from previous version (x.y.z -> x.y)
-    version_nopatch = version_parse(version_previous).group(1)
+    if version_previous:
+        version_nopatch = versions.Version.parse(version_previous).series
 
     # If version exists, update the release date
-    if section_exists(_changelog_file, version):
+    if section_exists(index, version):
         print('updating release date')
-        script = r"s/^## \[{0}] .*$/## [{1}] - {2}/".format(
-            version.replace('.', r'\.'),
-            version,
-            get_release_date(version)
-            )
+        editor.set_date(version, get_release_date(version))
         # Set version link's target to release tag
-        script += r";/^\[{0}\]/s/(\.\.\.).*$/\1v{0}/".format(
-            version_release
-            )
+        editor.set_link_head(version_release, "v" + version_release)
 
     else:
         # If it's a .0 release, treat it as dev
@@ -341,7 +563,7 @@ def update_changelog(version):
 
         # If development release already exists, nothing to do
         if (version_is_dev(version)
-                and section_exists(_changelog_file, version_release)):
+                and section_exists(index, version_release)):
             print("nothing to do")
             return
 
@@ -349,87 +571,106 @@ def update_changelog(version):
 
         # Prerelease section is inserted after the main version's,
         # otherwise we insert the new section before it.
-        section_template = r"## \[{0}] - {1}"
         if version_is_prerelease(version):
-            version_section = section_template.format(
-                version,
-                get_release_date(version)
-                )
-            version_section = "\\0\\n\\n" + version_section
+            section_version = version
         else:
-            version_section = section_template.format(
-                version_release,
-                get_release_date(version)
-                )
-            version_section += "\\n\\n\\0"
+            section_version = version_release
+        section_after = version_is_prerelease(version)
 
         if version_previous:
-            # Insert new section
-            script = r"1,/^## \[({0}|{2})/s/^## \[({0}|{2}).*$/{1}/".format(
-                version_nopatch,
-                version_section,
-                version_release
-                )
+            # Insert new section next to the first one matching the
+            # previous or current version
+            anchor = next((section for section in editor.sections
+                           if section.version.startswith(
+                               (version_nopatch, version_release))),
+                          None)
+            if anchor is not None:
+                editor.insert_section(section_version,
+                                      get_release_date(version),
+                                      anchor.version,
+                                      section_after)
 
             # Version number link target
             link_head = "v" + version
             if version_is_patch(version_release):
                 link_search = version_previous
                 if version_is_dev(version):
-                    link_head = r"hotfix\/" + version_nopatch
+                    link_head = "hotfix/" + version_nopatch
             else:
                 if version_is_prerelease(version):
                     link_search = version_release
                 else:
                     link_search = version_nopatch
                 if version_is_dev(version):
-                    link_head = r"master\n"
-            link_target = r"[{0}]: {1}v{2}...{3}".format(
-                version_release if not version_is_prerelease(version) else version,
-                "https://github.com/adodb/adodb/compare/".replace('/', r'\/'),
-                version_previous,
-                link_head
-                )
-            script += r";0,/^\[{0}/s//{1}\n&/".format(link_search, link_target)
+                    link_head = "master"
+            editor.insert_link(
+                version_release if not version_is_prerelease(version)
+                else version,
+                "https://github.com/adodb/adodb/compare/v{0}...{1}".format(
+                    version_previous,
+                    link_head
+                ),
+                link_search + '*',
+                link_head == "master"
+            )
 
         # We don't have a previous version, insert before the first section
         else:
             print("No previous version")
-            script = "1,/^## /s/^## .*$/{0}/".format(version_section)
+            editor.insert_section(section_version,
+                                  get_release_date(version),
+                                  after=section_after)
 
-    sed_run(script, _changelog_file)
+    if dry_run:
+        print(editor.diff(), end='')
+        return
 
+    editor.save()
     print("  WARNING: review '{0}' to ensure added section is correct".format(
-        _changelog_file
+        changelog_file
         ))
 
 # end update_changelog
 
 
-def version_set(version, do_commit=True, do_tag=True):
+def version_set(version, do_commit=True, do_tag=True, cwd=None,
+                dry_run=False):
     """
     Bump version number and set release date in source files.
-    """
-    print("Preparing version bump commit")
 
-    update_changelog(version)
+    :param version: Version number
+    :param do_commit: Commit the changes
+    :param do_tag: Create the release tag (only if do_commit is True)
+    :param cwd: Repository's root directory, defaults to current one
+    :param dry_run: Only show the changes, without modifying the files
+    """
+    if dry_run:
+        print("Dry-run mode - showing changes without modifying files")
+    else:
+        print("Preparing version bump commit")
+    update_changelog(version, cwd, dry_run)
 
     print("Updating version and date in source files")
-    sed_run(sed_script(version), "adodb.inc.php")
+    changes = stamp_files(version, cwd, dry_run)
+    if dry_run:
+        for diff in changes.values():
+            print(diff, end='')
+        return
+    for name in changes:
+        print("  " + name)
     print("Version set to {0}".format(version))
 
     if do_commit:
         # Commit changes
         print("Committing")
         commit_ok = subprocess.call(
-            "git commit --all --message '{0}'".format(
-                "Bump version to {0}".format(version)
-            ),
-            shell=True
+            ['git', 'commit', '--all',
+             '--message', "Bump version to {0}".format(version)],
+            cwd=cwd
         )
 
         if do_tag:
-            tag_ok = tag_create(version)
+            tag_ok = tag_create(version, cwd)
         else:
             tag_ok = False
 
@@ -468,6 +709,7 @@ def main():
 
     do_commit = False
     do_tag = False
+    dry_run = False
 
     for opt, val in opts:
         if opt in ("-h", "--help"):
@@ -480,6 +722,9 @@ def main():
         elif opt in ("-t", "--tag"):
             do_tag = True
 
+        elif opt in ("-n", "--dry-run"):
+            dry_run = True
+
     # Mandatory parameters
     version = version_check(args[0])
 
@@ -487,7 +732,7 @@ def main():
     os.chdir(git_root())
 
     # Let's do it
-    version_set(version, do_commit, do_tag)
+    version_set(version, do_commit, do_tag, dry_run=dry_run)
 # end main()
 
 
@@ -0,0 +1,977 @@
+"""
+ADOdb release files upload backends.
+
+Each upload target configured in env.yml (see `upload_targets` in
+env.yml.sample) is handled by a backend, selected by the target's `type`:
+
+- RsyncBackend (`rsync`)
+  Remote host over SSH: a single connection (OpenSSH ControlMaster) is
+  shared by the rsync transfers; no shell commands are run on the host.
+  Streamed files are spooled locally.
+- LocalBackend (`local`)
+  Local directory mirror.
+- S3Backend (`s3`)
+  S3-compatible object store (AWS S3, MinIO...), using the REST API
+  directly; large files are uploaded in parallel parts, and objects whose
+  ETag already matches the local file are skipped.
+
+All backends support uploading existing files and streaming files as they
+are produced (see UploadStream), and verifying the uploaded files.
+
+This file is part of ADOdb, a Database Abstraction Layer library for PHP.
+
+@package ADOdb
+@link https://adodb.org Project's web site and documentation
+@link https://github.com/ADOdb/ADOdb Source code and issue tracker
+
+The ADOdb Library is dual-licensed, released under both the BSD 3-Clause
+and the GNU Lesser General Public Licence (LGPL) v2.1 or, at your option,
+any later version. This means you can use it in proprietary products.
+See the LICENSE.md file distributed with this source code for details.
+@license BSD-3-Clause
+@license LGPL-2.1-or-later
+
+@copyright 2026 Damien Regad, Mark Newnham and the ADOdb community
+"""
+
+import collections
+import concurrent.futures
+import datetime
+import hashlib
+import hmac
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import time
+import urllib.parse
+import xml.etree.ElementTree as ElementTree
+from os import path
+
+import requests
+import requests.adapters
+
+# Size of the chunks read when copying files and computing checksums
+chunk_size = 1024 * 1024
+
+
+def file_checksum(filename):
+    """
+    Compute a file's SHA-256.
+    """
+    sha256 = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _skip_prefix(f, prefix):
+    """
+    Check whether a file starts with another file's contents, comparing
+    them chunk by chunk.
+
+    :param f: Binary file object, positioned after the prefix if it matches
+    :param prefix: Binary file object with the expected prefix
+
+    :return: True if f starts with the prefix
+    """
+    for chunk in iter(lambda: prefix.read(chunk_size), b''):
+        if f.read(len(chunk)) != chunk:
+            return False
+    return True
+
+
+class UploadStream:
+    """
+    Writable stream uploading a file as it is produced.
+
+    The size and SHA-256 of the data are computed as it goes through,
+    and it is optionally copied to a local file. Closing the stream waits
+    for the transfer to complete.
+    """
+    name = ''
+    size = 0
+
+    def __init__(self, name, fileobj, copy=None):
+        """
+        Class Constructor.
+
+        :param name: File name
+        :param fileobj: Binary stream to write the data to, None to
+                        discard it; its close() method must raise OSError
+                        if the transfer failed
+        :param copy: Optional local file to save a copy of the data to
+        """
+        self.name = name
+        self._fileobj = fileobj
+        self._copy = open(copy, 'wb') if copy else None
+        self._sha256 = hashlib.sha256()
+        self._started = time.perf_counter()
+        self.elapsed = 0.0
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest()
+
+    def write(self, data):
+        self._sha256.update(data)
+        self.size += len(data)
+        if self._fileobj is not None:
+            self._fileobj.write(data)
+        if self._copy is not None:
+            self._copy.write(data)
+        return len(data)
+
+    def close(self):
+        """
+        Finish the upload.
+
+        :raise OSError: if the upload failed
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.elapsed = time.perf_counter() - self._started
+        if self._copy is not None:
+            self._copy.close()
+        if self._fileobj is not None:
+            self._fileobj.close()
+
+
+class UploadBackend:
+    """
+    Base class for the upload backends.
+
+    A backend uploads files to a directory of its target, relative to
+    the target's root. In dry-run mode, the actions are printed instead
+    of being performed. Use as a context manager, or call open() and
+    close().
+    """
+    name = ''
+    directory = ''
+
+    def __init__(self, name, settings, directory, dry_run=False):
+        """
+        Class Constructor.
+
+        :param name: Target name
+        :param settings: Target settings from env.yml
+        :param directory: Directory to upload the files to, relative to
+                          the target's root
+        :param dry_run: Only print the actions
+        """
+        self.name = name
+        self.settings = settings
+        self.directory = directory.strip('/')
+        self.dry_run = dry_run
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def target(self):
+        """
+        Upload location, for display and as upload state key.
+        """
+        raise NotImplementedError
+
+    def open(self):
+        """
+        Connect to the target.
+
+        :raise OSError: if the connection fails
+        """
+
+    def close(self):
+        """
+        Disconnect from the target.
+        """
+
+    def makedirs(self):
+        """
+        Create the target directory if it does not exist.
+
+        :return: True if successful
+        """
+        return True
+
+    def upload(self, filename):
+        """
+        Upload a file to the target directory.
+
+        :param filename: Local file
+
+        :return: True if successful
+        """
+        raise NotImplementedError
+
+    def verify(self, filename, size, sha256):
+        """
+        Check that the file on the target matches the local one.
+
+        :param filename: Local file
+        :param size: Expected size
+        :param sha256: Expected SHA-256
+
+        :return: True if the target file is identical
+        """
+        raise NotImplementedError
+
+    def open_stream(self, name, copy=None):
+        """
+        Start uploading a file whose contents are not known yet.
+
+        The file must then be made available under its final name with
+        publish(), or deleted with discard().
+
+        :param name: File name
+        :param copy: Optional local file to save a copy of the data to
+
+        :return: UploadStream object
+        """
+        raise NotImplementedError
+
+    def publish(self, name):
+        """
+        Make a file uploaded with open_stream() available.
+
+        :return: True if successful
+        """
+        raise NotImplementedError
+
+    def discard(self, names):
+        """
+        Delete the incomplete files of uploads started with open_stream().
+        """
+        raise NotImplementedError
+
+    def checksum(self, name):
+        """
+        Compute the SHA-256 of a file on the target.
+
+        :return: Hex digest, or None if the file does not exist
+        """
+        raise NotImplementedError
+
+    def verify_stream(self, stream):
+        """
+        Check that a file uploaded with open_stream() and published matches
+        the data written to the stream.
+
+        :param stream: UploadStream object
+
+        :return: True if the target file is identical
+        """
+        return self.checksum(stream.name) == stream.sha256
+
+    def _setting(self, key, default=None):
+        """
+        Get a setting, raising ValueError if it is required and missing.
+        """
+        value = self.settings.get(key, default)
+        if value is None:
+            raise ValueError("Upload target '{}': missing '{}' setting"
+                             .format(self.name, key))
+        return value
+
+
+class LocalBackend(UploadBackend):
+    """
+    Local directory mirror.
+
+    Files are copied through a temporary '.partial' file, renamed once
+    complete; a partial copy left by an interrupted run is resumed if it
+    matches the beginning of the file.
+
+    Settings: directory (root of the mirror).
+    """
+
+    def __init__(self, name, settings, directory, dry_run=False):
+        super().__init__(name, settings, directory, dry_run)
+        self.root = path.expanduser(self._setting('directory'))
+
+    @property
+    def target(self):
+        return path.join(self.root, self.directory)
+
+    def _path(self, name):
+        return path.join(self.target, name)
+
+    def makedirs(self):
+        if not self.dry_run:
+            os.makedirs(self.target, exist_ok=True)
+        return True
+
+    def upload(self, filename):
+        target = self._path(path.basename(filename))
+        if self.dry_run:
+            print("cp {} {}".format(filename, target))
+            return True
+
+        partial = target + '.partial'
+        with open(filename, 'rb') as src:
+            try:
+                with open(partial, 'rb') as f:
+                    resume = _skip_prefix(src, f)
+            except FileNotFoundError:
+                resume = False
+            if not resume:
+                src.seek(0)
+            with open(partial, 'ab' if resume else 'wb') as dst:
+                shutil.copyfileobj(src, dst, chunk_size)
+        shutil.copystat(filename, partial)
+        os.replace(partial, target)
+        return True
+
+    def verify(self, filename, size, sha256):
+        if self.dry_run:
+            return True
+        target = self._path(path.basename(filename))
+        try:
+            if os.stat(target).st_size != size:
+                return False
+        except FileNotFoundError:
+            return False
+        return file_checksum(target) == sha256
+
+    def open_stream(self, name, copy=None):
+        partial = self._path(name + '.partial')
+        if self.dry_run:
+            print("{} > {}".format(name, partial))
+            return UploadStream(name, None, copy)
+        return UploadStream(name, open(partial, 'wb'), copy)
+
+    def publish(self, name):
+        partial = self._path(name + '.partial')
+        if self.dry_run:
+            print("mv {} {}".format(partial, self._path(name)))
+        else:
+            os.replace(partial, self._path(name))
+        return True
+
+    def discard(self, names):
+        for name in names:
+            partial = self._path(name + '.partial')
+            if self.dry_run:
+                print("rm -f " + partial)
+            elif path.lexists(partial):
+                os.remove(partial)
+
+    def checksum(self, name):
+        try:
+            return file_checksum(self._path(name))
+        except FileNotFoundError:
+            return None
+
+
+class RsyncBackend(UploadBackend):
+    """
+    Remote host, accessed over SSH.
+
+    A single SSH connection is opened (OpenSSH ControlMaster); all the
+    rsync transfers are multiplexed over it, so the handshake and
+    authentication only happen once. Files that are identical on the
+    target are skipped, interrupted transfers are resumed.
+
+    The host may only allow file transfers (SourceForge's frs only
+    accepts rsync, sftp and scp, no shell commands), and neither rsync
+    nor OpenSSH's sftp can upload from a pipe: streamed files are spooled
+    to a local temporary directory, and transferred with rsync when
+    published.
+
+    Settings: host, directory (root on the remote host), user (defaults
+    to the upload script's --user option).
+    """
+
+    def __init__(self, name, settings, directory, dry_run=False):
+        super().__init__(name, settings, directory, dry_run)
+        self.host = self._setting('host')
+        self.root = self._setting('directory')
+        self.user = self._setting('user')
+        self._control_dir = None
+        self._spool_dir = None
+
+    @property
+    def target(self):
+        return '{}:{}'.format(self.host, self.remote_dir)
+
+    @property
+    def remote_dir(self):
+        return self.root.rstrip('/') + '/' + self.directory
+
+    @property
+    def destination(self):
+        """
+        SSH destination (user@host).
+        """
+        return '{}@{}'.format(self.user, self.host)
+
+    def _path(self, name):
+        return self.remote_dir + '/' + name
+
+    def _ssh(self):
+        """
+        Base ssh command, using the shared connection.
+        """
+        return ['ssh', '-o', 'ControlMaster=no',
+                '-o', 'ControlPath=' + path.join(self._control_dir, 'ctl')]
+
+    def _call(self, command):
+        if self.dry_run:
+            print(' '.join(shlex.quote(arg) for arg in command))
+            return 0
+        return subprocess.call(command)
+
+    def open(self):
+        """
+        Open the master SSH connection.
+        """
+        if self._control_dir is not None:
+            return
+        self._control_dir = tempfile.mkdtemp(prefix='adodb-ssh-')
+        command = self._ssh()
+        command[2] = 'ControlMaster=yes'
+        command += ['-o', 'ControlPersist=yes', '-f', '-N', self.destination]
+        if self._call(command) != 0:
+            raise OSError("unable to connect to '{}'".format(self.host))
+
+    def close(self):
+        """
+        Close the master SSH connection.
+        """
+        if self._control_dir is None:
+            return
+        self._call(self._ssh() + ['-O', 'exit', self.destination])
+        shutil.rmtree(self._control_dir, ignore_errors=True)
+        self._control_dir = None
+        if self._spool_dir is not None:
+            shutil.rmtree(self._spool_dir, ignore_errors=True)
+            self._spool_dir = None
+
+    def makedirs(self):
+        """
+        The host may not allow shell commands, so the directory is created
+        by transferring an empty directory tree to the target's root with
+        rsync (which does not create missing parent directories itself).
+        """
+        tree = tempfile.mkdtemp(prefix='adodb-mkdir-')
+        try:
+            os.makedirs(path.join(tree, self.directory))
+            rsh = ' '.join(shlex.quote(arg) for arg in self._ssh())
+            return self._call([
+                'rsync', '--recursive', '--rsh', rsh, tree + '/',
+                '{}:{}/'.format(self.destination, self.root.rstrip('/'))
+            ]) == 0
+        finally:
+            shutil.rmtree(tree, ignore_errors=True)
+
+    def _rsync(self, filename, *options):
+        """
+        Transfer a file with rsync. Files that are identical on the target
+        (same size and checksum) are skipped; partially transferred files
+        are kept, and used as basis to resume the transfer.
+
+        :return: rsync's exit status
+        """
+        rsh = ' '.join(shlex.quote(arg) for arg in self._ssh())
+        return self._call([
+            'rsync', '--checksum', '--partial', '--times', '--rsh', rsh,
+            *options, filename,
+            '{}:{}/'.format(self.destination, self.remote_dir)
+        ])
+
+    def upload(self, filename):
+        return self._rsync(filename) == 0
+
+    def verify(self, filename, size, sha256):
+        """
+        The check is delegated to rsync, which compares the sizes and the
+        checksums computed on each side.
+        """
+        if self.dry_run:
+            self._rsync(filename, '--dry-run', '--itemize-changes')
+            return True
+        rsh = ' '.join(shlex.quote(arg) for arg in self._ssh())
+        result = subprocess.run([
+            'rsync', '--checksum', '--dry-run', '--itemize-changes',
+            '--rsh', rsh, filename,
+            '{}:{}/'.format(self.destination, self.remote_dir)
+        ], stdout=subprocess.PIPE, text=True)
+        # Any itemized change means the file differs or is missing
+        return result.returncode == 0 and not result.stdout.strip()
+
+    def _spool_path(self, name):
+        return path.join(self._spool_dir, name)
+
+    def open_stream(self, name, copy=None):
+        if self._spool_dir is None:
+            self._spool_dir = tempfile.mkdtemp(prefix='adodb-spool-')
+        return UploadStream(name, open(self._spool_path(name), 'wb'), copy)
+
+    def publish(self, name):
+        """
+        Transfer the spooled file; rsync writes it under a temporary name
+        on the target, renamed once complete.
+        """
+        return self.upload(self._spool_path(name))
+
+    def discard(self, names):
+        for name in names:
+            spooled = self._spool_path(name)
+            if path.lexists(spooled):
+                os.remove(spooled)
+
+    def checksum(self, name):
+        raise NotImplementedError(
+            "remote checksums require a shell on the target")
+
+    def verify_stream(self, stream):
+        return self.verify(self._spool_path(stream.name),
+                           stream.size, stream.sha256)
+
+
+def s3_etag(filename, part_size):
+    """
+    Compute the ETag an S3 object would get when uploading the given file
+    in parts of the given size: the MD5 of the contents for single-part
+    uploads, the MD5 of the parts' MD5 followed by the number of parts
+    otherwise.
+    """
+    digests = []
+    with open(filename, 'rb') as f:
+        for part in iter(lambda: f.read(part_size), b''):
+            digests.append(hashlib.md5(part).digest())
+    if len(digests) <= 1:
+        return digests[0].hex() if digests else hashlib.md5().hexdigest()
+    return '{}-{}'.format(hashlib.md5(b''.join(digests)).hexdigest(),
+                          len(digests))
+
+
+def s3_signature(secret_key, region, method, host, uri, query, headers,
+                 payload_hash, amz_date):
+    """
+    Compute an AWS Signature Version 4 for an S3 request.
+
+    :param secret_key: Secret access key
+    :param region: Bucket's region
+    :param method: HTTP method
+    :param host: Host header
+    :param uri: URI-encoded path
+    :param query: Dict of query parameters
+    :param headers: Dict of headers to sign (besides host, x-amz-date and
+                    x-amz-content-sha256)
+    :param payload_hash: SHA-256 of the request body (hex)
+    :param amz_date: Request time, as YYYYMMDD'T'HHMMSS'Z'
+
+    :return: Tuple (signed headers list, signature)
+    """
+    def quote(value):
+        return urllib.parse.quote(str(value), safe='-_.~')
+
+    def sign(key, msg):
+        return hmac.new(key, msg.encode(), hashlib.sha256)
+
+    signed = {name.lower(): str(value).strip()
+              for name, value in headers.items()}
+    signed.update({'host': host,
+                   'x-amz-content-sha256': payload_hash,
+                   'x-amz-date': amz_date})
+    signed_headers = ';'.join(sorted(signed))
+    canonical_request = '\n'.join([
+        method,
+        uri,
+        '&'.join('{}={}'.format(quote(k), quote(v))
+                 for k, v in sorted(query.items())),
+        ''.join('{}:{}\n'.format(k, signed[k]) for k in sorted(signed)),
+        signed_headers,
+        payload_hash
+    ])
+    scope = '{}/{}/s3/aws4_request'.format(amz_date[:8], region)
+    string_to_sign = '\n'.join([
+        'AWS4-HMAC-SHA256',
+        amz_date,
+        scope,
+        hashlib.sha256(canonical_request.encode()).hexdigest()
+    ])
+    key = ('AWS4' + secret_key).encode()
+    for part in (amz_date[:8], region, 's3', 'aws4_request'):
+        key = sign(key, part).digest()
+    return signed_headers, sign(key, string_to_sign).hexdigest()
+
+
+def _xml_find(content, tag):
+    """
+    Get the text of the first element with the given (namespace-less) tag
+    in an S3 XML response, None if not found.
+    """
+    for element in ElementTree.fromstring(content).iter():
+        if element.tag.rsplit('}', 1)[-1] == tag:
+            return element.text
+    return None
+
+
+class S3Backend(UploadBackend):
+    """
+    S3-compatible object store.
+
+    Objects are named <prefix><directory>/<file>, using path-style
+    requests signed with AWS Signature Version 4. Files larger than the
+    part size are uploaded with a multipart upload, their parts sent
+    concurrently. Objects whose ETag matches the local file are not
+    uploaded again; as S3 PUT requests are atomic, no temporary objects
+    are needed.
+
+    Settings: endpoint (e.g. http://localhost:9000 for MinIO), bucket,
+    access_key, secret_key, region (defaults to us-east-1), prefix,
+    part_size (in MiB, defaults to 8) and jobs (number of parts uploaded
+    concurrently, defaults to 4).
+    """
+    # Minimum part size allowed by S3 (except for the last part)
+    min_part_size = 5 * 1024 * 1024
+
+    def __init__(self, name, settings, directory, dry_run=False):
+        super().__init__(name, settings, directory, dry_run)
+        endpoint = urllib.parse.urlsplit(self._setting('endpoint'))
+        self.endpoint = '{}://{}'.format(endpoint.scheme, endpoint.netloc)
+        self.host = endpoint.netloc
+        self.bucket = self._setting('bucket')
+        self.prefix = settings.get('prefix') or ''
+        self.region = settings.get('region') or 'us-east-1'
+        self.part_size = max(self.min_part_size,
+                             int(settings.get('part_size', 8) * 1024 * 1024))
+        self.jobs = max(1, int(settings.get('jobs', 4)))
+        self._access_key = self._setting('access_key')
+        self._secret_key = self._setting('secret_key')
+        self._session = None
+        self._executor = None
+        self._streams = {}
+
+    @property
+    def target(self):
+        return 's3://{}/{}{}'.format(self.bucket, self.prefix, self.directory)
+
+    def _key(self, name):
+        return '{}{}/{}'.format(self.prefix, self.directory, name)
+
+    def open(self):
+        if self._session is not None:
+            return
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                pool_maxsize=self.jobs * 4)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+        self._executor = concurrent.futures.ThreadPoolExecutor(self.jobs)
+
+    def close(self):
+        for stream in self._streams.values():
+            stream.abort()
+        self._streams = {}
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def _request(self, method, key, params=None, data=b'', headers=None,
+                 stream=False):
+        """
+        Send a signed request.
+
+        :param method: HTTP method
+        :param key: Object key
+        :param params: Dict of query parameters
+        :param data: Request body
+        :param headers: Dict of additional headers
+
+        :return: requests.Response (404 responses are returned for HEAD
+                 and GET requests, to check whether an object exists)
+        :raise OSError: if the request fails
+        """
+        params = params or {}
+        headers = dict(headers or {})
+        uri = urllib.parse.quote('/{}/{}'.format(self.bucket, key),
+                                 safe='/-_.~')
+        payload_hash = hashlib.sha256(data).hexdigest()
+        amz_date = datetime.datetime.now(datetime.timezone.utc).strftime(
+            '%Y%m%dT%H%M%SZ')
+        signed_headers, signature = s3_signature(
+            self._secret_key, self.region, method, self.host, uri, params,
+            headers, payload_hash, amz_date)
+        headers.update({
+            'x-amz-content-sha256': payload_hash,
+            'x-amz-date': amz_date,
+            'Authorization': 'AWS4-HMAC-SHA256 Credential={}/{}/{}/s3/'
+                             'aws4_request, SignedHeaders={}, Signature={}'
+                             .format(self._access_key, amz_date[:8],
+                                     self.region, signed_headers, signature),
+        })
+        url = self.endpoint + uri
+        if params:
+            url += '?' + '&'.join(
+                '{}={}'.format(urllib.parse.quote(k, safe='-_.~'),
+                               urllib.parse.quote(str(v), safe='-_.~'))
+                for k, v in sorted(params.items()))
+        try:
+            r = self._session.request(method, url, data=data, headers=headers,
+                                      stream=stream, timeout=60)
+        except requests.RequestException as err:
+            raise OSError("S3 request failed: {}".format(err)) from err
+        if r.status_code >= 300 and not (method in ('HEAD', 'GET')
+                                         and r.status_code == 404):
+            raise OSError("S3 {} {} failed ({}): {}".format(
+                method, key, r.status_code, r.text[:200]))
+        return r
+
+    def _head(self, key):
+        """
+        Get an object's size and ETag.
+
+        :return: Tuple (size, etag), None if the object does not exist
+        """
+        r = self._request('HEAD', key)
+        if r.status_code == 404:
+            return None
+        return (int(r.headers.get('Content-Length', -1)),
+                r.headers.get('ETag', '').strip('"'))
+
+    def _put(self, key, data):
+        self._request('PUT', key, data=data)
+
+    def _initiate(self, key):
+        """
+        Start a multipart upload.
+
+        :return: Upload ID
+        """
+        r = self._request('POST', key, {'uploads': ''})
+        return _xml_find(r.content, 'UploadId')
+
+    def _upload_part(self, key, upload_id, number, data):
+        """
+        Upload a part of a multipart upload.
+
+        :return: Part's ETag
+        """
+        r = self._request('PUT', key,
+                          {'partNumber': number, 'uploadId': upload_id},
+                          data=data)
+        return r.headers.get('ETag', '')
+
+    def _complete(self, key, upload_id, etags):
+        """
+        Complete a multipart upload.
+
+        :param etags: List of the parts' ETags, in order
+        """
+        body = '<CompleteMultipartUpload>{}</CompleteMultipartUpload>'.format(
+            ''.join('<Part><PartNumber>{}</PartNumber><ETag>{}</ETag></Part>'
+                    .format(number, etag)
+                    for number, etag in enumerate(etags, 1)))
+        r = self._request('POST', key, {'uploadId': upload_id},
+                          data=body.encode())
+        # Errors can also be reported in a 200 response
+        if _xml_find(r.content, 'Code') is not None:
+            raise OSError("S3 multipart upload of {} failed: {}"
+                          .format(key, r.text[:200]))
+
+    def _abort(self, key, upload_id):
+        try:
+            self._request('DELETE', key, {'uploadId': upload_id})
+        except OSError:
+            pass
+
+    def _read_part(self, filename, number):
+        with open(filename, 'rb') as f:
+            f.seek((number - 1) * self.part_size)
+            return f.read(self.part_size)
+
+    def upload(self, filename):
+        key = self._key(path.basename(filename))
+        size = path.getsize(filename)
+        if self.dry_run:
+            print("PUT {}/{}/{}".format(self.endpoint, self.bucket, key))
+            return True
+
+        if self._head(key) == (size, s3_etag(filename, self.part_size)):
+            return True
+
+        if size <= self.part_size:
+            with open(filename, 'rb') as f:
+                self._put(key, f.read())
+            return True
+
+        count = (size + self.part_size - 1) // self.part_size
+        upload_id = self._initiate(key)
+        try:
+            futures = [
+                self._executor.submit(
+                    lambda n: self._upload_part(key, upload_id, n,
+                                                self._read_part(filename, n)),
+                    number)
+                for number in range(1, count + 1)
+            ]
+            etags = [future.result() for future in futures]
+            self._complete(key, upload_id, etags)
+        except BaseException:
+            self._abort(key, upload_id)
+            raise
+        return True
+
+    def verify(self, filename, size, sha256):
+        """
+        The object's size and ETag (i.e. MD5-based checksum) are compared
+        with the local file's.
+        """
+        if self.dry_run:
+            return True
+        return self._head(self._key(path.basename(filename))) \
+            == (size, s3_etag(filename, self.part_size))
+
+    def open_stream(self, name, copy=None):
+        if self.dry_run:
+            print("PUT {}/{}/{} < {}".format(self.endpoint, self.bucket,
+                                             self._key(name), name))
+            return UploadStream(name, None, copy)
+        stream = _S3StreamWriter(self, self._key(name))
+        self._streams[name] = stream
+        return UploadStream(name, stream, copy)
+
+    def publish(self, name):
+        """
+        Complete the upload; the object only becomes visible then.
+        """
+        if self.dry_run:
+            return True
+        self._streams.pop(name).complete()
+        return True
+
+    def discard(self, names):
+        for name in names:
+            stream = self._streams.pop(name, None)
+            if stream is not None:
+                stream.abort()
+
+    def checksum(self, name):
+        """
+        The object is downloaded to compute its checksum.
+        """
+        r = self._request('GET', self._key(name), stream=True)
+        if r.status_code == 404:
+            return None
+        sha256 = hashlib.sha256()
+        for chunk in r.iter_content(chunk_size):
+            sha256.update(chunk)
+        return sha256.hexdigest()
+
+
+class _S3StreamWriter:
+    """
+    Writable stream uploading data to an S3 object as it is produced.
+
+    Data is sent in parts as soon as a full part is available, with a
+    bounded number of parts in flight. Small files are uploaded with a
+    single PUT request. The object is only created by complete().
+    """
+
+    def __init__(self, backend, key):
+        self._backend = backend
+        self._key = key
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._pending = collections.deque()
+        self._etags = []
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) > self._backend.part_size:
+            part = bytes(self._buffer[:self._backend.part_size])
+            del self._buffer[:self._backend.part_size]
+            self._submit(part)
+        return len(data)
+
+    def _submit(self, part):
+        if self._upload_id is None:
+            self._upload_id = self._backend._initiate(self._key)
+        number = len(self._etags) + len(self._pending) + 1
+        self._pending.append(self._backend._executor.submit(
+            self._backend._upload_part, self._key, self._upload_id, number,
+            part))
+        while len(self._pending) > 2 * self._backend.jobs:
+            self._etags.append(self._pending.popleft().result())
+
+    def close(self):
+        """
+        Send the remaining data; for a multipart upload, wait for all
+        parts to be uploaded.
+        """
+        if self._upload_id is None:
+            return
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer = bytearray()
+        while self._pending:
+            self._etags.append(self._pending.popleft().result())
+
+    def complete(self):
+        """
+        Create the object.
+        """
+        if self._upload_id is None:
+            self._backend._put(self._key, bytes(self._buffer))
+        else:
+            self._backend._complete(self._key, self._upload_id, self._etags)
+            self._upload_id = None
+
+    def abort(self):
+        """
+        Cancel the multipart upload, if any.
+        """
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        if self._upload_id is not None:
+            self._backend._abort(self._key, self._upload_id)
+            self._upload_id = None
+
+
+backend_types = {
+    'local': LocalBackend,
+    'rsync': RsyncBackend,
+    's3': S3Backend,
+}
+
+
+def create_backend(name, settings, directory, dry_run=False):
+    """
+    Create the backend for an upload target.
+
+    :param name: Target name
+    :param settings: Target settings; `type` selects the backend (see
+                     backend_types)
+    :param directory: Directory to upload the files to, relative to the
+                      target's root
+    :param dry_run: Only print the actions
+
+    :return: UploadBackend object
+    :raise ValueError: if the settings are invalid
+    """
+    backend_type = settings.get('type')
+    if backend_type not in backend_types:
+        raise ValueError("Upload target '{}': unknown type '{}' "
+                         "(expected one of {})".format(
+                             name, backend_type, ', '.join(backend_types)))
+    return backend_types[backend_type](name, settings, directory, dry_run)
@@ -2,7 +2,14 @@
 """
 ADOdb release upload script.
 
-Uploads release zip/tarball files generated by buildrelease.py to SourceForge.
+Uploads release zip/tarball files generated by buildrelease.py to SourceForge,
+and to the other upload targets configured in env.yml (see uploadbackends.py).
+
+In pipeline mode (--build), the release is built and the archives are
+streamed to the targets as they are produced, without being written to
+disk first (unless a local copy is requested). rsync targets, like
+SourceForge, can't receive a stream: their files are spooled to a
+temporary directory and transferred once the build is complete.
 
 This file is part of ADOdb, a Database Abstraction Layer library for PHP.
 
@@ -21,42 +28,70 @@ See the LICENSE.md file distributed with this source code for details.
 @author Damien Regad
 """
 
+import concurrent.futures
+import contextlib
 import getopt
 import getpass
 import glob
 import json
 import os
 import re
-import subprocess
 import sys
+import time
 from os import path
 
-import requests
+import buildrelease
+import instrumentation
+import uploadbackends
+import versions
+from adodbutil import env, SourceForge
+
 
-from adodbutil import env
+# Default upload targets, if `upload_targets` is not set in env.yml
+# for debugging, configure e.g. a `local` target (see env.yml.sample)
+default_targets = {
+    'sourceforge': {
+        'type': 'rsync',
+        'host': 'frs.sourceforge.net',
+        'directory': '/home/frs/project/adodb/',
+    },
+}
 
+# Upload target whose files' download defaults are set with the
+# SourceForge Release API
+sf_target = 'sourceforge'
 
-# Directories and files to exclude from release tarballs
-# for debugging, set to a local dir e.g. "localhost:/tmp/sf-adodb/"
+# SourceForge project, for the Release API (see adodbutil.SourceForge)
+sf_project = 'adodb'
 
-sf_files = "frs.sourceforge.net:/home/frs/project/adodb/"
+# Default number of files transferred concurrently
+default_jobs = 4
 
-# SourceForge Release API base URL
-# https://sourceforge.net/p/forge/documentation/Using%20the%20Release%20API/
-sf_api_url = 'https://sourceforge.net/projects/adodb/files/{}/'
+# Uploaded files state, saved in the release directory: for each target,
+# the SHA-256 of the files that were successfully uploaded and verified
+state_file = '.upload-state.json'
 
-# rsync command template
-rsync_cmd = "rsync -vP --rsh ssh {opt} {src} {usr}@{dst}"
+# Repository to build the release from, in pipeline mode
+repo_path = path.dirname(path.dirname(path.abspath(__file__)))
 
 # Command-line options
-options = "hu:ns"
-long_options = ["help", "user=", "dry-run", "skip-upload"]
+options = "hu:nsj:fbB:t:"
+long_options = ["help", "user=", "dry-run", "skip-upload", "jobs=", "force",
+                "backfill", "build=", "target=", "trace=", "profile="]
 
 # Global flags
 dry_run = False
 username = getpass.getuser()
 release_path = ''
 skip_upload = False
+jobs = default_jobs
+force = False
+backfill = False
+build_version = None
+local_copy = None
+targets = None
+trace = None
+tracer = instrumentation.Tracer('uploadrelease')
 
 
 def usage():
@@ -66,54 +101,185 @@ def usage():
     print('''Usage: {} [options] username [release_path]
 
     This script will upload the files in the given directory (or the
-    current one if unspecified) to SourceForge.
+    current one if unspecified) to SourceForge, or to the upload targets
+    configured in env.yml.
+
+    Files already uploaded by a previous run are skipped, interrupted
+    transfers are resumed; the uploaded files' sizes and checksums are
+    verified afterwards.
+
+    With --build, the release is built (see buildrelease.py) and its files
+    are streamed to the targets as they are produced (rsync targets, like
+    SourceForge, receive them once the build is complete).
 
     Parameters:
         release_path            Location of the release files to upload,
                                 see buildrelease.py to generate them.
                                 Defaults to current directory.
+                                With --build, where to save a local copy
+                                of the release files (none by default).
 
     Options:
         -h | --help             Show this usage message
         -u | --user <name>      SourceForge account (defaults to current user)
+        -t | --target <list>    Comma-separated list of upload targets to use
+                                (defaults to all configured targets: {})
         -s | --skip-upload      Do not upload the release files (allows only
                                 updating previously uploaded files information)
         -n | --dry-run          Do not upload or update sourceforge
+        -j | --jobs <n>         Number of files to upload concurrently
+                                (defaults to {})
+        -f | --force            Upload all files, including those already
+                                uploaded by a previous run
+        -b | --backfill         Do not upload anything, set the download
+                                defaults of all historical release files
+        -B | --build <version>  Build the given release version, streaming
+                                the files to the targets without writing
+                                them to disk
+        --trace <file>          Save the upload phases' timings trace to the
+                                given JSON file (defaults to a new file in
+                                '{}')
+        --profile <dir>         Save cProfile and tracemalloc dumps of each
+                                upload phase in the given directory
 '''.format(
-        path.basename(__file__)
+        path.basename(__file__),
+        ', '.join(configured_targets()),
+        default_jobs,
+        path.dirname(instrumentation.trace_file('uploadrelease'))
     ))
 # end usage()
 
 
-def call_rsync(usr, opt, src, dst):
+def release_checksums(files):
     """
-    Call rsync to upload files with given parameters.
+    Get the size and SHA-256 of the release files.
+
+    The archives' checksums are taken from the release manifest (see
+    buildrelease.py) when their size matches; other files are hashed.
 
-    :param usr: ssh username
-    :param opt: options
-    :param src: source directory
-    :param dst: target directory
+    :param files: List of files
+
+    :return: Dict of file name => (size, sha256)
     """
-    global dry_run
+    known = {}
+    for manifest in glob.glob('*.manifest.json'):
+        with open(manifest) as f:
+            for archive in json.load(f).get('archives', []):
+                known[archive['name']] = (archive['size'], archive['sha256'])
+
+    checksums = {}
+    for filename in files:
+        size = path.getsize(filename)
+        if filename in known and known[filename][0] == size:
+            checksums[filename] = known[filename]
+        else:
+            checksums[filename] = (size,
+                                   uploadbackends.file_checksum(filename))
+    return checksums
 
-    command = rsync_cmd.format(usr=usr, opt=opt, src=src, dst=dst)
 
-    # Create directory if it does not exist
-    dst_split = dst.rsplit(':')
-    host = dst_split[0]
-    dst = dst_split[1]
-    mkdir = 'ssh {usr}@{host} mkdir -p {dst}'.format(
-        usr=usr,
-        host=host,
-        dst=dst
-    )
+def load_upload_state(target):
+    """
+    Get the files already uploaded to the target by previous runs.
 
-    if dry_run:
-        print(mkdir)
-        print(command)
-    else:
-        subprocess.call(mkdir, shell=True)
-        subprocess.call(command, shell=True)
+    :return: Dict of file name => SHA-256
+    """
+    try:
+        with open(state_file) as f:
+            return json.load(f).get(target, {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_upload_state(target, uploaded):
+    """
+    Save the files uploaded to the target.
+
+    :param target: Upload target
+    :param uploaded: Dict of file name => SHA-256
+    """
+    try:
+        with open(state_file) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    state[target] = uploaded
+    with open(state_file + '.tmp', 'w') as f:
+        json.dump(state, f, indent=1)
+    os.replace(state_file + '.tmp', state_file)
+
+
+def _run_concurrently(function, files):
+    """
+    Apply a function to each file using a thread pool.
+
+    :return: Generator of tuples (file, result, elapsed time), in
+             completion order; result is False if an OSError was raised
+    """
+    def run(filename):
+        start = time.perf_counter()
+        try:
+            result = function(filename)
+        except OSError as err:
+            print("  {}: {}".format(filename, err))
+            result = False
+        return result, time.perf_counter() - start
+
+    with concurrent.futures.ThreadPoolExecutor(max(1, jobs)) as executor:
+        futures = {executor.submit(run, f): f for f in files}
+        for future in concurrent.futures.as_completed(futures):
+            yield (futures[future],) + future.result()
+
+
+def upload_files(backend, files, checksums, uploaded):
+    """
+    Upload the given files concurrently.
+
+    :param backend: uploadbackends.UploadBackend object
+    :param files: List of files to upload
+    :param checksums: Files' sizes and checksums, see release_checksums()
+    :param uploaded: Files already uploaded (name => SHA-256), updated
+                     with each successful upload
+
+    :return: List of the files that could not be uploaded
+    """
+    pending = []
+    for filename in files:
+        if not force and uploaded.get(filename) == checksums[filename][1]:
+            print("  {} (already uploaded)".format(filename))
+        else:
+            pending.append(filename)
+
+    failed = []
+    for filename, ok, elapsed in _run_concurrently(backend.upload, pending):
+        if ok:
+            print("  {} ({}, {:.1f}s)".format(
+                filename,
+                instrumentation.format_size(checksums[filename][0]),
+                elapsed
+            ))
+            uploaded[filename] = checksums[filename][1]
+        else:
+            uploaded.pop(filename, None)
+            failed.append(filename)
+    return sorted(failed)
+
+
+def verify_files(backend, files, checksums):
+    """
+    Check concurrently that the uploaded files match the local ones.
+
+    :param backend: uploadbackends.UploadBackend object
+    :param files: List of files to check
+    :param checksums: Files' sizes and checksums, see release_checksums()
+
+    :return: List of the files that are missing or differ on the target
+    """
+    def verify(filename):
+        return backend.verify(filename, *checksums[filename])
+
+    return sorted(filename for filename, ok, elapsed
+                  in _run_concurrently(verify, files) if not ok)
 
 
 def get_release_version():
@@ -127,25 +293,25 @@ def get_release_version():
         print("ERROR: release zip file not found in '{}'".format(release_path))
         sys.exit(1)
 
+    match = re.search(r"^adodb-(\d+\.\d+\.\d+.*)\.zip$", zipfile)
     try:
-        version = re.search(
-            r"^adodb-(\d+\.\d+\.\d+)(-(alpha|beta|rc)\.\d+)?\.zip$",
-            zipfile
-            ).group(1)
-    except AttributeError:
+        version = versions.Version.parse(match.group(1))
+    except (AttributeError, ValueError):
+        version = None
+    if version is None or version.is_dev:
         print('''ERROR: unable to extract version number from '{}'
        Only 3 groups of digits separated by periods are allowed'''
               .format(zipfile))
         sys.exit(1)
 
-    return version
+    return str(version.release)
 
 
 def sourceforge_target_dir(version):
     """
     Return the SourceForge target directory.
 
-    This is relative to the root defined in sf_files global variable:
+    This is relative to the upload targets' root directory:
     basedir/subdir, with
     - basedir:
       - for ADOdb version 5: adodb-php5-only
@@ -154,7 +320,8 @@ def sourceforge_target_dir(version):
       - if version >= 5.21: adodb-X.Y
       - for older versions: adodb-XYZ-for-php5
     """
-    major_version = int(version.rsplit('.')[0])
+    version = versions.Version.parse(version)
+    major_version = version.major
 
     # Base directory
     if major_version == 5:
@@ -163,9 +330,7 @@ def sourceforge_target_dir(version):
         directory = 'adodb{}/'.format(major_version)
 
     # Keep only X.Y (discard patch number and pre-release suffix)
-    short_version = version.split('-')[0].rsplit('.', 1)[0]
-
-    directory += "adodb-" + short_version
+    directory += "adodb-" + version.series
 
     return directory
 
@@ -174,7 +339,8 @@ def process_command_line():
     """
     Retrieve command-line options and set global variables accordingly.
     """
-    global dry_run, username, release_path, skip_upload
+    global dry_run, username, release_path, skip_upload, jobs, force, \
+        backfill, build_version, local_copy, targets, trace
 
     # Get command-line options
     try:
@@ -195,6 +361,13 @@ def process_command_line():
         elif opt in ("-u", "--user"):
             username = val
 
+        elif opt in ("-t", "--target"):
+            targets = [name.strip() for name in val.split(',')]
+            for name in targets:
+                if name not in configured_targets():
+                    print("ERROR: unknown upload target '{}'".format(name))
+                    sys.exit(2)
+
         elif opt in ("-s", "--skip-upload"):
             skip_upload = True
 
@@ -202,87 +375,470 @@ def process_command_line():
             print("Dry-run mode - files will not be uploaded or modified")
             dry_run = True
 
+        elif opt in ("-j", "--jobs"):
+            try:
+                jobs = int(val)
+            except ValueError:
+                print("ERROR: invalid number of jobs '{}'".format(val))
+                sys.exit(2)
+
+        elif opt in ("-f", "--force"):
+            force = True
+
+        elif opt in ("-b", "--backfill"):
+            backfill = True
+
+        elif opt in ("-B", "--build"):
+            try:
+                version = versions.Version.parse(val)
+            except ValueError:
+                version = None
+            if version is None or version.is_dev or version.letter:
+                print("ERROR: invalid release version '{}'".format(val))
+                sys.exit(2)
+            build_version = str(version)
+
+        elif opt == "--trace":
+            trace = path.abspath(val)
+
+        elif opt == "--profile":
+            tracer.profile_dir = path.abspath(val)
+
     # Mandatory parameters
     # (none)
 
     # Change to release directory, current if not specified
     try:
         release_path = args[0]
+        if build_version is not None:
+            os.makedirs(release_path, exist_ok=True)
+            local_copy = path.abspath(release_path)
         os.chdir(release_path)
     except IndexError:
         release_path = os.getcwd()
 
 
+def configured_targets():
+    """
+    Get the upload targets' settings.
+
+    :return: Dict of target name => settings
+    """
+    return env.upload_targets or default_targets
+
+
+def create_backends(version):
+    """
+    Create the backends for the selected upload targets.
+
+    :param version: Release version, determines the target directory
+
+    :return: List of uploadbackends.UploadBackend objects
+    """
+    backends = []
+    for name in targets or configured_targets():
+        settings = dict(configured_targets()[name])
+        settings.setdefault('user', username)
+        try:
+            backends.append(uploadbackends.create_backend(
+                name,
+                settings,
+                sourceforge_target_dir(version),
+                dry_run
+            ))
+        except ValueError as err:
+            print("ERROR: {}".format(err))
+            sys.exit(2)
+    return backends
+
+
+def _connect(backend):
+    """
+    Connect to the backend's target and create the target directory.
+
+    :return: True if successful
+    """
+    with tracer.span('connect'):
+        try:
+            backend.open()
+        except OSError as err:
+            print("ERROR: {}".format(err))
+            return False
+    with tracer.span('mkdir'):
+        if not backend.makedirs():
+            print("ERROR: unable to create target directory")
+            return False
+    return True
+
+
 def upload_release_files():
     """
-    Upload release files from source directory to SourceForge.
+    Upload release files from source directory to the upload targets.
     """
     version = get_release_version()
-    target = sf_files + sourceforge_target_dir(version)
+    files = sorted(f for f in glob.glob('*') if path.isfile(f))
 
     print()
     print("Uploading release files...")
     print("  Source:", release_path)
-    print("  Target: " + target)
-    print("  Files:  " + ', '.join(glob.glob('*')))
+    print("  Files:  " + ', '.join(files))
     print()
-    call_rsync(
-        username,
-        "",
-        path.join(release_path, "*"),
-        target
-    )
+
+    with tracer.span('checksums'):
+        checksums = release_checksums(files)
+
+    failed = []
+    for backend in create_backends(version):
+        with tracer.span(backend.name):
+            if not upload_to_target(backend, files, checksums):
+                failed.append(backend.name)
+    if failed:
+        print("ERROR: upload failed for target(s): " + ', '.join(failed))
+        sys.exit(1)
+
+
+def upload_to_target(backend, files, checksums):
+    """
+    Upload the release files to a target, and verify them.
+
+    :param backend: uploadbackends.UploadBackend object
+    :param files: List of files to upload
+    :param checksums: Files' sizes and checksums, see release_checksums()
+
+    :return: True if successful
+    """
+    print("Target '{}': {}".format(backend.name, backend.target))
+    uploaded = load_upload_state(backend.target)
+
+    with backend:
+        if not _connect(backend):
+            return False
+        with tracer.span('transfer', files=len(files), jobs=jobs):
+            failed = upload_files(backend, files, checksums, uploaded)
+        if not dry_run:
+            save_upload_state(backend.target, uploaded)
+        if failed:
+            print("ERROR: upload failed for " + ', '.join(failed))
+            return False
+
+        print("Verifying uploaded files")
+        with tracer.span('verify', files=len(files)):
+            mismatch = verify_files(backend, files, checksums)
+
+    if mismatch:
+        # Make sure they are uploaded again by the next run
+        for filename in mismatch:
+            uploaded.pop(filename, None)
+        if not dry_run:
+            save_upload_state(backend.target, uploaded)
+        print("ERROR: the following files are missing or differ on the "
+              "target: " + ', '.join(mismatch))
+        return False
+    print("  All {} files verified".format(len(files)))
     print()
+    return True
 
 
-def set_sourceforge_file_info():
-    global dry_run
+class _StreamFanout:
+    """
+    Writable stream sending the same data to several upload streams.
+    """
 
-    print("Updating uploaded files information")
+    def __init__(self, streams):
+        self._streams = streams
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, data):
+        for stream in self._streams:
+            stream.write(data)
+        return len(data)
+
+    def close(self):
+        """
+        Close all the streams, raising the first error if any.
+        """
+        error = None
+        for stream in self._streams:
+            try:
+                stream.close()
+            except OSError as err:
+                error = error or err
+        if error is not None:
+            raise error
+
+
+def build_and_upload_release():
+    """
+    Build the release, streaming the files to the upload targets as they
+    are produced; the archives are compressed, checksummed and uploaded
+    in a single pass.
+
+    Files are uploaded under a temporary name, and only made available
+    once the build is complete; their checksums are then verified on the
+    targets.
+
+    :return: List of uploaded file names
+    """
+    version = build_version
+    backends = create_backends(version)
+
+    print()
+    print("Building and uploading release {}...".format(version))
+    for backend in backends:
+        print("  Target '{}': {}".format(backend.name, backend.target))
+    if local_copy:
+        print("  Local copy: " + local_copy)
+    print()
 
-    base_url = sf_api_url.format(
-        sourceforge_target_dir(get_release_version())
+    # Streams of each backend, by file name
+    streams = {backend.name: {} for backend in backends}
+
+    def opener(filename):
+        name = path.basename(filename)
+        copy = path.join(local_copy, name) if local_copy else None
+        outputs = []
+        for backend in backends:
+            stream = backend.open_stream(name, copy if not outputs else None)
+            streams[backend.name][name] = stream
+            outputs.append(stream)
+        return _StreamFanout(outputs)
+
+    with contextlib.ExitStack() as stack:
+        for backend in backends:
+            stack.enter_context(backend)
+            with tracer.span(backend.name):
+                if not _connect(backend):
+                    sys.exit(1)
+
+        builder = buildrelease.ReleaseBuilder(
+            version,
+            local_copy or release_path,
+            repo_path=repo_path,
+            opener=opener
         )
-    headers = {'Accept': 'application/json"'}
-
-    # Loop through uploaded files
-    for file in glob.glob('adodb-*'):
-        print("  " + file)
-
-        # Determine defaults based on file extension
-        ext = path.splitext(file)[1]
-        if ext == '.zip':
-            defaults = ['windows']
-        elif ext == '.gz':
-            defaults = ['linux', 'mac', 'bsd', 'solaris', 'others']
-        else:
-            print("WARNING: Unknown extension for file", file)
-            continue
-
-        # SourceForge API request
-        url = path.join(base_url, file)
-        payload = {
-            'default': defaults,
-            'api_key': env.sf_api_key
-            }
-        if dry_run:
-            req = requests.Request('PUT', url, headers=headers, params=payload)
-            r = req.prepare()
-            print("    Calling SourceForge Release API:", r.url)
+        # Record the build steps in the upload trace
+        builder.tracer = tracer
+        try:
+            with tracer.span('build'):
+                builder.build()
+        except BaseException as err:
+            # Whatever the failure (including an interruption), don't
+            # leave incomplete files on the targets
+            for backend in backends:
+                for stream in streams[backend.name].values():
+                    try:
+                        stream.close()
+                    except OSError:
+                        pass
+                try:
+                    backend.discard(list(streams[backend.name]))
+                except OSError as discard_err:
+                    print("WARNING: unable to remove incomplete files "
+                          "from '{}': {}".format(backend.name, discard_err))
+            if not isinstance(err, Exception):
+                raise
+            print("\nERROR: {}".format(err))
+            sys.exit(getattr(err, 'status', 1))
+        print()
+
+        failed = []
+        for backend in backends:
+            with tracer.span(backend.name):
+                if not _publish(backend, streams[backend.name]):
+                    failed.append(backend.name)
+    if failed:
+        print("ERROR: upload failed for target(s): " + ', '.join(failed))
+        sys.exit(1)
+    return list(streams[backends[0].name]) if backends else []
+
+
+def _publish(backend, streams):
+    """
+    Make the files streamed to a target available, and verify them.
+
+    :param backend: uploadbackends.UploadBackend object
+    :param streams: Dict of file name => uploadbackends.UploadStream
+
+    :return: True if successful
+    """
+    print("Uploaded files to '{}':".format(backend.name))
+    with tracer.span('publish'):
+        for name, stream in streams.items():
+            try:
+                if not backend.publish(name):
+                    print("ERROR: unable to publish '{}'".format(name))
+                    return False
+            except OSError as err:
+                print("ERROR: {}".format(err))
+                return False
+            print("  {} ({}, {:.1f}s)".format(
+                name,
+                instrumentation.format_size(stream.size),
+                stream.elapsed
+            ))
+
+    if dry_run:
+        print()
+        return True
+    print("Verifying uploaded files")
+    with tracer.span('verify'):
+        mismatch = sorted(
+            name for name, identical, elapsed
+            in _run_concurrently(
+                lambda name: backend.verify_stream(streams[name]), streams)
+            if not identical)
+    if mismatch:
+        print("ERROR: uploaded files do not match: " + ', '.join(mismatch))
+        return False
+    print("  All {} files verified".format(len(streams)))
+    print()
+    return True
+
+
+def default_platforms(filename):
+    """
+    Get the platforms a release file should be the default download for,
+    based on its extension.
+
+    :param filename: Release file name
+
+    :return: List of platforms, or None if the file should not be a default
+             download (e.g. the release manifest)
+    """
+    if filename.endswith('.zip'):
+        return ['windows']
+    elif filename.endswith(('.tar.gz', '.tgz')):
+        # Old releases used the .tgz extension
+        return ['linux', 'mac', 'bsd', 'solaris', 'others']
+    elif filename.endswith(('.tar.xz', '.tar.zst')):
+        # Optional tarballs; .tar.gz remains the default, as each platform
+        # can only have one default download
+        return None
+    elif filename.endswith('.json'):
+        # Release manifest, see buildrelease.py
+        return None
+    print("WARNING: Unknown extension for file", filename)
+    return None
+
+
+def _print_file_info_results(results):
+    """
+    Print the SourceForge Release API results.
+
+    :param results: Iterable of adodbutil.SourceForgeResult objects
+
+    :return: Number of failed requests
+    """
+    failed = 0
+    for result in results:
+        print("  " + result.filename)
+        if result.ok:
+            print("    Download default for:", result.defaults)
         else:
-            req = requests.put(url, headers=headers, params=payload)
+            print("    ERROR: " + result.error)
+            failed += 1
+    return failed
 
-            # Print results
-            if req.status_code == requests.codes.ok:
-                result = json.loads(req.text)['result']
-                print("    Download default for:", result['x_sf']['default'])
-            else:
-                if req.status_code == requests.codes.unauthorized:
-                    err = "access denied"
-                else:
-                    err = "SourceForge API call failed"
-                print("ERROR: {} - check API key".format(err))
-                break
+
+def _set_file_info(files):
+    """
+    Set the download defaults of the given files.
+
+    :param files: Dict of file path (relative to the project's files root)
+                  => list of platforms
+
+    :return: Number of failed requests
+    """
+    if dry_run:
+        for filename, defaults in files.items():
+            print("  Calling SourceForge Release API: PUT {} default={}"
+                  .format(filename, ','.join(defaults)))
+        return 0
+
+    with SourceForge(sf_project, env.sf_api_key, jobs) as client:
+        return _print_file_info_results(client.set_defaults_bulk(files))
+
+
+def set_sourceforge_file_info(version=None, names=None):
+    """
+    Set the download defaults of the uploaded release files.
+
+    :param version: Release version, defaults to the release zip file's
+    :param names: Uploaded file names, defaults to the release files
+                  in the current directory
+    """
+    print("Updating uploaded files information")
+
+    directory = sourceforge_target_dir(version or get_release_version())
+    if names is None:
+        names = glob.glob('adodb-*')
+    files = {}
+    for file in sorted(names):
+        defaults = default_platforms(file)
+        if defaults:
+            files[directory + '/' + file] = defaults
+
+    if _set_file_info(files):
+        print("ERROR: unable to update some files' information")
+        sys.exit(1)
+
+
+def _file_version(filename):
+    """
+    Get the version number from a release file name.
+
+    :return: versions.Version object, None for old releases' file names
+             (e.g. adodb518a.zip)
+    """
+    match = re.search(r'adodb-(\d+\.\d+\.\d+(?:-[a-z]+\.\d+)?)\.',
+                      path.basename(filename))
+    if match is None:
+        return None
+    return versions.Version.parse(match.group(1))
+
+
+def backfill_sourceforge_file_info():
+    """
+    Set the download defaults of all historical release files, in the
+    adodb-php5-only/ and adodbX/ directories.
+
+    SourceForge uses the last file set as default for a platform, so the
+    latest release's files are processed last, once all other requests
+    have completed.
+    """
+    print("Backfilling release files information")
+
+    with SourceForge(sf_project, env.sf_api_key, jobs) as client:
+        with tracer.span('list'):
+            names = [name for name in client.list_files()
+                     if re.match(r'^(adodb-php5-only|adodb\d+)/', name)]
+    files = {}
+    for name in names:
+        defaults = default_platforms(name)
+        if defaults:
+            files[name] = defaults
+    if not files:
+        print("No release files found")
+        return
+
+    latest = max((_file_version(name) for name in files
+                  if _file_version(name) is not None), default=None)
+    older = {name: defaults for name, defaults in files.items()
+             if _file_version(name) != latest}
+    newest = {name: defaults for name, defaults in files.items()
+              if name not in older}
+    print("  {} files, latest release {}".format(len(files), latest))
+
+    with tracer.span('file-info', files=len(files)):
+        failed = _set_file_info(older) + _set_file_info(newest)
+    if failed:
+        print("ERROR: unable to update {} files' information".format(failed))
+        sys.exit(1)
 
 
 def main():
@@ -291,13 +847,39 @@ def main():
 
     process_command_line()
 
+    if backfill:
+        with tracer.span('backfill'):
+            backfill_sourceforge_file_info()
+        tracer.report('backfill', trace)
+        return
+
+    # Download defaults are only set for the SourceForge target
+    file_info = sf_target in (targets or configured_targets())
+
+    if build_version is not None:
+        with tracer.span('pipeline'):
+            names = build_and_upload_release()
+        if file_info:
+            with tracer.span('file-info'):
+                set_sourceforge_file_info(
+                    build_version,
+                    [name for name in names if name.startswith('adodb-')]
+                )
+        tracer.report(build_version, trace)
+        return
+
     global skip_upload
     if skip_upload:
         print("Skipping upload of release files")
     else:
-        upload_release_files()
+        with tracer.span('upload'):
+            upload_release_files()
+
+    if file_info:
+        with tracer.span('file-info'):
+            set_sourceforge_file_info()
 
-    set_sourceforge_file_info()
+    tracer.report(release_path, trace)
 
 # end main()
 
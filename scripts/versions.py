@@ -0,0 +1,391 @@
+"""
+ADOdb version numbers and release tags index.
+
+- Version class
+  Parsed version number, ordered according to SemVer: development and
+  pre-releases (dev < alpha < beta < rc) sort before the release. Old
+  versions' numbering (4.990, 4.92a) is also supported.
+- TagIndex class
+  The repository's release tags, loaded with a single `git for-each-ref`
+  call and cached until the tags are modified; supports lookups, previous
+  and next version, and latest release queries.
+
+This file is part of ADOdb, a Database Abstraction Layer library for PHP.
+
+@package ADOdb
+@link https://adodb.org Project's web site and documentation
+@link https://github.com/ADOdb/ADOdb Source code and issue tracker
+
+The ADOdb Library is dual-licensed, released under both the BSD 3-Clause
+and the GNU Lesser General Public Licence (LGPL) v2.1 or, at your option,
+any later version. This means you can use it in proprietary products.
+See the LICENSE.md file distributed with this source code for details.
+@license BSD-3-Clause
+@license LGPL-2.1-or-later
+
+@copyright 2026 Damien Regad, Mark Newnham and the ADOdb community
+"""
+
+import bisect
+import functools
+import json
+import os
+import re
+import subprocess
+import tempfile
+from os import path
+
+import gitrepo
+import releasecache
+
+tag_prefix = 'v'
+
+# X.Y[.Z] or old-style X.YY[a], followed by an optional pre-release suffix
+# (-dev, -alpha.N, -beta.N, -rc.N; the dash and number are optional)
+_version_regex = re.compile(r'''
+    [vV]?
+    (?P<major>[0-9]+) \. (?P<minor>[0-9]+)
+    (?: \. (?P<patch>[0-9]+) | (?P<letter>[a-z]) )?
+    (?: -? (?: (?P<dev>dev)
+             | (?P<pre>alpha|beta|rc) (?: \.? (?P<number>[0-9]+) )? ) )?
+    $''', re.X)
+
+# Pre-release identifiers ordering; a release sorts after all of them
+_prerelease_rank = {'dev': 0, 'alpha': 1, 'beta': 2, 'rc': 3}
+_release_rank = len(_prerelease_rank)
+
+
+@functools.total_ordering
+class Version:
+    """
+    A version number.
+
+    Instances are immutable, hashable and comparable; str() returns the
+    SemVer-normalized form (without 'v' prefix), e.g. `5.23.0-rc.1`.
+    """
+    __slots__ = ('major', 'minor', 'patch', 'letter', 'prerelease',
+                 'number', 'key')
+
+    def __init__(self, major, minor, patch=0, prerelease=None, number=None,
+                 letter=''):
+        """
+        Class Constructor.
+
+        :param major: Major version number
+        :param minor: Minor version number
+        :param patch: Patch version number
+        :param prerelease: Pre-release identifier (dev, alpha, beta, rc),
+                           None for a release
+        :param number: Pre-release number, defaults to 1 (except for dev)
+        :param letter: Old-style patch letter (e.g. `4.92a`)
+        """
+        if prerelease is not None and prerelease != 'dev' and number is None:
+            number = 1
+        self.major = major
+        self.minor = minor
+        self.patch = patch
+        self.letter = letter
+        self.prerelease = prerelease
+        self.number = number
+        self.key = (major, minor, patch, letter,
+                    _prerelease_rank[prerelease] if prerelease
+                    else _release_rank,
+                    number or 0)
+
+    @classmethod
+    def parse(cls, version):
+        """
+        Parse a version number.
+
+        :param version: Version number, with or without 'v' prefix
+
+        :return: Version object
+        :raise ValueError: if the version number is invalid
+        """
+        return _parse(version)
+
+    @classmethod
+    def is_valid(cls, version):
+        """
+        Check whether the given string is a valid version number.
+        """
+        return _version_regex.match(version) is not None
+
+    @property
+    def is_dev(self):
+        """
+        Whether this is a development version.
+        """
+        return self.prerelease == 'dev'
+
+    @property
+    def is_prerelease(self):
+        """
+        Whether this is an alpha, beta or release-candidate version.
+        """
+        return self.prerelease is not None and not self.is_dev
+
+    @property
+    def is_patch(self):
+        """
+        Whether this is a patch release (i.e. X.Y.Z with Z > 0).
+        """
+        return self.prerelease is None and (self.patch > 0
+                                            or bool(self.letter))
+
+    @property
+    def series(self):
+        """
+        Major and minor version (X.Y).
+        """
+        return '{}.{}'.format(self.major, self.minor)
+
+    @property
+    def release(self):
+        """
+        The release this version leads to (i.e. without pre-release suffix).
+        """
+        if self.prerelease is None:
+            return self
+        return Version(self.major, self.minor, self.patch,
+                       letter=self.letter)
+
+    @property
+    def tag(self):
+        """
+        Release tag name.
+        """
+        return tag_prefix + str(self)
+
+    def __str__(self):
+        if self.letter:
+            version = '{}.{}{}'.format(self.major, self.minor, self.letter)
+        else:
+            version = '{}.{}.{}'.format(self.major, self.minor, self.patch)
+        if self.prerelease == 'dev':
+            version += '-dev'
+        elif self.prerelease is not None:
+            version += '-{}.{}'.format(self.prerelease, self.number)
+        return version
+
+    def __repr__(self):
+        return "<Version {}>".format(self)
+
+    def __eq__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self.key == other.key
+
+    def __lt__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self.key < other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse(version):
+    match = _version_regex.match(version)
+    if match is None:
+        raise ValueError("invalid version '{}'".format(version))
+    return Version(int(match.group('major')),
+                   int(match.group('minor')),
+                   int(match.group('patch') or 0),
+                   match.group('dev') or match.group('pre'),
+                   int(match.group('number')) if match.group('number')
+                   else None,
+                   match.group('letter') or '')
+
+
+class Tag:
+    """
+    A release tag.
+
+    commit is the SHA of the tagged commit, date the tag's creation time
+    (or the commit's, for lightweight tags) as a Unix timestamp.
+    """
+    __slots__ = ('name', 'version', 'commit', 'date')
+
+    def __init__(self, name, version, commit, date):
+        self.name = name
+        self.version = version
+        self.commit = commit
+        self.date = date
+
+    def __repr__(self):
+        return "<Tag {} ({})>".format(self.name, self.commit[:12])
+
+
+class TagIndex:
+    """
+    Index of a repository's release tags, sorted by version.
+
+    Tags that are not version numbers are ignored.
+    """
+
+    def __init__(self, tags):
+        """
+        Class Constructor.
+
+        :param tags: List of Tag objects
+        """
+        self._tags = sorted(tags, key=lambda t: t.version)
+        self._versions = [t.version for t in self._tags]
+        self._by_version = {t.version: t for t in self._tags}
+
+    @classmethod
+    def load(cls, repo_path='.'):
+        """
+        Get the tag index for the given repository.
+
+        The index is read from the cache, unless the tags were modified
+        since it was saved (based on the packed-refs file's and the tags
+        directory's modification time).
+
+        :param repo_path: Any directory within the repository
+        """
+        repo = gitrepo.Repository(repo_path)
+        stamp = []
+        for name in ('packed-refs', 'refs/tags'):
+            try:
+                stamp.append(os.stat(path.join(repo.common_dir,
+                                               name)).st_mtime_ns)
+            except FileNotFoundError:
+                stamp.append(None)
+
+        index_file = path.join(releasecache.cache_dir(), 'tag-index.json')
+        try:
+            with open(index_file) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        cached = index.get(repo.common_dir)
+        if cached is not None and cached['stamp'] == stamp:
+            return cls([Tag(name, _parse(name), commit, date)
+                        for name, commit, date in cached['tags']])
+
+        tags = cls._read_tags(repo)
+        index[repo.common_dir] = {
+            'stamp': stamp,
+            'tags': [[t.name, t.commit, t.date] for t in tags],
+        }
+        os.makedirs(path.dirname(index_file), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.dirname(index_file),
+                                   prefix='.tmp-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp, index_file)
+        return cls(tags)
+
+    @staticmethod
+    def _read_tags(repo):
+        """
+        List the repository's release tags with `git for-each-ref`.
+
+        :return: List of Tag objects
+        """
+        output = subprocess.check_output(
+            ['git', 'for-each-ref',
+             '--format=%(refname:strip=2)%09%(objectname)%09%(*objectname)'
+             '%09%(creatordate:unix)',
+             'refs/tags/' + tag_prefix + '*'],
+            cwd=repo.root or repo.git_dir,
+            text=True
+        )
+        tags = []
+        for line in output.splitlines():
+            name, sha, peeled, date = line.split('\t')
+            if not Version.is_valid(name):
+                continue
+            tags.append(Tag(name, _parse(name), peeled or sha,
+                            int(date or 0)))
+        return tags
+
+    def __contains__(self, version):
+        return self._version(version) in self._by_version
+
+    def __iter__(self):
+        return iter(self._tags)
+
+    def __len__(self):
+        return len(self._tags)
+
+    @staticmethod
+    def _version(version):
+        return version if isinstance(version, Version) else _parse(version)
+
+    def tag(self, version):
+        """
+        Get a version's tag.
+
+        :param version: Version number or Version object
+
+        :return: Tag object, or None if not tagged
+        """
+        return self._by_version.get(self._version(version))
+
+    def previous(self, version, prerelease=False):
+        """
+        Get the tagged version preceding the given one.
+
+        :param version: Version number or Version object (does not need to
+                        be tagged)
+        :param prerelease: Include pre-releases
+
+        :return: Version object, or None if there is no previous version
+        """
+        pos = bisect.bisect_left(self._versions, self._version(version))
+        for candidate in reversed(self._versions[:pos]):
+            if prerelease or candidate.prerelease is None:
+                return candidate
+        return None
+
+    def next(self, version, prerelease=False):
+        """
+        Get the tagged version following the given one.
+
+        :param version: Version number or Version object (does not need to
+                        be tagged)
+        :param prerelease: Include pre-releases
+
+        :return: Version object, or None if there is no next version
+        """
+        pos = bisect.bisect_right(self._versions, self._version(version))
+        for candidate in self._versions[pos:]:
+            if prerelease or candidate.prerelease is None:
+                return candidate
+        return None
+
+    def latest(self, series=None, prerelease=False):
+        """
+        Get the highest tagged version.
+
+        :param series: Only consider versions from this X.Y series, or from
+                       the series of a release branch (`hotfix/X.Y`)
+        :param prerelease: Include pre-releases
+
+        :return: Version object, or None if there is no matching version
+        """
+        if series is not None:
+            series = series.rsplit('/', 1)[-1]
+            if not re.match(r'^[0-9]+\.[0-9]+$', series):
+                # Not a release branch: latest overall
+                series = None
+        for candidate in reversed(self._versions):
+            if series is not None and candidate.series != series:
+                continue
+            if prerelease or candidate.prerelease is None:
+                return candidate
+        return None
+
+    def newest(self):
+        """
+        Get the most recently created tag.
+
+        :return: Tag object, or None if there are no tags
+        """
+        if not self._tags:
+            return None
+        return max(self._tags, key=lambda t: (t.date, t.version))